@@ -0,0 +1,314 @@
+"""
+Thread pool vs. asyncio benchmark for the Fashion serve path.
+
+Each simulated user runs `recommend` and then one `note` per recommended
+item, like the demo page. In thread mode, sessions run on a thread pool with
+one thread per concurrent user, and each session fans its notes out to a
+nested pool (the page's current design). In asyncio mode, sessions run as
+tasks on one event loop through the async ops (`recommend_async`,
+`note_async`).
+
+Every (mode, concurrency) pair runs in a fresh subprocess, so peak RSS and
+thread counts aren't polluted by earlier runs. Point it at the local mock
+server (`benchmarks/mock_server.py`); Redis still needs to be running for
+Motion.
+
+Usage:
+    python -m benchmarks.async_load --start-mock --concurrency 10 100 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from rich import print
+from rich.table import Table
+
+from benchmarks.fashion_load import EVENTS, PROFILES, percentile
+
+
+def rss_bytes():
+    # Resident set size from /proc (Linux); 0 where it isn't available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class ResourceSampler:
+    """Samples RSS and the live thread count on a background thread."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.baseline_rss = rss_bytes()
+        self.peak_rss = self.baseline_rss
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def note_props(item, event):
+    return {"recommendation": item, "event": event}
+
+
+def thread_session(f, event):
+    start = time.perf_counter()
+    recs = f.run("recommend", props={"event": event}, ignore_cache=True)
+    items = list(recs.model_dump().values())
+    with ThreadPoolExecutor(max_workers=len(items)) as executor:
+        list(
+            executor.map(
+                lambda item: f.run(
+                    "note", props=note_props(item, event), ignore_cache=True
+                ),
+                items,
+            )
+        )
+    return time.perf_counter() - start
+
+
+async def async_session(f, event):
+    start = time.perf_counter()
+    recs = await f.arun("recommend_async", props={"event": event}, ignore_cache=True)
+    items = list(recs.model_dump().values())
+    await asyncio.gather(
+        *[
+            f.arun("note_async", props=note_props(item, event), ignore_cache=True)
+            for item in items
+        ]
+    )
+    return time.perf_counter() - start
+
+
+def run_thread_session(f, event):
+    # A failed session (e.g., an LLM timeout under load) is counted rather
+    # than failing the whole configuration
+    try:
+        return thread_session(f, event)
+    except Exception as e:
+        print(f"Session failed: {e!r}", file=sys.stderr)
+        return None
+
+
+async def run_async_session(f, event):
+    try:
+        return await async_session(f, event)
+    except Exception as e:
+        print(f"Session failed: {e!r}", file=sys.stderr)
+        return None
+
+
+def run_single(args):
+    # Runs one (mode, concurrency) configuration in this process and prints
+    # the result as JSON
+    from fashion.clients import connection_stats
+    from fashion.recommender import Fashion
+
+    run_id = uuid.uuid4().hex[:8]
+    instances = [
+        Fashion(
+            f"async_bench_{run_id}_{i}",
+            init_state_params=PROFILES[i % len(PROFILES)],
+        )
+        for i in range(args.instances)
+    ]
+
+    # Events are unique per session so the recommend result cache can't
+    # short-circuit the LLM calls
+    sessions = [
+        (
+            instances[i % len(instances)],
+            f"{EVENTS[i % len(EVENTS)]} (session {run_id}/{i})",
+        )
+        for i in range(args.run_concurrency * args.rounds)
+    ]
+
+    try:
+        with ResourceSampler() as sampler:
+            start = time.perf_counter()
+            if args.mode == "thread":
+                with ThreadPoolExecutor(max_workers=args.run_concurrency) as executor:
+                    latencies = list(
+                        executor.map(
+                            lambda session: run_thread_session(*session), sessions
+                        )
+                    )
+            else:
+
+                async def main():
+                    semaphore = asyncio.Semaphore(args.run_concurrency)
+
+                    async def bounded(session):
+                        async with semaphore:
+                            return await run_async_session(*session)
+
+                    return await asyncio.gather(
+                        *[bounded(session) for session in sessions]
+                    )
+
+                latencies = asyncio.run(main())
+            elapsed = time.perf_counter() - start
+    finally:
+        for f in instances:
+            f.shutdown()
+
+    completed = [latency for latency in latencies if latency is not None]
+
+    # Plain stdout: the parent process parses the last line
+    sys.stdout.write(
+        json.dumps(
+            {
+                "mode": args.mode,
+                "concurrency": args.run_concurrency,
+                "sessions": len(sessions),
+                "elapsed": elapsed,
+                "failed": len(sessions) - len(completed),
+                "throughput": len(completed) / elapsed,
+                "p50": percentile(completed, 50),
+                "p95": percentile(completed, 95),
+                "peak_threads": sampler.peak_threads,
+                "rss_delta_mb": (sampler.peak_rss - sampler.baseline_rss) / 2**20,
+                "connections": connection_stats.snapshot()["connections"],
+            }
+        )
+        + "\n"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Thread pool vs. asyncio benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--modes", nargs="+", default=["thread", "async"])
+    parser.add_argument(
+        "--rounds", type=int, default=2, help="Sessions per concurrent user"
+    )
+    parser.add_argument(
+        "--instances",
+        type=int,
+        default=10,
+        help="Fashion instances the sessions are spread over",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help="OpenAI-compatible endpoint (defaults to OPENAI_BASE_URL)",
+    )
+    parser.add_argument("--start-mock", action="store_true")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    parser.add_argument("--mock-base-latency", type=float, default=1.0)
+    parser.add_argument("--global-instance", default="benchmark")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    # Internal: run one configuration in this process
+    parser.add_argument("--mode", default=None, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--run-concurrency", type=int, default=None, help=argparse.SUPPRESS
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.mode:
+        return run_single(args)
+
+    mock_server = None
+    if args.start_mock:
+        from benchmarks.mock_server import LatencyModel, start_in_thread
+
+        mock_server = start_in_thread(
+            port=args.mock_port,
+            latency=LatencyModel(base=args.mock_base_latency, jitter=0.0),
+        )
+        args.base_url = f"http://127.0.0.1:{args.mock_port}/v1"
+
+    env = dict(os.environ)
+    if args.base_url:
+        env["OPENAI_BASE_URL"] = args.base_url
+        env.setdefault("OPENAI_API_KEY", "mock")
+    env["GLOBAL_SUMMARIES_ID"] = args.global_instance
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            for mode in args.modes:
+                process = subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.async_load",
+                        "--mode",
+                        mode,
+                        "--run-concurrency",
+                        str(concurrency),
+                        "--rounds",
+                        str(args.rounds),
+                        "--instances",
+                        str(args.instances),
+                    ],
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                )
+                if process.returncode != 0:
+                    print(process.stderr)
+                    raise SystemExit(f"{mode} run at concurrency {concurrency} failed")
+                results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    finally:
+        if mock_server is not None:
+            mock_server.shutdown()
+
+    table = Table(title="Fashion serve path: thread pool vs. asyncio")
+    for column in [
+        "mode",
+        "concurrency",
+        "sessions/s",
+        "failed",
+        "p50 (s)",
+        "p95 (s)",
+        "peak threads",
+        "peak RSS delta (MB)",
+        "connections opened",
+    ]:
+        table.add_column(column, justify="left" if column == "mode" else "right")
+    for result in results:
+        table.add_row(
+            result["mode"],
+            str(result["concurrency"]),
+            f"{result['throughput']:.2f}",
+            str(result["failed"]),
+            f"{result['p50']:.3f}",
+            f"{result['p95']:.3f}",
+            str(result["peak_threads"]),
+            f"{result['rss_delta_mb']:.1f}",
+            str(result["connections"]),
+        )
+    print(table)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
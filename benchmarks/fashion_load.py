@@ -0,0 +1,490 @@
+"""
+Load benchmark for the Fashion component.
+
+Each simulated user runs the same flow as the demo page: `recommend`, then
+one `note` per recommended item (in parallel, or a single batched `notes`
+call with --batch-notes), then `user_feedback`. With --stream, items come
+from `recommend_stream` and each item's note starts as soon as the item is
+complete (or, with --batch-notes too, the product searches start as items
+arrive and one `notes` call follows); time to first item and first note are
+reported alongside the totals. With --shopping, sessions also run the product search for every
+item, either after all notes are done (`after`, the demo page's original
+order) or as soon as each item is known (`overlap`); compare the `session`
+latencies of the two runs for the end-to-end effect. Reports throughput
+and p50/p95/p99 latency per op. Point it at the local mock server
+(`benchmarks/mock_server.py`) to get a repeatable baseline without live
+API keys; Redis still needs to be running for Motion.
+
+Usage:
+    python -m benchmarks.fashion_load --start-mock --users 20 --rounds 3
+    python -m benchmarks.fashion_load --base-url http://localhost:8765/v1 --output baseline.json
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import requests
+from rich import print
+from rich.table import Table
+
+EVENTS = [
+    "a birthday party",
+    "a job interview at a tech startup",
+    "hiking in Japan",
+    "a Beatles concert",
+    "dinner in Paris",
+    "brunch in Central Park",
+    "a beach wedding",
+    "skiing in the Alps",
+]
+
+PROFILES = [
+    {"gender": "menswear", "occupation": "student", "age": "21"},
+    {"gender": "womenswear", "occupation": "computer programmer", "age": "26"},
+    {"gender": "womenswear", "occupation": "architect", "age": "41"},
+    {"gender": "menswear", "occupation": "chef", "age": "35"},
+]
+
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+
+    def record(self, op: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[op].append(seconds)
+
+    @contextmanager
+    def time(self, op: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(op, time.perf_counter() - start)
+
+    def summary(self):
+        with self._lock:
+            samples = {op: list(values) for op, values in self._samples.items()}
+        return {
+            op: {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for op, values in samples.items()
+        }
+
+
+def run_note(f, recorder, item, event, use_summaries):
+    with recorder.time("note"):
+        return f.run(
+            "note",
+            props={
+                "recommendation": item,
+                "event": event,
+                "use_summaries": use_summaries,
+            },
+            ignore_cache=True,
+        )
+
+
+def search_products(item, gender):
+    # Imported late: the shopping endpoint is configured in main()
+    from fashion.shopping import shopping_search
+
+    return shopping_search.submit(f"{item} for {gender}")
+
+
+def wait_for_products(recorder, searches, overlapped):
+    # Time the session still spends waiting for product searches once all
+    # notes are done
+    with recorder.time(
+        "shopping: wait after notes (%s)" % ("overlap" if overlapped else "after")
+    ):
+        for search in searches:
+            search.result()
+
+
+def run_session(f, recorder, event, use_summaries, args, gender):
+    # recommend, then the notes for every item
+    with recorder.time("recommend"):
+        recs = f.run(
+            "recommend",
+            props={"event": event, "use_summaries": use_summaries},
+            ignore_cache=True,
+        )
+    items = list(recs.model_dump().values())
+    searches = []
+    if args.shopping == "overlap":
+        searches = [search_products(item, gender) for item in items]
+
+    with recorder.time("notes (all items)"):
+        if args.batch_notes:
+            notes = f.run(
+                "notes",
+                props={
+                    "recommendations": recs.model_dump(),
+                    "event": event,
+                    "use_summaries": use_summaries,
+                },
+                ignore_cache=True,
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=len(items)) as executor:
+                notes = list(
+                    executor.map(
+                        lambda item: run_note(f, recorder, item, event, use_summaries),
+                        items,
+                    )
+                )
+
+    if args.shopping == "after":
+        searches = [search_products(item, gender) for item in items]
+    if searches:
+        wait_for_products(recorder, searches, args.shopping == "overlap")
+    return items, notes
+
+
+def run_streamed_session(
+    f, recorder, event, use_summaries, args, gender, session_start
+):
+    # recommend_stream, starting each item's note as soon as the item is
+    # complete (like the demo page with BATCH_NOTES=0); with --batch-notes,
+    # one notes call once every item is in (the demo page's default)
+    if args.batch_notes:
+        return run_streamed_batch_session(
+            f, recorder, event, use_summaries, args, gender, session_start
+        )
+
+    items = []
+    futures = []
+    searches = []
+    first_note = threading.Lock()
+
+    def note_done(future):
+        # Runs when the note finishes, possibly while items are still
+        # streaming; only the first successful note is recorded
+        if future.exception() is None and first_note.acquire(blocking=False):
+            recorder.record("session: first note", time.perf_counter() - session_start)
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        with recorder.time("recommend"):
+            for _, item in f.gen(
+                "recommend_stream",
+                props={"event": event, "use_summaries": use_summaries},
+                ignore_cache=True,
+            ):
+                if not items:
+                    recorder.record(
+                        "recommend: first item", time.perf_counter() - session_start
+                    )
+                items.append(item)
+                if args.shopping == "overlap":
+                    searches.append(search_products(item, gender))
+                future = executor.submit(
+                    run_note, f, recorder, item, event, use_summaries
+                )
+                future.add_done_callback(note_done)
+                futures.append(future)
+
+        notes = [future.result() for future in as_completed(futures)]
+
+    if args.shopping == "after":
+        searches = [search_products(item, gender) for item in items]
+    if searches:
+        wait_for_products(recorder, searches, args.shopping == "overlap")
+    return items, notes
+
+
+def run_streamed_batch_session(
+    f, recorder, event, use_summaries, args, gender, session_start
+):
+    recommendations = {}
+    searches = []
+    with recorder.time("recommend"):
+        for field, item in f.gen(
+            "recommend_stream",
+            props={"event": event, "use_summaries": use_summaries},
+            ignore_cache=True,
+        ):
+            if not recommendations:
+                recorder.record(
+                    "recommend: first item", time.perf_counter() - session_start
+                )
+            recommendations[field] = item
+            if args.shopping == "overlap":
+                searches.append(search_products(item, gender))
+
+    with recorder.time("notes (all items)"):
+        notes = f.run(
+            "notes",
+            props={
+                "recommendations": recommendations,
+                "event": event,
+                "use_summaries": use_summaries,
+            },
+            ignore_cache=True,
+        )
+    recorder.record("session: first note", time.perf_counter() - session_start)
+
+    items = list(recommendations.values())
+    if args.shopping == "after":
+        searches = [search_products(item, gender) for item in items]
+    if searches:
+        wait_for_products(recorder, searches, args.shopping == "overlap")
+    return items, list(notes.values())
+
+
+def run_user(Fashion, recorder, user_index, args, run_id):
+    profile = PROFILES[user_index % len(PROFILES)]
+    f = Fashion(f"bench_{run_id}_{user_index}", init_state_params=profile)
+    use_summaries = not args.raw_context
+    try:
+        for round_index in range(args.rounds):
+            event = EVENTS[(user_index + round_index) % len(EVENTS)]
+            session_start = time.perf_counter()
+
+            if args.stream:
+                items, notes = run_streamed_session(
+                    f,
+                    recorder,
+                    event,
+                    use_summaries,
+                    args,
+                    profile["gender"],
+                    session_start,
+                )
+            else:
+                items, notes = run_session(
+                    f, recorder, event, use_summaries, args, profile["gender"]
+                )
+            recorder.record("session", time.perf_counter() - session_start)
+
+            with recorder.time("user_feedback"):
+                f.run(
+                    "user_feedback",
+                    props={
+                        "outfit": items,
+                        "action": "love" if round_index % 2 == 0 else "dislike",
+                        "feedback": "" if round_index % 2 == 0 else "too formal",
+                        "event": event,
+                    },
+                )
+
+            if args.flush_updates:
+                with recorder.time("update:recommend"):
+                    f.flush_update("recommend_stream" if args.stream else "recommend")
+                with recorder.time("update:user_feedback"):
+                    f.flush_update("user_feedback")
+
+        return len(notes)
+    finally:
+        f.shutdown()
+
+
+def print_report(summary, elapsed, sessions, mock_stats):
+    table = Table(
+        title=f"Fashion load benchmark ({sessions} sessions in {elapsed:.2f}s)"
+    )
+    for column in ["op", "count", "mean (s)", "p50 (s)", "p95 (s)", "p99 (s)"]:
+        table.add_column(column, justify="right" if column != "op" else "left")
+    for op, stats in summary.items():
+        table.add_row(
+            op,
+            str(stats["count"]),
+            f"{stats['mean']:.3f}",
+            f"{stats['p50']:.3f}",
+            f"{stats['p95']:.3f}",
+            f"{stats['p99']:.3f}",
+        )
+    print(table)
+    print(f"Throughput: {sessions / elapsed:.2f} sessions/s")
+    if mock_stats:
+        print(
+            f"LLM calls: {mock_stats['requests']}, prompt tokens: "
+            f"{mock_stats['prompt_tokens']}, completion tokens: "
+            f"{mock_stats['completion_tokens']}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fashion component load benchmark")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help="OpenAI-compatible endpoint (defaults to OPENAI_BASE_URL)",
+    )
+    parser.add_argument(
+        "--start-mock",
+        action="store_true",
+        help="Start the mock server in-process instead of using --base-url",
+    )
+    parser.add_argument("--mock-port", type=int, default=8765)
+    parser.add_argument("--mock-base-latency", type=float, default=0.3)
+    parser.add_argument("--mock-per-prompt-token", type=float, default=0.0002)
+    parser.add_argument("--mock-per-completion-token", type=float, default=0.01)
+    parser.add_argument(
+        "--raw-context",
+        action="store_true",
+        help="Run with use_summaries=False (raw context stuffed into prompts)",
+    )
+    parser.add_argument(
+        "--batch-notes",
+        action="store_true",
+        help="Generate all item notes with the batched `notes` op",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use the streaming `recommend_stream` op and report time to first item",
+    )
+    parser.add_argument(
+        "--shopping",
+        choices=["off", "after", "overlap"],
+        default="off",
+        help="Also run each item's product search, after all notes or overlapped with them",
+    )
+    parser.add_argument(
+        "--mock-shopping-latency",
+        type=float,
+        default=0.8,
+        help="Seconds per product search on the mock server",
+    )
+    parser.add_argument(
+        "--flush-updates",
+        action="store_true",
+        help="Wait for update ops after each session and time them",
+    )
+    parser.add_argument(
+        "--global-instance",
+        default="benchmark",
+        help="GlobalSummaries instance id to use (kept separate from production)",
+    )
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    mock_server = None
+    if args.start_mock:
+        from benchmarks.mock_server import LatencyModel, start_in_thread
+
+        mock_server = start_in_thread(
+            port=args.mock_port,
+            latency=LatencyModel(
+                args.mock_base_latency,
+                args.mock_per_prompt_token,
+                args.mock_per_completion_token,
+            ),
+            scrape_latency=args.mock_shopping_latency,
+        )
+        args.base_url = f"http://127.0.0.1:{args.mock_port}/v1"
+        # The mock server answers the shopping searches too. Every search goes
+        # to it (no cache), so both --shopping modes do the same work
+        os.environ["SERPER_SHOPPING_URL"] = (
+            f"http://127.0.0.1:{args.mock_port}/shopping"
+        )
+        os.environ["SHOPPING_CACHE_PATH"] = ":memory:"
+        os.environ["SHOPPING_CACHE_TTL"] = "0"
+
+    if args.base_url:
+        os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["GLOBAL_SUMMARIES_ID"] = args.global_instance
+
+    # Import after the environment is configured, since the clients are
+    # created at import time
+    from fashion.recommender import (
+        Fashion,
+        activity_logger,
+        global_summaries_cache,
+        recommend_cache,
+    )
+    from fashion.clients import connection_stats
+
+    mock_stats_url = None
+    if args.base_url:
+        mock_stats_url = args.base_url.rstrip("/").removesuffix("/v1") + "/stats"
+        try:
+            requests.post(mock_stats_url + "/reset", timeout=5)
+        except requests.RequestException:
+            mock_stats_url = None
+
+    recorder = LatencyRecorder()
+    run_id = uuid.uuid4().hex[:8]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        futures = [
+            executor.submit(run_user, Fashion, recorder, i, args, run_id)
+            for i in range(args.users)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    if args.flush_updates:
+        with recorder.time("activity drain"):
+            activity_logger.drain(timeout=60)
+
+    mock_stats = None
+    if mock_stats_url:
+        mock_stats = requests.get(mock_stats_url, timeout=5).json()
+
+    sessions = args.users * args.rounds
+    summary = recorder.summary()
+    print_report(summary, elapsed, sessions, mock_stats)
+    print(f"GlobalSummaries cache: {global_summaries_cache.stats()}")
+    print(f"Recommend result cache: {recommend_cache.stats()}")
+    print(f"Activity logger: {activity_logger.stats()}")
+    print(f"HTTP connections: {connection_stats.snapshot()}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "args": vars(args),
+                    "elapsed": elapsed,
+                    "sessions": sessions,
+                    "throughput": sessions / elapsed,
+                    "ops": summary,
+                    "llm": mock_stats,
+                    "global_summaries_cache": global_summaries_cache.stats(),
+                    "recommend_cache": recommend_cache.stats(),
+                    "activity_logger": activity_logger.stats(),
+                    "http_connections": connection_stats.snapshot(),
+                },
+                f,
+                indent=2,
+            )
+
+    if mock_server:
+        mock_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,546 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint, so the Fashion and
+GlobalSummaries components can be exercised without live API keys.
+
+Supports plain chat completions as well as the instructor-style tool calls
+(and JSON mode) used for `RecommendationPrompt`, `ItemListPrompt`,
+`NotePrompt` and any other pydantic response model, since the arguments are
+generated from the tool's JSON schema.
+
+It also stands in for the Serper news search (`POST /news`), scrape
+(`POST /scrape`) and shopping search (`POST /shopping`) endpoints, returning deterministic
+fake articles after `--scrape-latency` seconds.
+
+Latency is simulated as
+    base_latency + prompt_tokens * per_prompt_token + completion_tokens * per_completion_token
+with optional multiplicative jitter. Streaming requests (`stream=True`) are
+answered with server-sent events: the first chunk arrives after the base and
+prompt latency, and the completion is then emitted a few tokens at a time.
+
+Usage:
+    python -m benchmarks.mock_server --port 8765
+
+    export OPENAI_BASE_URL=http://localhost:8765/v1
+    export OPENAI_API_KEY=mock
+    export SERPER_NEWS_URL=http://localhost:8765/news
+    export SERPER_SCRAPE_URL=http://localhost:8765/scrape
+    export SERPER_SHOPPING_URL=http://localhost:8765/shopping
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+WORDS = [
+    "relaxed",
+    "tailored",
+    "linen",
+    "navy",
+    "cropped",
+    "leather",
+    "minimalist",
+    "wool",
+    "oversized",
+    "pleated",
+    "suede",
+    "ivory",
+    "structured",
+    "vintage",
+    "canvas",
+    "charcoal",
+]
+
+
+@dataclass
+class LatencyModel:
+    base: float = 0.3
+    per_prompt_token: float = 0.0002
+    per_completion_token: float = 0.01
+    jitter: float = 0.1
+
+    def delay(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return self.first_token_delay(prompt_tokens) + self.completion_delay(
+            completion_tokens
+        )
+
+    def first_token_delay(self, prompt_tokens: int) -> float:
+        return self._jittered(self.base + prompt_tokens * self.per_prompt_token)
+
+    def completion_delay(self, completion_tokens: int) -> float:
+        return self._jittered(completion_tokens * self.per_completion_token)
+
+    def _jittered(self, delay: float) -> float:
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(delay, 0.0)
+
+
+def count_tokens(text: str) -> int:
+    # Rough approximation (~4 characters per token for English text)
+    return max(1, len(text) // 4)
+
+
+def prompt_text(messages) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    parts.append(part.get("text", ""))
+        else:
+            parts.append(str(content))
+    return "\n".join(parts)
+
+
+def fake_phrase(seed: str, num_words: int = 5) -> str:
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).hexdigest())
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+
+def fake_from_schema(schema, seed: str, defs=None):
+    """Generates a value that validates against a (pydantic-generated) JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+
+    if "$ref" in schema:
+        return fake_from_schema(defs[schema["$ref"].split("/")[-1]], seed, defs)
+    if "anyOf" in schema:
+        return fake_from_schema(schema["anyOf"][0], seed, defs)
+    if "allOf" in schema:
+        return fake_from_schema(schema["allOf"][0], seed, defs)
+
+    schema_type = schema.get("type", "string")
+    if schema_type == "object":
+        return {
+            name: fake_from_schema(prop, f"{seed}/{name}", defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [
+            fake_from_schema(schema.get("items", {}), f"{seed}/{i}", defs)
+            for i in range(3)
+        ]
+    if schema_type == "integer":
+        return 1
+    if schema_type == "number":
+        return 1.0
+    if schema_type == "boolean":
+        return True
+    if "enum" in schema:
+        return schema["enum"][0]
+    return fake_phrase(seed)
+
+
+class MockState:
+    def __init__(
+        self,
+        latency: LatencyModel,
+        completion_words: int = 40,
+        scrape_latency: float = 0.2,
+    ):
+        self.latency = latency
+        self.completion_words = completion_words
+        self.scrape_latency = scrape_latency
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def record(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def reset(self) -> None:
+        with self.lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+
+def build_completion(body, state: MockState):
+    messages = body.get("messages", [])
+    text = prompt_text(messages)
+    seed = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    prompt_tokens = count_tokens(text)
+
+    message = {"role": "assistant", "content": None}
+    finish_reason = "stop"
+
+    tool_choice = body.get("tool_choice")
+    tools = body.get("tools") or []
+    response_format = body.get("response_format") or {}
+
+    if tools:
+        tool = tools[0]["function"]
+        if isinstance(tool_choice, dict):
+            name = tool_choice["function"]["name"]
+            tool = next(t["function"] for t in tools if t["function"]["name"] == name)
+        arguments = json.dumps(fake_from_schema(tool.get("parameters", {}), seed))
+        message["tool_calls"] = [
+            {
+                "id": f"call_{hashlib.md5(seed.encode('utf-8')).hexdigest()[:12]}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": arguments},
+            }
+        ]
+        finish_reason = "tool_calls"
+        completion = arguments
+    elif response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"].get("schema", {})
+        completion = json.dumps(fake_from_schema(schema, seed))
+        message["content"] = completion
+    elif response_format.get("type") == "json_object":
+        completion = json.dumps({"result": fake_phrase(seed)})
+        message["content"] = completion
+    else:
+        completion = fake_phrase(seed, state.completion_words) + "."
+        message["content"] = completion
+
+    completion_tokens = count_tokens(completion)
+    return (
+        {
+            "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [
+                {"index": 0, "message": message, "finish_reason": finish_reason}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        },
+        prompt_tokens,
+        completion_tokens,
+    )
+
+
+def stream_chunks(payload, chunk_chars: int = 16):
+    """Splits a completion payload into chat.completion.chunk deltas, the way
+    the API streams content and tool call arguments."""
+    choice = payload["choices"][0]
+    message = choice["message"]
+
+    def chunk(delta, finish_reason=None):
+        return {
+            "id": payload["id"],
+            "object": "chat.completion.chunk",
+            "created": payload["created"],
+            "model": payload["model"],
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    if message.get("tool_calls"):
+        tool_call = message["tool_calls"][0]
+        arguments = tool_call["function"]["arguments"]
+        yield chunk(
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "index": 0,
+                        "id": tool_call["id"],
+                        "type": "function",
+                        "function": {
+                            "name": tool_call["function"]["name"],
+                            "arguments": "",
+                        },
+                    }
+                ],
+            }
+        )
+        for start in range(0, len(arguments), chunk_chars):
+            yield chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": 0,
+                            "function": {
+                                "arguments": arguments[start : start + chunk_chars]
+                            },
+                        }
+                    ]
+                }
+            )
+    else:
+        content = message["content"] or ""
+        yield chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(content), chunk_chars):
+            yield chunk({"content": content[start : start + chunk_chars]})
+
+    yield chunk({}, choice["finish_reason"])
+
+
+def fake_news(query: str, num: int):
+    # Article links change every minute, like a live news search
+    minute = int(time.time() // 60)
+    return {
+        "news": [
+            {
+                "title": fake_phrase(f"{query}/{minute}/{i}/title", 8).capitalize(),
+                "link": f"https://news.example.com/{minute}/{i}",
+                "snippet": fake_phrase(f"{query}/{minute}/{i}/snippet", 20),
+                "date": "1 minute ago",
+                "source": "Example News",
+            }
+            for i in range(num)
+        ]
+    }
+
+
+def fake_article(url: str, host: str, num_words: int = 300):
+    # The article image is served by this server (see do_HEAD)
+    image_id = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return {
+        "text": fake_phrase(url, num_words),
+        "metadata": {"og:image": f"http://{host}/images/{image_id}.jpg"},
+    }
+
+
+def fake_shopping(query: str, host: str, num: int = 10):
+    return {
+        "shopping": [
+            {
+                "title": fake_phrase(f"{query}/{i}", 6).capitalize(),
+                "source": "Example Store",
+                "link": f"https://shop.example.com/{i}?q={query}",
+                "price": f"${20 + 7 * i}.00",
+                "imageUrl": f"http://{host}/images/"
+                + hashlib.sha256(f"{query}/{i}".encode("utf-8")).hexdigest()[:16]
+                + ".jpg",
+            }
+            for i in range(num)
+        ]
+    }
+
+
+# Fake JPEG: the magic bytes, padded to a typical thumbnail size
+FAKE_IMAGE = b"\xff\xd8\xff\xe0" + bytes(50 * 1024)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenAI/0.1"
+
+    @property
+    def mock(self) -> MockState:
+        return self.server.mock_state  # type: ignore
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _send_json(self, payload, status: int = 200) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_image(self, head: bool = False) -> None:
+        # Honors "Range: bytes=start-end", like most image hosts
+        data, status = FAKE_IMAGE, 200
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes="):
+            start, _, end = byte_range[len("bytes=") :].partition("-")
+            end = min(int(end) if end else len(FAKE_IMAGE) - 1, len(FAKE_IMAGE) - 1)
+            data, status = FAKE_IMAGE[int(start) : end + 1], 206
+        self.send_response(status)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(FAKE_IMAGE)}")
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        if self.path.startswith("/images/"):
+            return self._send_image(head=True)
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.startswith("/images/"):
+            return self._send_image()
+        if self.path.rstrip("/") == "/stats":
+            return self._send_json(self.mock.snapshot())
+        if self.path.rstrip("/") == "/v1/models":
+            return self._send_json(
+                {"object": "list", "data": [{"id": "gpt-4o", "object": "model"}]}
+            )
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path == "/stats/reset":
+            self._read_json()
+            self.mock.reset()
+            return self._send_json(self.mock.snapshot())
+
+        if path == "/news":
+            body = self._read_json()
+            time.sleep(self.mock.latency._jittered(self.mock.scrape_latency))
+            return self._send_json(
+                fake_news(body.get("q", ""), int(body.get("num", 10)))
+            )
+        if path == "/shopping":
+            body = self._read_json()
+            time.sleep(self.mock.latency._jittered(self.mock.scrape_latency))
+            return self._send_json(
+                fake_shopping(body.get("q", ""), self.headers.get("Host", ""))
+            )
+        if path == "/scrape":
+            body = self._read_json()
+            time.sleep(self.mock.latency._jittered(self.mock.scrape_latency))
+            return self._send_json(
+                fake_article(body.get("url", ""), self.headers.get("Host", ""))
+            )
+
+        if path not in ("/v1/chat/completions", "/chat/completions"):
+            return self._send_json(
+                {"error": {"message": f"Unknown path {self.path}"}}, 404
+            )
+
+        body = self._read_json()
+        payload, prompt_tokens, completion_tokens = build_completion(body, self.mock)
+        self.mock.record(prompt_tokens, completion_tokens)
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return self._send_stream(
+                payload, prompt_tokens, completion_tokens, include_usage
+            )
+
+        time.sleep(self.mock.latency.delay(prompt_tokens, completion_tokens))
+        self._send_json(payload)
+
+    def _send_stream(
+        self,
+        payload,
+        prompt_tokens: int,
+        completion_tokens: int,
+        include_usage: bool = False,
+    ) -> None:
+        time.sleep(self.mock.latency.first_token_delay(prompt_tokens))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        chunks = list(stream_chunks(payload))
+        per_chunk = self.mock.latency.completion_delay(completion_tokens) / len(chunks)
+        if include_usage:
+            # Like the API, a last chunk without choices carries the usage
+            chunks.append(
+                {
+                    "id": payload["id"],
+                    "object": "chat.completion.chunk",
+                    "created": payload["created"],
+                    "model": payload["model"],
+                    "choices": [],
+                    "usage": payload["usage"],
+                }
+            )
+        events = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+        events.append("data: [DONE]\n\n")
+        for event in events:
+            data = event.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(per_chunk)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    # The default backlog (5) drops connections under benchmark concurrency
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    latency: Optional[LatencyModel] = None,
+    completion_words: int = 40,
+    scrape_latency: float = 0.2,
+) -> MockServer:
+    server = MockServer((host, port), MockHandler)
+    server.mock_state = MockState(  # type: ignore
+        latency or LatencyModel(), completion_words, scrape_latency
+    )
+    return server
+
+
+def start_in_thread(**kwargs) -> MockServer:
+    """Starts the mock server on a daemon thread and returns it.
+    Call `server.shutdown()` to stop it."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-latency", type=float, default=LatencyModel.base)
+    parser.add_argument(
+        "--per-prompt-token", type=float, default=LatencyModel.per_prompt_token
+    )
+    parser.add_argument(
+        "--per-completion-token",
+        type=float,
+        default=LatencyModel.per_completion_token,
+    )
+    parser.add_argument("--jitter", type=float, default=LatencyModel.jitter)
+    parser.add_argument("--completion-words", type=int, default=40)
+    parser.add_argument(
+        "--scrape-latency",
+        type=float,
+        default=0.2,
+        help="Seconds per news search or scrape request",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = make_server(
+        args.host,
+        args.port,
+        LatencyModel(
+            args.base_latency,
+            args.per_prompt_token,
+            args.per_completion_token,
+            args.jitter,
+        ),
+        args.completion_words,
+        args.scrape_latency,
+    )
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,109 @@
+"""
+News summary latency versus the number of new articles, for the `single`
+prompt and the `map_reduce` mode of `fashion.newsdigest`. Runs against the
+local mock server, whose latency grows with prompt and completion tokens, with
+the digest cache off so every run digests every chunk. No Redis needed.
+
+Usage:
+    python -m benchmarks.news_summary --articles 1 5 10 20 40
+    python -m benchmarks.news_summary --concurrency 4 --fan-in 5 --words 2000
+"""
+
+import argparse
+import os
+import time
+
+from rich import print
+from rich.table import Table
+
+from benchmarks.mock_server import LatencyModel, fake_phrase, start_in_thread
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="News summary latency benchmark")
+    parser.add_argument("--articles", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--words", type=int, default=1200, help="Words per article")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--fan-in", type=int, default=None)
+    parser.add_argument("--chunk-tokens", type=int, default=None)
+    parser.add_argument("--mock-port", type=int, default=8767)
+    parser.add_argument("--mock-base-latency", type=float, default=0.3)
+    parser.add_argument("--mock-per-prompt-token", type=float, default=0.0002)
+    parser.add_argument("--mock-per-completion-token", type=float, default=0.01)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    mock_server = start_in_thread(
+        port=args.mock_port,
+        latency=LatencyModel(
+            args.mock_base_latency,
+            args.mock_per_prompt_token,
+            args.mock_per_completion_token,
+        ),
+    )
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+    # Import after the environment is configured, since the clients are
+    # created at import time
+    from fashion import newsdigest
+
+    options = {
+        "concurrency": args.concurrency or newsdigest.NEWS_MAP_CONCURRENCY,
+        "fan_in": args.fan_in or newsdigest.NEWS_REDUCE_FAN_IN,
+        "chunk_tokens": args.chunk_tokens or newsdigest.NEWS_CHUNK_TOKENS,
+        "cache": newsdigest.DigestCache(ttl=0),
+    }
+
+    table = Table(
+        title=f"News summary latency ({args.words} words per article, "
+        f"concurrency {options['concurrency']}, fan-in {options['fan_in']})"
+    )
+    for column in [
+        "articles",
+        "single (s)",
+        "map_reduce (s)",
+        "LLM calls (map_reduce)",
+        "prompt tokens (single)",
+        "prompt tokens (map_reduce)",
+    ]:
+        table.add_column(column, justify="right")
+
+    try:
+        for num_articles in args.articles:
+            texts = [
+                fake_phrase(f"article {num_articles} {i}", args.words)
+                for i in range(num_articles)
+            ]
+            row = [str(num_articles)]
+            stats = {}
+            for mode in ["single", "map_reduce"]:
+                latencies = []
+                for _ in range(args.repeats):
+                    mock_server.mock_state.reset()
+                    start = time.perf_counter()
+                    newsdigest.summarize_news(
+                        "Quiet luxury and wide-leg trousers.",
+                        texts,
+                        [],
+                        mode=mode,
+                        **options,
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    stats[mode] = mock_server.mock_state.snapshot()
+                row.append(f"{sum(latencies) / len(latencies):.2f}")
+            row.append(str(stats["map_reduce"]["requests"]))
+            row.append(str(stats["single"]["prompt_tokens"]))
+            row.append(str(stats["map_reduce"]["prompt_tokens"]))
+            table.add_row(*row)
+    finally:
+        mock_server.shutdown()
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
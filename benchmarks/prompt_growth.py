@@ -0,0 +1,139 @@
+"""
+Simulates a long-lived user on the raw-context path (use_summaries=False)
+and reports how the recommend prompt and the state grow with the number of
+sessions, with and without the retention policies and the prompt token
+budget. No LLM calls or Redis needed: the history is synthesized the same
+way the update ops append to it.
+
+Usage:
+    python -m benchmarks.prompt_growth --rounds 500
+"""
+
+import argparse
+import os
+import random
+
+import cloudpickle
+from rich import print
+from rich.table import Table
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+from benchmarks.fashion_load import EVENTS  # noqa: E402
+from benchmarks.mock_server import WORDS  # noqa: E402
+from fashion import globalsummaries, recommender  # noqa: E402
+from fashion.retention import RetentionPolicy, count_tokens  # noqa: E402
+
+
+def phrase(rng, num_words):
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+
+def prompt_tokens(messages):
+    return sum(count_tokens(message["content"]) for message in messages)
+
+
+def simulate(rounds, checkpoints, bounded, articles_per_round, seed=0):
+    history_retention = recommender.HISTORY_RETENTION if bounded else RetentionPolicy()
+    news_retention = (
+        globalsummaries.RAW_NEWS_RETENTION if bounded else RetentionPolicy()
+    )
+    budget = recommender.RAW_CONTEXT_TOKEN_BUDGET if bounded else 0
+
+    rng = random.Random(seed)
+    state = recommender.setup(gender="womenswear", occupation="architect", age="41")
+    raw_news = []
+    results = []
+
+    original_budget = recommender.RAW_CONTEXT_TOKEN_BUDGET
+    recommender.RAW_CONTEXT_TOKEN_BUDGET = budget
+    try:
+        for round_index in range(1, rounds + 1):
+            event = EVENTS[round_index % len(EVENTS)]
+            props = {"event": event, "use_summaries": False}
+
+            if round_index in checkpoints:
+                messages = recommender.recommend_messages(state, props, raw_news)
+                results.append(
+                    {
+                        "round": round_index,
+                        "prompt_tokens": prompt_tokens(messages),
+                        "state_bytes": len(cloudpickle.dumps(dict(state))),
+                        "news_bytes": len(cloudpickle.dumps(raw_news)),
+                    }
+                )
+
+            # Same appends as the update ops and the news update
+            recommendation = {
+                field: phrase(rng, 5)
+                for field in recommender.RecommendationPrompt.model_fields
+            }
+            state["raw_previous_recommendations"] = history_retention.apply(
+                state["raw_previous_recommendations"] + [str(recommendation)]
+            )
+            state["search_history"] = history_retention.apply(
+                state["search_history"] + [event]
+            )
+            feedback = {
+                "outfit": list(recommendation.values()),
+                "action": rng.choice(["love", "dislike"]),
+                "feedback": phrase(rng, 6),
+                "event": event,
+            }
+            state["raw_user_feedback"] = history_retention.apply(
+                state["raw_user_feedback"] + [str(feedback)]
+            )
+            raw_news = news_retention.apply(
+                raw_news
+                + [
+                    (phrase(rng, 300), f"https://example.com/{round_index}/{i}.jpg")
+                    for i in range(articles_per_round)
+                ]
+            )
+    finally:
+        recommender.RAW_CONTEXT_TOKEN_BUDGET = original_budget
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prompt and state growth benchmark")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--articles-per-round", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    checkpoints = {1, 10, 50, 100, 200, 500, 1000, args.rounds}
+    checkpoints = {c for c in checkpoints if c <= args.rounds}
+
+    unbounded = simulate(args.rounds, checkpoints, False, args.articles_per_round)
+    bounded = simulate(args.rounds, checkpoints, True, args.articles_per_round)
+
+    table = Table(title="Raw-context prompt size vs. session count")
+    for column in [
+        "sessions",
+        "prompt tokens (unbounded)",
+        "prompt tokens (bounded)",
+        "user state KB (unbounded)",
+        "user state KB (bounded)",
+        "raw_news KB (unbounded)",
+        "raw_news KB (bounded)",
+    ]:
+        table.add_column(column, justify="right")
+    for before, after in zip(unbounded, bounded):
+        table.add_row(
+            str(before["round"]),
+            str(before["prompt_tokens"]),
+            str(after["prompt_tokens"]),
+            f"{before['state_bytes'] / 1024:.1f}",
+            f"{after['state_bytes'] / 1024:.1f}",
+            f"{before['news_bytes'] / 1024:.1f}",
+            f"{after['news_bytes'] / 1024:.1f}",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
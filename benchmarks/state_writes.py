@@ -0,0 +1,246 @@
+"""
+Bytes written to the state store per update as history grows, with the
+history lists in the pickled state (rewritten on every update) and in
+`fashion.liststate` lists (appended to). Runs the same appends as the
+Fashion and GlobalSummaries update ops through Motion's `saveState`, against
+a connection that counts the bytes of each write instead of sending it, so
+no LLM calls or Redis are needed.
+
+Usage:
+    python -m benchmarks.state_writes --rounds 1000
+"""
+
+import argparse
+import os
+import random
+
+from motion.dicts import State
+from motion.utils import saveState
+from rich import print
+from rich.table import Table
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+from benchmarks.fashion_load import EVENTS  # noqa: E402
+from benchmarks.mock_server import WORDS  # noqa: E402
+from fashion import globalsummaries, liststate, recommender  # noqa: E402
+from fashion.retention import RetentionPolicy  # noqa: E402
+
+
+class WriteCounter:
+    """Accepts the writes of saveState and ListStore and counts their bytes."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def _count(self, *values):
+        self.bytes += sum(
+            len(value) if isinstance(value, bytes) else len(str(value))
+            for value in values
+        )
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        self._count(key, value)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def rpush(self, key, *values):
+        self._count(key, *values)
+
+    def ltrim(self, key, start, end):
+        self._count(key, start, end)
+
+    def delete(self, key):
+        self._count(key)
+
+    def execute(self):
+        return []
+
+
+def phrase(rng, num_words):
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+
+class Component:
+    """One component instance's state and the bytes its updates write."""
+
+    def __init__(self, name, initial, list_keys, append_only):
+        self.name = name
+        self.redis = WriteCounter()
+        self.store = liststate.ListStore(list_keys, self.redis) if append_only else None
+        self.state = State(*name.split("__"), initial)
+        self.version = 0
+        self.update({})
+
+    def update(self, state_update):
+        # What Motion does with an update op's result
+        self.state.update(state_update)
+        before = self.redis.bytes
+        self.version = saveState(
+            self.state,
+            self.version,
+            self.redis,
+            self.name,
+            self.store.save if self.store else None,
+        )
+        return self.redis.bytes - before
+
+    def append(self, key, items, policy, now=None):
+        if self.store is not None:
+            return liststate.append(self.state[key], items, policy, now=now)
+        return policy.apply(self.state[key] + list(items), now=now)
+
+
+def simulate(rounds, checkpoints, append_only, articles_per_round, seed=0):
+    rng = random.Random(seed)
+    user = Component(
+        "Fashion__bench",
+        recommender.setup(gender="womenswear", occupation="architect", age="41"),
+        recommender.FASHION_LISTS.keys,
+        append_only,
+    )
+    global_summaries = Component(
+        "GlobalSummaries__bench",
+        globalsummaries.setup(),
+        globalsummaries.GLOBAL_SUMMARIES_LISTS.keys,
+        append_only,
+    )
+    policy = recommender.HISTORY_RETENTION
+    results = []
+
+    for round_index in range(1, rounds + 1):
+        event = EVENTS[round_index % len(EVENTS)]
+        now = 1_700_000_000 + round_index * 60
+        recommendation = {
+            field: phrase(rng, 5)
+            for field in recommender.RecommendationPrompt.model_fields
+        }
+        feedback = {
+            "outfit": list(recommendation.values()),
+            "action": rng.choice(["love", "dislike"]),
+            "feedback": phrase(rng, 6),
+            "event": event,
+        }
+
+        # Same appends as the update ops, one state write per op
+        user_writes = [
+            user.update(
+                {
+                    "raw_previous_recommendations": user.append(
+                        "raw_previous_recommendations", [str(recommendation)], policy
+                    )
+                }
+            ),
+            user.update(
+                {
+                    "search_history": user.append("search_history", [event], policy),
+                    "query_summary": phrase(rng, 60),
+                }
+            ),
+            user.update(
+                {
+                    "raw_user_feedback": user.append(
+                        "raw_user_feedback", [str(feedback)], policy
+                    ),
+                    "query_summary": phrase(rng, 60),
+                }
+            ),
+        ]
+        activity = [(now, f"User bench searched for {event}")]
+        global_writes = [
+            global_summaries.update(
+                {
+                    "pending_activity": global_summaries.append(
+                        "pending_activity", activity, RetentionPolicy()
+                    ),
+                    "user_activity": global_summaries.append(
+                        "user_activity",
+                        activity,
+                        globalsummaries.USER_ACTIVITY_RETENTION,
+                        now=now,
+                    ),
+                }
+            ),
+            global_summaries.update(
+                {
+                    "raw_news": global_summaries.append(
+                        "raw_news",
+                        [
+                            (
+                                phrase(rng, 300),
+                                f"https://example.com/{round_index}/{i}.jpg",
+                            )
+                            for i in range(articles_per_round)
+                        ],
+                        globalsummaries.RAW_NEWS_RETENTION,
+                    ),
+                    "news_summary": phrase(rng, 80),
+                }
+            ),
+        ]
+        if round_index % globalsummaries.ACTIVITY_BATCH_SIZE == 0:
+            global_writes.append(
+                global_summaries.update(
+                    {
+                        "pending_activity": [],
+                        "user_activity_summary": phrase(rng, 80),
+                    }
+                )
+            )
+
+        if round_index in checkpoints:
+            results.append(
+                {
+                    "round": round_index,
+                    "user_bytes": sum(user_writes) / len(user_writes),
+                    "global_bytes": sum(global_writes) / len(global_writes),
+                    "history": len(user.state["raw_user_feedback"]),
+                }
+            )
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="State bytes written per update")
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--articles-per-round", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    checkpoints = {1, 10, 50, 100, 200, 500, 1000, args.rounds}
+    checkpoints = {c for c in checkpoints if c <= args.rounds}
+
+    rewrite = simulate(args.rounds, checkpoints, False, args.articles_per_round)
+    append_only = simulate(args.rounds, checkpoints, True, args.articles_per_round)
+
+    table = Table(title="Bytes written per update vs. session count")
+    for column in [
+        "sessions",
+        "user history entries",
+        "Fashion KB (rewrite)",
+        "Fashion KB (append)",
+        "GlobalSummaries KB (rewrite)",
+        "GlobalSummaries KB (append)",
+    ]:
+        table.add_column(column, justify="right")
+    for before, after in zip(rewrite, append_only):
+        table.add_row(
+            str(before["round"]),
+            str(before["history"]),
+            f"{before['user_bytes'] / 1024:.2f}",
+            f"{after['user_bytes'] / 1024:.2f}",
+            f"{before['global_bytes'] / 1024:.2f}",
+            f"{after['global_bytes'] / 1024:.2f}",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
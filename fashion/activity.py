@@ -0,0 +1,218 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Optional
+
+from rich import print
+
+from fashion import tracing
+from fashion.activityfeed import ActivityFeed
+from fashion.globalsummaries import ACTIVITY_MAX_STALENESS, GlobalSummaries
+
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class ActivityLogger:
+    """Fire-and-forget channel for user activity events.
+
+    `log` puts the event on a bounded in-process queue and returns; a
+    background worker forwards queued events to GlobalSummaries in batches
+    (one "user_activity" run per batch), so Fashion update ops don't wait on
+    the global summarizer. When the queue is full, `log` waits at most
+    `put_timeout` seconds and then drops the event (counted in `dropped`).
+
+    The worker also runs the "flush_activity" flow once the oldest forwarded
+    event is `flush_interval` seconds old, which bounds how stale the
+    activity summary can get when traffic stops.
+
+    Each batch is also appended to the instance's ActivityFeed, the
+    time-ordered log that the Recent Activity page reads from.
+    """
+
+    def __init__(
+        self,
+        instance_id: str = "production",
+        max_queue_size: int = 1000,
+        put_timeout: float = 0.0,
+        max_batch_size: int = 100,
+        flush_interval: float = ACTIVITY_MAX_STALENESS,
+    ):
+        self.instance_id = instance_id
+        self.put_timeout = put_timeout
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+
+        self.logged = 0
+        self.dropped = 0
+        self.forwarded = 0
+        self.batches = 0
+        self.errors = 0
+        self.feed_errors = 0
+
+        # Once, not per worker start: a restarted worker would register again
+        atexit.register(self.close)
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="ActivityLogger", daemon=True
+                )
+                self._worker.start()
+
+    def log(self, activity: str, timestamp: Optional[float] = None) -> bool:
+        """Queues an activity event. Returns False if it was dropped."""
+        self._ensure_worker()
+        # The trace context lets the waterfall show the time spent queued
+        item = (
+            timestamp if timestamp is not None else time.time(),
+            activity,
+            tracing.trace_context(),
+        )
+        try:
+            if self.put_timeout > 0:
+                self._queue.put(item, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.logged += 1
+        return True
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every event logged so far has been forwarded and its
+        update applied to the GlobalSummaries state. Returns False on timeout."""
+        if self._worker is None:
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            return
+        self._queue.put((_STOP, None))
+        self._worker.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "logged": self.logged,
+                "dropped": self.dropped,
+                "forwarded": self.forwarded,
+                "batches": self.batches,
+                "errors": self.errors,
+                "feed_errors": self.feed_errors,
+            }
+
+    def _forward(self, gs, feed, batch) -> None:
+        if not batch:
+            return
+        events = [(timestamp, activity) for timestamp, activity, _ in batch]
+        try:
+            feed.append(events)
+        except Exception as e:
+            print(f"Failed to append {len(batch)} activity events to the feed: {e}")
+            with self._lock:
+                self.feed_errors += 1
+
+        traces = [trace for _, _, trace in batch if trace is not None]
+        try:
+            forwarded_at = time.time()
+            gs.run(
+                "user_activity",
+                props={
+                    "events": events,
+                    "timestamp": forwarded_at,
+                    # The batch's update op joins the first traced event's trace
+                    "trace": traces[0] if traces else None,
+                },
+            )
+            with self._lock:
+                self.forwarded += len(batch)
+                self.batches += 1
+            for timestamp, _, trace in batch:
+                tracing.record_span(
+                    "activity.queued",
+                    trace,
+                    timestamp,
+                    forwarded_at,
+                    batch_size=len(batch),
+                )
+        except Exception as e:
+            print(f"Failed to forward {len(batch)} activity events: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def _run(self) -> None:
+        gs = GlobalSummaries(self.instance_id)
+        feed = ActivityFeed(self.instance_id)
+        # Log time of the oldest forwarded event not yet covered by a
+        # flush_activity run
+        pending_since = None
+
+        try:
+            while True:
+                timeout = None
+                if pending_since is not None:
+                    timeout = max(
+                        0.0, self.flush_interval - (time.time() - pending_since)
+                    )
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                # Collect whatever else is already queued into the same batch
+                batch = []
+                control = None
+                while item is not None:
+                    if item[0] in (_FLUSH, _STOP):
+                        control = item
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.max_batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        item = None
+
+                self._forward(gs, feed, batch)
+                if batch and pending_since is None:
+                    pending_since = min(item[0] for item in batch)
+
+                if control is not None and control[0] == _FLUSH:
+                    try:
+                        gs.flush_update("user_activity")
+                    except Exception as e:
+                        print(f"Failed to flush activity updates: {e}")
+                    finally:
+                        control[1].set()
+
+                elif control is not None and control[0] == _STOP:
+                    break
+
+                if (
+                    pending_since is not None
+                    and time.time() - pending_since >= self.flush_interval
+                ):
+                    try:
+                        gs.run("flush_activity", props={"timestamp": time.time()})
+                    except Exception as e:
+                        print(f"Failed to run flush_activity: {e}")
+                    pending_since = None
+
+        finally:
+            gs.shutdown()
@@ -0,0 +1,88 @@
+"""
+Time-ordered, append-only log of user activity events.
+
+Events are appended to a Redis stream (`ACTIVITY_FEED:<instance>`) by the
+ActivityLogger worker. Stream ids are append times in milliseconds, so
+readers can ask for the latest K events or for the events after a cursor
+(the last id they saw, or a timestamp) without reading the whole log. The
+stream is trimmed to roughly ACTIVITY_FEED_MAX_LEN entries.
+"""
+
+import os
+from typing import Iterable, List, Optional, Tuple
+
+import redis
+from motion.utils import get_redis_params
+
+ACTIVITY_FEED_MAX_LEN = int(os.getenv("ACTIVITY_FEED_MAX_LEN", "1000000"))
+
+# (stream id, timestamp, activity)
+Entry = Tuple[str, float, str]
+
+
+def parse_id(id: str) -> Tuple[int, int]:
+    """Stream ids in append order, e.g. for comparing against a cursor."""
+    milliseconds, sequence = id.split("-")
+    return int(milliseconds), int(sequence)
+
+
+def timestamp_cursor(timestamp: float) -> str:
+    """Cursor for the events appended after `timestamp`."""
+    return f"{int(timestamp * 1000)}-0"
+
+
+class ActivityFeed:
+    def __init__(
+        self,
+        instance_id: str = "production",
+        redis_con: Optional[redis.Redis] = None,
+        max_len: int = ACTIVITY_FEED_MAX_LEN,
+    ):
+        self.key = f"ACTIVITY_FEED:{instance_id}"
+        self.max_len = max_len
+        self._redis = redis_con or redis.Redis(**get_redis_params().model_dump())
+
+    def append(self, events: Iterable[Tuple[float, str]]) -> List[str]:
+        """Appends (timestamp, activity) events in one round trip."""
+        pipeline = self._redis.pipeline(transaction=False)
+        for timestamp, activity in events:
+            pipeline.xadd(
+                self.key,
+                {"ts": repr(float(timestamp)), "activity": activity},
+                maxlen=self.max_len,
+                approximate=True,
+            )
+        return [
+            id.decode("utf-8") if isinstance(id, bytes) else id
+            for id in pipeline.execute()
+        ]
+
+    def _entries(self, raw) -> List[Entry]:
+        entries = []
+        for id, fields in raw:
+            fields = {
+                key.decode("utf-8"): value.decode("utf-8")
+                for key, value in fields.items()
+            }
+            entries.append(
+                (
+                    id.decode("utf-8") if isinstance(id, bytes) else id,
+                    float(fields["ts"]),
+                    fields["activity"],
+                )
+            )
+        return entries
+
+    def latest(self, count: int) -> List[Entry]:
+        """The last `count` events, oldest first."""
+        return self._entries(self._redis.xrevrange(self.key, count=count))[::-1]
+
+    def since(self, cursor: str, count: Optional[int] = None) -> List[Entry]:
+        """Events appended after `cursor` (a stream id from an earlier read,
+        or `timestamp_cursor(t)`), oldest first, at most `count` of them."""
+        return self._entries(
+            self._redis.xrange(self.key, min=f"({cursor}", count=count)
+        )
+
+    def __len__(self) -> int:
+        return self._redis.xlen(self.key)
@@ -0,0 +1,267 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cloudpickle
+import redis
+from motion.utils import get_redis_params
+
+from fashion.globalsummaries import GlobalSummaries, news_version_key
+
+
+class GlobalSummariesCache:
+    """Process-wide, versioned cache of GlobalSummaries state for serve ops.
+
+    All readers share one long-lived GlobalSummaries instance instead of
+    constructing a component per call. Cached values are tagged with the
+    `news_version` that `update_news_summary` bumps, so they are invalidated
+    only when a new news summary is written (user activity writes don't
+    evict them). The version is re-checked at most once every
+    `refresh_interval` seconds with a single GET of its own key
+    (`news_version_key`), so activity updates, which bump Motion's state
+    version, don't make readers reload the whole state; the state is only
+    loaded for keys missing from the cache. Redis is never read with the lock
+    held, so cache hits don't wait behind another thread's round trip.
+
+    Only cache keys written by `update_news_summary` (e.g., `news_summary`,
+    `raw_news`).
+    """
+
+    def __init__(self, instance_id: str = "production", refresh_interval: float = 5.0):
+        self.instance_id = instance_id
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        # Serializes the reader's state loads, which aren't thread-safe
+        self._load_lock = threading.Lock()
+        self._reader = None
+        self._redis = None
+        self._values = {}
+        self._version = None
+        self._checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _get_reader(self):
+        if self._reader is None:
+            self._reader = GlobalSummaries(self.instance_id, disable_update_task=True)
+        return self._reader
+
+    def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis(**get_redis_params().model_dump())
+        return self._redis
+
+    def _read_version(self) -> int:
+        version = self._get_redis().get(news_version_key(self.instance_id))
+        if version is None:
+            # Written on the first save; fall back to the state until then
+            with self._load_lock:
+                return self._get_reader().read_state("news_version", 0)
+        return int(version)
+
+    def _check_version(self) -> None:
+        with self._lock:
+            if (
+                self._version is not None
+                and time.time() - self._checked_at < self.refresh_interval
+            ):
+                return
+
+        version = self._read_version()
+        with self._lock:
+            self._checked_at = time.time()
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._values = {}
+                self._version = version
+
+    def read(self, key: str, default=None):
+        self._check_version()
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            version = self._version
+
+        with self._load_lock:
+            reader = self._get_reader()
+            value = reader.read_state(key, default)
+            loaded_version = reader.read_state("news_version", 0)
+
+        # The version key is written just before the state, so the loaded
+        # state can briefly be older; don't cache it under the new version
+        with self._lock:
+            if loaded_version == version == self._version:
+                self._values[key] = value
+        return value
+
+    async def aread(self, key: str, default=None):
+        """`read` for async ops: a cached value whose version was checked
+        recently is returned on the event loop; otherwise Redis is read on a
+        worker thread."""
+        with self._lock:
+            if (
+                key in self._values
+                and time.time() - self._checked_at < self.refresh_interval
+            ):
+                self.hits += 1
+                return self._values[key]
+        return await asyncio.to_thread(self.read, key, default)
+
+    def version(self) -> int:
+        """Returns the news_version the cached values belong to."""
+        self._check_version()
+        with self._lock:
+            return self._version
+
+    def invalidate(self) -> None:
+        """Drops cached values and forces a version check on the next read."""
+        with self._lock:
+            self._values = {}
+            self._version = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "version": self._version,
+            }
+
+
+class ResultCache:
+    """Thread-safe LRU cache for serve op results, with a TTL and limits on
+    the number of entries and their total (pickled) size.
+
+    Concurrent requests for the same key are coalesced: the first caller
+    computes the result and the others wait for it instead of recomputing.
+    Set `ttl` to 0 to disable caching (requests are still coalesced).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._inflight = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def _store(self, key: str, value) -> None:
+        if self.ttl <= 0:
+            return
+        try:
+            size = len(cloudpickle.dumps(value))
+        except Exception:
+            size = 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (time.time() + self.ttl, size, value)
+            self._bytes += size
+            self._evict()
+
+    def _lookup(self, key: str):
+        # Must be called with the lock held. Returns (True, value) on a hit.
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, size, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._entries[key]
+            self._bytes -= size
+            self.expirations += 1
+        return False, None
+
+    def get(self, key: str, default=None):
+        """Returns the cached value, or `default` (counted as a miss)."""
+        with self._lock:
+            hit, value = self._lookup(key)
+            if not hit:
+                self.misses += 1
+                return default
+            return value
+
+    def put(self, key: str, value) -> None:
+        """Stores a value computed outside of `get_or_compute` (e.g., streamed)."""
+        self._store(key, value)
+
+    def get_or_compute(self, key: str, compute):
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                return value
+
+            owner = False
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+            else:
+                inflight = Future()
+                self._inflight[key] = inflight
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            return inflight.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set_exception(e)
+            raise
+
+        self._store(key, value)
+        with self._lock:
+            self._inflight.pop(key, None)
+        inflight.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,256 @@
+"""
+Process-wide HTTP and LLM clients.
+
+Every component shares one pooled httpx client (keep-alive, bounded pool,
+HTTP/2 when the `h2` package is installed, explicit timeouts), so LLM calls
+reuse warm connections instead of each OpenAI client paying for its own TCP
+and TLS setup. `connection_stats.snapshot()` reports how many requests
+reused a pooled connection.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import instructor
+from openai import AsyncOpenAI, OpenAI
+
+from fashion import metrics
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))
+# "auto" uses HTTP/2 if the h2 package is installed
+HTTP2 = os.getenv("HTTP2", "auto")
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+
+def http2_enabled() -> bool:
+    if HTTP2 == "auto":
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return HTTP2 == "1"
+
+
+class ConnectionStats:
+    """Counts requests and the connections opened for them. Requests that
+    didn't open a connection reused one from the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.http2_responses = 0
+
+    def on_trace(self, event: str, info) -> None:
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def on_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self.on_trace
+        self._count_request()
+
+    def _count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def on_response(self, response: httpx.Response) -> None:
+        if response.http_version == "HTTP/2":
+            with self._lock:
+                self.http2_responses += 1
+
+    async def aon_trace(self, event: str, info) -> None:
+        self.on_trace(event, info)
+
+    async def aon_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self.aon_trace
+        self._count_request()
+
+    async def aon_response(self, response: httpx.Response) -> None:
+        self.on_response(response)
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "reused": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+                "tls_handshakes": self.tls_handshakes,
+                "http2_responses": self.http2_responses,
+            }
+
+
+connection_stats = ConnectionStats()
+metrics.registry.register_collector(
+    metrics.stats_collector(
+        "http_connection_stats",
+        "Requests, new connections and reuse of the shared HTTP client",
+        connection_stats.snapshot,
+        "stat",
+    )
+)
+
+
+def http_client_kwargs():
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        "http2": http2_enabled(),
+    }
+
+
+class ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """A response body that calls `release` once, when it is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        for chunk in self._stream:
+            yield chunk
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    def _done(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+# httpcore rescans every queued request whenever a connection is taken or
+# released, so with hundreds of requests queued in its pool, the threads (or
+# the event loop) spend their time on pool bookkeeping. The bounded
+# transports let at most `max_requests` requests into the pool at a time;
+# the others wait on a semaphore.
+
+
+class BoundedTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.BaseTransport, max_requests: int):
+        self._transport = transport
+        self._semaphore = threading.Semaphore(max_requests)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self._semaphore.acquire(timeout=HTTP_TIMEOUT):
+            raise httpx.PoolTimeout("Timed out waiting for a connection")
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        response.stream = ReleasingStream(response.stream, self._semaphore.release)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class BoundedAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_requests: int):
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max_requests)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), HTTP_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout("Timed out waiting for a connection")
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        response.stream = ReleasingStream(response.stream, self._semaphore.release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def bounded_client_kwargs(transport_cls, bounded_cls):
+    # The pool limits and HTTP/2 go to the transport the client wraps
+    kwargs = http_client_kwargs()
+    transport = transport_cls(limits=kwargs.pop("limits"), http2=kwargs.pop("http2"))
+    return {"transport": bounded_cls(transport, HTTP_MAX_CONNECTIONS), **kwargs}
+
+
+http_client = httpx.Client(
+    **bounded_client_kwargs(httpx.HTTPTransport, BoundedTransport),
+    event_hooks={
+        "request": [connection_stats.on_request, metrics.on_llm_request],
+        "response": [connection_stats.on_response, metrics.on_llm_response],
+    },
+)
+
+# One OpenAI client for plain completions and the instructor wrapper (which
+# doesn't modify the client it wraps)
+oai_client = OpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+client = instructor.from_openai(oai_client)
+
+
+# Async connections belong to the event loop that opened them, so the async
+# clients are shared per loop rather than per process
+_async_clients = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def async_clients():
+    """Returns the (AsyncOpenAI, instructor) clients for the running loop."""
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            async_http_client = httpx.AsyncClient(
+                **bounded_client_kwargs(
+                    httpx.AsyncHTTPTransport, BoundedAsyncTransport
+                ),
+                event_hooks={
+                    "request": [connection_stats.aon_request, metrics.aon_llm_request],
+                    "response": [
+                        connection_stats.aon_response,
+                        metrics.aon_llm_response,
+                    ],
+                },
+            )
+            async_oai_client = AsyncOpenAI(
+                http_client=async_http_client, max_retries=OPENAI_MAX_RETRIES
+            )
+            clients = (async_oai_client, instructor.from_openai(async_oai_client))
+            _async_clients[loop] = clients
+        return clients
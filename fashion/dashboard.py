@@ -0,0 +1,219 @@
+"""
+One process-wide poller behind the dashboard pages.
+
+Every open dashboard tab used to run its own `while True` loop, reading Redis
+on its own timer, so the read load on the state store grew with the number of
+viewers. `DashboardPoller` reads everything the pages show once per
+DASHBOARD_POLL_SECONDS on a background thread: the Fashion version stamps
+(via StateFeed), the news summary (only when the GlobalSummaries version
+moves), the news worker's headlines, and the new activity events. Pages get
+the latest immutable `Snapshot` with `shared_poller().snapshot()` from a
+`st.fragment(run_every=...)`, which is a memory read. User states are loaded
+once per version and shared by all viewers.
+"""
+
+import difflib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+import redis
+import streamlit as st
+from motion.utils import get_redis_params
+from rich import print
+
+from fashion.activityfeed import ActivityFeed, Entry
+from fashion.metrics import registry, stats_collector
+from fashion.news_worker import latest_headlines
+from fashion.statefeed import StateFeed
+
+DASHBOARD_POLL_SECONDS = float(os.getenv("DASHBOARD_POLL_SECONDS", "2"))
+# Most recent activity events kept for the pages
+ACTIVITY_WINDOW = int(os.getenv("ACTIVITY_WINDOW", "200"))
+# User states (and their query_summary diffs) kept in memory
+DASHBOARD_STATE_CACHE_SIZE = int(os.getenv("DASHBOARD_STATE_CACHE_SIZE", "64"))
+GLOBAL_SUMMARIES_ID = os.getenv("GLOBAL_SUMMARIES_ID", "production")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """What the dashboard pages show, as of `taken_at`. `activity_seq` and
+    `users_seq` are bumped when the activity window or the user versions
+    change, so a page can skip rebuilding what it derives from them."""
+
+    taken_at: float = 0.0
+    news_summary: str = ""
+    headlines_time: Optional[float] = None
+    headlines: List[dict] = field(default_factory=list)
+    # Oldest first
+    activity: List[Entry] = field(default_factory=list)
+    activity_seq: int = 0
+    # Fashion instance id -> version and when it last moved
+    user_versions: Dict[str, int] = field(default_factory=dict)
+    user_changed_at: Dict[str, float] = field(default_factory=dict)
+    users_seq: int = 0
+
+
+@dataclass(frozen=True)
+class InspectedUser:
+    instance_id: str
+    version: int
+    state: Optional[dict]
+    # Diff of query_summary against the previous version loaded
+    query_summary_diff: str
+
+
+class DashboardPoller:
+    def __init__(
+        self,
+        interval: float = DASHBOARD_POLL_SECONDS,
+        instance_id: str = GLOBAL_SUMMARIES_ID,
+        redis_con: Optional[redis.Redis] = None,
+    ):
+        self.interval = interval
+        self.instance_id = instance_id
+        self._redis = redis_con or redis.Redis(**get_redis_params().model_dump())
+        self.users = StateFeed("Fashion", self._redis)
+        self.global_summaries = StateFeed("GlobalSummaries", self._redis)
+        self.activity = ActivityFeed(instance_id, self._redis)
+
+        self._lock = threading.Lock()
+        self._snapshot = Snapshot()
+        self._news_version = None
+        self._activity_cursor = None
+        self._states = OrderedDict()  # instance id -> InspectedUser
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.counts = {"polls": 0, "poll_errors": 0, "snapshots": 0, "state_loads": 0}
+
+    def start(self) -> "DashboardPoller":
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="DashboardPoller", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                with self._lock:
+                    self.counts["poll_errors"] += 1
+                print(f"Dashboard poll failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def poll(self) -> Snapshot:
+        """Reads what changed since the last poll and publishes a new
+        snapshot."""
+        snapshot = self._snapshot
+        changes = {"taken_at": time.time()}
+
+        # One MGET of version stamps per chunk of users
+        known = set(self.users.versions)
+        if self.users.poll() or set(self.users.versions) != known:
+            changes["user_versions"] = dict(self.users.versions)
+            changes["user_changed_at"] = dict(self.users.changed_at)
+            changes["users_seq"] = snapshot.users_seq + 1
+
+        # The news summary is only reloaded when GlobalSummaries was saved
+        version = self.global_summaries.read_versions([self.instance_id]).get(
+            self.instance_id
+        )
+        if version is not None and version != self._news_version:
+            state, version = self.global_summaries.load(self.instance_id)
+            self._news_version = version
+            news_summary = (state or {}).get("news_summary", "")
+            if news_summary != snapshot.news_summary:
+                changes["news_summary"] = news_summary
+
+        headlines_time, headlines = latest_headlines(self._redis, self.instance_id)
+        if headlines_time != snapshot.headlines_time:
+            changes["headlines_time"] = headlines_time
+            changes["headlines"] = headlines
+
+        # Only the events appended since the last poll; if more than a
+        # window's worth arrived, jump to the latest window
+        if self._activity_cursor is None:
+            new_activity = self.activity.latest(ACTIVITY_WINDOW)
+        else:
+            new_activity = self.activity.since(
+                self._activity_cursor, count=ACTIVITY_WINDOW + 1
+            )
+            if len(new_activity) > ACTIVITY_WINDOW:
+                new_activity = self.activity.latest(ACTIVITY_WINDOW)
+        if new_activity:
+            self._activity_cursor = new_activity[-1][0]
+            changes["activity"] = (snapshot.activity + new_activity)[-ACTIVITY_WINDOW:]
+            changes["activity_seq"] = snapshot.activity_seq + 1
+
+        with self._lock:
+            self._snapshot = replace(snapshot, **changes)
+            self.counts["polls"] += 1
+            return self._snapshot
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            self.counts["snapshots"] += 1
+            return self._snapshot
+
+    def inspect(self, instance_id: str) -> InspectedUser:
+        """The user's state as of the latest poll, loaded once per version
+        for all viewers, with the diff of its query_summary against the
+        version loaded before it."""
+        version = self._snapshot.user_versions.get(instance_id)
+        with self._lock:
+            cached = self._states.get(instance_id)
+            # The load may have seen a newer version than the last poll
+            if cached is not None and (version is None or cached.version >= version):
+                self._states.move_to_end(instance_id)
+                return cached
+
+        state, version = self.users.load(instance_id)
+        if cached is not None and cached.state is not None and state is not None:
+            diff = "\n".join(
+                difflib.ndiff(
+                    cached.state["query_summary"].splitlines(),
+                    state["query_summary"].splitlines(),
+                )
+            )
+        else:
+            diff = "No previous summary stored."
+        inspected = InspectedUser(instance_id, version, state, diff)
+
+        with self._lock:
+            self.counts["state_loads"] += 1
+            self._states.pop(instance_id, None)
+            self._states[instance_id] = inspected
+            while len(self._states) > DASHBOARD_STATE_CACHE_SIZE:
+                self._states.popitem(last=False)
+        return inspected
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "cached_states": len(self._states)}
+
+
+@st.cache_resource
+def shared_poller() -> DashboardPoller:
+    """The one poller for all sessions of this Streamlit server."""
+    poller = DashboardPoller()
+    registry.register_collector(
+        stats_collector(
+            "dashboard_poller_stats",
+            "Polls of the state store and snapshots served to dashboard pages",
+            poller.stats,
+            "stat",
+        )
+    )
+    return poller.start()
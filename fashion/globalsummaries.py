@@ -1,127 +1,232 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+import hashlib
+import threading
 from motion import Component
 import os
-from openai import OpenAI
 
-import requests
 from rich import print
 
+from fashion import liststate
+from fashion.clients import oai_client
+from fashion.images import image_validator
+from fashion.metrics import instrument, registry, stats_collector
+from fashion.newsdigest import summarize_news
+from fashion.retention import RetentionPolicy
+
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-oai_client = OpenAI()
+# Bounds on the list-valued state, which would otherwise grow forever
+RAW_NEWS_RETENTION = RetentionPolicy(
+    max_items=int(os.getenv("RAW_NEWS_MAX_ITEMS", "200")),
+    max_bytes=int(os.getenv("RAW_NEWS_MAX_BYTES", str(1024 * 1024))),
+)
+USER_ACTIVITY_RETENTION = RetentionPolicy(
+    max_items=int(os.getenv("USER_ACTIVITY_MAX_ITEMS", "1000")),
+    max_bytes=int(os.getenv("USER_ACTIVITY_MAX_BYTES", str(256 * 1024))),
+    max_age=float(os.getenv("USER_ACTIVITY_MAX_AGE", str(7 * 24 * 3600))),
+)
+
+# How long to remember summarized urls and article hashes for dedup
+SUMMARIZED_TTL = float(os.getenv("SUMMARIZED_TTL", str(7 * 24 * 3600)))
+SUMMARIZED_MAX_ITEMS = int(os.getenv("SUMMARIZED_MAX_ITEMS", "5000"))
+
+# Fold user activity into the summary every N events or T seconds
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "10"))
+ACTIVITY_MAX_STALENESS = float(os.getenv("ACTIVITY_MAX_STALENESS", "60"))
 
 
 GlobalSummaries = Component("GlobalSummaries")
 
+# Appended to on every update instead of rewritten (see fashion/liststate.py)
+GLOBAL_SUMMARIES_LISTS = liststate.ListStore(
+    ["raw_news", "user_activity", "pending_activity"]
+)
+
+
+def news_version_key(instance_id):
+    return f"GLOBAL_SUMMARIES_NEWS_VERSION:{instance_id}"
+
+
+def save_state(state):
+    saved = GLOBAL_SUMMARIES_LISTS.save(state)
+    # news_version also goes in its own key, so readers can tell whether the
+    # news changed without loading the state (which every activity update
+    # rewrites)
+    GLOBAL_SUMMARIES_LISTS.redis.set(
+        news_version_key(state.instance_id), state.get("news_version", 0)
+    )
+    return saved
+
+
+GlobalSummaries.save_state(save_state)
+GlobalSummaries.load_state(GLOBAL_SUMMARIES_LISTS.load)
+
 
 @GlobalSummaries.init_state
 def setup():
     return {
-        "urls_summarized": [],
+        "urls_summarized": {},  # url -> timestamp it was summarized
+        "content_hashes": {},  # hash of article text -> timestamp
         "news_summary": "",
+        "news_version": 0,
         "raw_news": [],
         "user_activity": [],
+        "user_activity_summary": "",
+        "pending_activity": [],  # (timestamp, event) not yet in the summary
     }
 
 
+# Counts of news summary refreshes performed and skipped in this process
+news_refresh_counts = Counter()
+news_refresh_lock = threading.Lock()
+
+
+def record_news_refresh(outcome):
+    with news_refresh_lock:
+        news_refresh_counts[outcome] += 1
+
+
+registry.register_collector(
+    stats_collector(
+        "news_refresh_stats",
+        "News summary refreshes performed and skipped in this process",
+        lambda: dict(news_refresh_counts),
+        "outcome",
+    )
+)
+
+
+def load_index(index, timestamp):
+    # Older states stored urls_summarized as a list
+    if isinstance(index, dict):
+        return dict(index)
+    return dict.fromkeys(index, timestamp)
+
+
+def expire_index(index, now):
+    # Drops entries outside the dedup window, then the oldest ones if there
+    # are still too many
+    index = {key: ts for key, ts in index.items() if now - ts < SUMMARIZED_TTL}
+    if len(index) > SUMMARIZED_MAX_ITEMS:
+        newest = sorted(index.items(), key=lambda item: item[1])[-SUMMARIZED_MAX_ITEMS:]
+        index = dict(newest)
+    return index
+
+
+def content_hash(text):
+    # Syndicated copies of an article differ in case and whitespace at most
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
 @GlobalSummaries.update("news")
+@instrument("GlobalSummaries", "update")
 def update_news_summary(state, props):
     # Check if timestamp is more than 10 minutes ago
     if "last_news_update" in state:
         if props["timestamp"] - state["last_news_update"] < 600:
+            record_news_refresh("skipped_throttled")
             return {}
 
     # Get the urls to summarize
     new_items = props["urls_and_news_texts"]  # list of (url, (text, img_url)) tuples
+    now = props["timestamp"]
 
-    # Filter out the urls that have already been summarized
-    new_texts = [text for url, text in new_items if url not in state["urls_summarized"]]
+    urls_summarized = expire_index(
+        load_index(state["urls_summarized"], state.get("last_news_update", now)),
+        now,
+    )
+    content_hashes = expire_index(dict(state.get("content_hashes", {})), now)
+
+    # Filter out the urls that have already been summarized, and copies of
+    # articles we have already seen under a different url, in one pass
+    new_texts = []
+    news_img_urls = []
+    for url, (text, img_url) in new_items:
+        if url in urls_summarized:
+            continue
+        urls_summarized[url] = now
+
+        digest = content_hash(text)
+        if digest in content_hashes:
+            continue
+        content_hashes[digest] = now
+
+        new_texts.append((text, img_url))
+        if img_url:
+            news_img_urls.append(img_url)
+
+    # Nothing new to summarize: don't call the LLM or write state (so the
+    # news_version and downstream caches stay as they are)
+    if not new_texts:
+        print("No new news articles to summarize, skipping news summary update")
+        record_news_refresh("skipped_no_new_content")
+        return {}
 
-    news_htmls = "\n\n".join([f"<p>{text}</p>" for text in new_texts])
-    news_img_urls = [
-        img_url
-        for url, (_, img_url) in new_items
-        if img_url and url not in state["urls_summarized"]
-    ]
     news_img_urls = news_img_urls[:8]
 
-    # Try to download these news_img_urls to make sure they work
-    valid_img_urls = []
-    with ThreadPoolExecutor() as executor:
-        futures = {
-            executor.submit(requests.get, img_url): img_url for img_url in news_img_urls
-        }
-        for future in as_completed(futures):
-            img_url = futures[future]
-            try:
-                response = future.result()
-                if (
-                    response.status_code == 200
-                    and "image" in response.headers["Content-Type"]
-                ):
-                    print(f"Downloaded image at {img_url}")
-                    valid_img_urls.append(img_url)
-                else:
-                    print(f"Invalid image content type or error status for {img_url}")
-            except Exception as e:
-                print(f"Failed to download image at {img_url}: {e}")
-    news_img_urls = valid_img_urls
-
-    old_summary = state["news_summary"]
+    # Keep the images that still resolve to an image (cheap, cached checks;
+    # the news worker starts them when it fetches the articles)
+    news_img_urls = image_validator.filter_valid(news_img_urls)
 
-    response = oai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a news summarizer. Please summarize the news related to fashion trends and what to wear.",
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": f"Here is a summary of fashion trends:\n\n{old_summary}\n\nHere are the latest news articles and their images related to fashion trends and what to wear:\n\n{news_htmls}\n\nPlease generate a new summary (up to 5 sentences) that keeps the existing trends and includes trends from the latest news articles. Keep the trends focused on what to wear, not necessarily the news articles themselves.",
-                    },
-                    *[
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": img_url, "detail": "low"},
-                        }
-                        for img_url in news_img_urls
-                    ],
-                ],
-            },
-        ],
+    # Map-reduce over the articles by default (see fashion/newsdigest.py)
+    new_summary = summarize_news(
+        state["news_summary"], [text for text, _ in new_texts], news_img_urls
     )
-    new_summary = response.choices[0].message.content
     print(
         f"Updated news summary from GPT-4o, including {len(news_img_urls)} images: {new_summary}"
     )
 
-    # Update urls with the new urls
-    urls = state["urls_summarized"] + [
-        url for url, _ in new_items if url not in state["urls_summarized"]
-    ]
-
-    raw_news = state["raw_news"] + new_texts
+    record_news_refresh("performed")
+    raw_news = liststate.append(state["raw_news"], new_texts, RAW_NEWS_RETENTION)
 
     return {
-        "urls_summarized": urls,
+        "urls_summarized": urls_summarized,
+        "content_hashes": content_hashes,
         "news_summary": new_summary,
+        "news_version": state.get("news_version", 0) + 1,
         "raw_news": raw_news,
         "last_news_update": props["timestamp"],
     }
 
 
-@GlobalSummaries.update("user_activity")
+@GlobalSummaries.update(["user_activity", "flush_activity"])
+@instrument("GlobalSummaries", "update")
 def update_user_activity_summary(state, props):
-    user_activity = props["user_activity"]
+    # Takes a single event (user_activity) or a batch of (timestamp, event)
+    # tuples (events). Events are appended cheaply and folded into the
+    # summary in batches: once ACTIVITY_BATCH_SIZE events are pending or the
+    # oldest pending event is ACTIVITY_MAX_STALENESS seconds old. Running
+    # the "flush_activity" flow periodically bounds staleness when traffic
+    # stops.
     timestamp = props["timestamp"]
-    old_summary = state["user_activity_summary"]
+    events = [tuple(event) for event in props.get("events", [])]
+    if "user_activity" in props:
+        events.append((timestamp, props["user_activity"]))
+
+    pending = liststate.append(state.get("pending_activity", []), events)
+    state_update = {"pending_activity": pending}
+    if events:
+        state_update["user_activity"] = liststate.append(
+            state["user_activity"], events, USER_ACTIVITY_RETENTION, now=timestamp
+        )
+
+    if not pending:
+        return state_update if events else {}
+
+    oldest = min(ts for ts, _ in pending)
+    if (
+        len(pending) < ACTIVITY_BATCH_SIZE
+        and timestamp - oldest < ACTIVITY_MAX_STALENESS
+        and not props.get("force", False)
+    ):
+        return state_update
+
+    old_summary = state.get("user_activity_summary", "")
+    latest_activity = "\n".join(f"- {activity}" for _, activity in pending)
 
     response = oai_client.chat.completions.create(
         model="gpt-4o",
@@ -132,13 +237,12 @@ def update_user_activity_summary(state, props):
             },
             {
                 "role": "user",
-                "content": f"Here is a summary of user activity:\n\n{old_summary}\n\nHere is the latest user activity event:\n\n{user_activity}\n\nPlease update the summary to include the latest user activity event. The summary should be one paragraph of plain text prose (no bullets or formatting), and should include any trends or patterns in the user activity.",
+                "content": f"Here is a summary of user activity:\n\n{old_summary}\n\nHere are the latest user activity events:\n\n{latest_activity}\n\nPlease update the summary to include the latest user activity events. The summary should be one paragraph of plain text prose (no bullets or formatting), and should include any trends or patterns in the user activity.",
             },
         ],
     )
     new_summary = response.choices[0].message.content
 
-    return {
-        "user_activity_summary": new_summary,
-        "user_activity": state["user_activity"] + [(timestamp, user_activity)],
-    }
+    state_update["user_activity_summary"] = new_summary
+    state_update["pending_activity"] = []
+    return state_update
@@ -0,0 +1,227 @@
+"""
+Cheap, cached checks that image URLs point at an image.
+
+`ImageValidator` asks for the headers only (HEAD, or a ranged GET of the
+first IMAGE_PROBE_BYTES when a server doesn't answer HEAD) over one pooled
+session with strict timeouts, instead of downloading the whole image.
+Verdicts are cached per URL (valid ones for IMAGE_VALID_TTL, invalid ones
+for IMAGE_INVALID_TTL). Validation runs on a bounded background pool:
+`prefetch` starts it as soon as the URLs are known, and `filter_valid` waits
+at most a time budget, so a slow image host can't hold up the caller.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fashion.metrics import registry, stats_collector
+
+IMAGE_CONNECT_TIMEOUT = float(os.getenv("IMAGE_CONNECT_TIMEOUT", "2"))
+IMAGE_READ_TIMEOUT = float(os.getenv("IMAGE_READ_TIMEOUT", "3"))
+IMAGE_PROBE_BYTES = int(os.getenv("IMAGE_PROBE_BYTES", "1024"))
+IMAGE_VALIDATION_CONCURRENCY = int(os.getenv("IMAGE_VALIDATION_CONCURRENCY", "8"))
+# How long filter_valid waits for verdicts that aren't cached yet
+IMAGE_VALIDATION_BUDGET = float(os.getenv("IMAGE_VALIDATION_BUDGET", "2"))
+IMAGE_VALID_TTL = float(os.getenv("IMAGE_VALID_TTL", str(24 * 3600)))
+IMAGE_INVALID_TTL = float(os.getenv("IMAGE_INVALID_TTL", "3600"))
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "10000"))
+
+IMAGE_VALIDATIONS = registry.counter(
+    "image_validations_total",
+    "Image URL validations by request method and verdict",
+    ("method", "verdict"),
+)
+IMAGE_VALIDATION_LATENCY = registry.histogram(
+    "image_validation_seconds", "Time to validate one image URL"
+)
+IMAGE_BYTES_DOWNLOADED = registry.counter(
+    "image_validation_bytes_downloaded_total",
+    "Response body bytes read while validating images",
+)
+IMAGE_BYTES_AVOIDED = registry.counter(
+    "image_validation_bytes_avoided_total",
+    "Image bytes (per Content-Length) that validation didn't download",
+)
+IMAGE_SECONDS_SAVED = registry.counter(
+    "image_validation_seconds_saved_total",
+    "Validation time saved by cached verdicts (mean validation time per hit)",
+)
+
+
+def content_length(response) -> Optional[int]:
+    # Full size of the image: Content-Range of a ranged response
+    # ("bytes 0-1023/52311"), else Content-Length
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length", "")
+    return int(length) if length.isdigit() else None
+
+
+def is_image(response) -> bool:
+    return response.status_code in (200, 206) and response.headers.get(
+        "Content-Type", ""
+    ).startswith("image/")
+
+
+class ImageValidator:
+    def __init__(
+        self,
+        concurrency: int = IMAGE_VALIDATION_CONCURRENCY,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (IMAGE_CONNECT_TIMEOUT, IMAGE_READ_TIMEOUT)
+        self.max_entries = max_entries
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="ImageValidator"
+        )
+        # Reentrant: a check that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._verdicts = OrderedDict()  # url -> (expires_at, valid)
+        self._inflight = {}  # url -> Future
+
+        self.hits = 0
+        self.misses = 0
+        self.validated = 0
+        self.validation_seconds = 0.0
+
+    def _probe(self, url: str):
+        # Returns (method, response, bytes read)
+        response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        if response.status_code not in (403, 405, 501) and response.headers.get(
+            "Content-Type"
+        ):
+            return "head", response, 0
+
+        # Some hosts don't answer HEAD: read just the first bytes instead
+        with self.session.get(
+            url,
+            headers={"Range": f"bytes=0-{IMAGE_PROBE_BYTES - 1}"},
+            timeout=self.timeout,
+            stream=True,
+        ) as response:
+            probe = response.raw.read(IMAGE_PROBE_BYTES, decode_content=False)
+        return "range_get", response, len(probe)
+
+    def validate(self, url: str) -> bool:
+        """Checks one URL, bypassing the cache."""
+        start = time.perf_counter()
+        method = "head"
+        try:
+            method, response, downloaded = self._probe(url)
+            valid = is_image(response)
+            verdict = "valid" if valid else "invalid"
+            IMAGE_BYTES_DOWNLOADED.inc(downloaded)
+            length = content_length(response)
+            if length is not None and length > downloaded:
+                IMAGE_BYTES_AVOIDED.inc(length - downloaded)
+        except requests.RequestException:
+            valid = False
+            verdict = "error"
+
+        elapsed = time.perf_counter() - start
+        IMAGE_VALIDATIONS.inc(method=method, verdict=verdict)
+        IMAGE_VALIDATION_LATENCY.observe(elapsed)
+        with self._lock:
+            self.validated += 1
+            self.validation_seconds += elapsed
+            ttl = IMAGE_VALID_TTL if valid else IMAGE_INVALID_TTL
+            self._verdicts.pop(url, None)
+            self._verdicts[url] = (time.time() + ttl, valid)
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+        return valid
+
+    def _cached(self, url: str):
+        # Must be called with the lock held. Returns the verdict or None.
+        entry = self._verdicts.get(url)
+        if entry is None:
+            return None
+        expires_at, valid = entry
+        if expires_at <= time.time():
+            del self._verdicts[url]
+            return None
+        self._verdicts.move_to_end(url)
+        return valid
+
+    def _submit(self, url: str) -> Future:
+        # Must be called with the lock held. Coalesces concurrent checks
+        future = self._inflight.get(url)
+        if future is None:
+            future = self._executor.submit(self.validate, url)
+            self._inflight[url] = future
+            future.add_done_callback(lambda _: self._done(url))
+        return future
+
+    def _done(self, url: str) -> None:
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        """Starts validating the URLs without a cached verdict, in the
+        background."""
+        with self._lock:
+            for url in urls:
+                if url and self._cached(url) is None:
+                    self._submit(url)
+
+    def filter_valid(
+        self, urls: Iterable[str], budget: float = IMAGE_VALIDATION_BUDGET
+    ) -> List[str]:
+        """Returns the URLs that point at an image, in order. Waits at most
+        `budget` seconds for URLs without a cached verdict; those that take
+        longer are left out this time, and cached when they finish."""
+        urls = [url for url in urls if url]
+        verdicts = {}
+        pending = {}
+        with self._lock:
+            for url in urls:
+                valid = self._cached(url)
+                if valid is not None:
+                    verdicts[url] = valid
+                    self.hits += 1
+                else:
+                    pending[url] = self._submit(url)
+                    self.misses += 1
+            mean = self.validation_seconds / self.validated if self.validated else 0.0
+        IMAGE_SECONDS_SAVED.inc(mean * len(verdicts))
+
+        if pending:
+            wait(list(pending.values()), timeout=budget)
+            for url, future in pending.items():
+                if future.done() and future.exception() is None:
+                    verdicts[url] = future.result()
+        return [url for url in urls if verdicts.get(url)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "validated": self.validated,
+                "inflight": len(self._inflight),
+                "entries": len(self._verdicts),
+            }
+
+
+image_validator = ImageValidator()
+registry.register_collector(
+    stats_collector(
+        "image_validator_stats",
+        "Verdict cache and in-flight checks of the image validator",
+        image_validator.stats,
+        "stat",
+    )
+)
@@ -0,0 +1,200 @@
+"""
+Append-only storage for list-valued component state.
+
+Motion pickles the whole state and rewrites it on every update, so history
+lists (search history, feedback, raw news, user activity) make each write
+O(history). A `ListStore`, registered as a component's save_state and
+load_state functions, keeps the listed keys out of the pickle, in one Redis
+list per key (`STATE_LIST:<Component>__<instance>:<key>`, or
+`STATE_LIST:DEV:...` with MOTION_ENV=dev, like Motion's own keys). Update ops build
+the new value with `append(state[key], items, policy)`; the store then only
+pushes the new items and trims the entries the retention policy dropped
+(RPUSH + LTRIM), so a write is O(delta). Any other list value is rewritten
+in full.
+
+Update ops must return new lists (as they do) rather than mutate the stored
+ones in place, or the change isn't written. Motion doesn't know about the
+lists, so clear instances with `clear_instance` here rather than Motion's.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import cloudpickle
+import motion
+import redis
+from motion.utils import get_redis_params
+
+from fashion.metrics import registry
+from fashion.retention import RetentionPolicy
+
+# Redis keys of the lists, stored in the pickled state in place of the lists
+LIST_KEYS_FIELD = "_state_lists"
+
+STATE_LIST_BYTES_WRITTEN = registry.counter(
+    "state_list_bytes_written_total",
+    "Bytes of list-valued state written to Redis, by component and write mode",
+    ("component", "mode"),
+)
+
+
+class StoredList(list):
+    """A list value that matches what is stored in Redis at `redis_key`."""
+
+    def __init__(self, values: Iterable[Any] = (), redis_key: Optional[str] = None):
+        super().__init__(values)
+        self.redis_key = redis_key
+
+
+class AppendedList(list):
+    """The stored list at `redis_key` with `appended` added at the end and its
+    first `trimmed` entries dropped."""
+
+    def __init__(
+        self,
+        values: Iterable[Any],
+        appended: List[Any],
+        trimmed: int,
+        redis_key: Optional[str] = None,
+    ):
+        super().__init__(values)
+        self.appended = appended
+        self.trimmed = trimmed
+        self.redis_key = redis_key
+
+
+def append(
+    entries: List[Any],
+    items: Iterable[Any],
+    policy: Optional[RetentionPolicy] = None,
+    now: Optional[float] = None,
+) -> List[Any]:
+    """`entries + items`, with the retention policy applied, in a form the
+    ListStore writes as a delta."""
+    items = list(items)
+    combined = list(entries) + items
+    kept = policy.apply(combined, now=now) if policy is not None else combined
+    trimmed = len(combined) - len(kept)
+
+    # A delta only works on top of the stored list, and when the policy kept
+    # a suffix of it (e.g., max_age can drop entries out of order)
+    if not isinstance(entries, StoredList) or any(
+        a is not b for a, b in zip(combined[trimmed:], kept)
+    ):
+        return kept
+    return AppendedList(kept, items, trimmed, entries.redis_key)
+
+
+def key_prefix() -> str:
+    # Read on every call, as Motion does for its own keys
+    if os.getenv("MOTION_ENV", "prod") == "dev":
+        return "STATE_LIST:DEV:"
+    return "STATE_LIST:"
+
+
+def list_key(instance_name: str, key: str) -> str:
+    return f"{key_prefix()}{instance_name}:{key}"
+
+
+def load_lists(loaded: Dict[str, Any], redis_con: redis.Redis) -> Dict[str, Any]:
+    """Reads the lists of an unpickled state back into it. States saved
+    before the lists moved out of the pickle are returned as they are."""
+    state = dict(loaded)
+    list_keys = state.pop(LIST_KEYS_FIELD, {})
+    if not list_keys:
+        return state
+
+    pipeline = redis_con.pipeline(transaction=False)
+    for redis_key in list_keys.values():
+        pipeline.lrange(redis_key, 0, -1)
+    for (key, redis_key), values in zip(list_keys.items(), pipeline.execute()):
+        state[key] = StoredList(
+            (cloudpickle.loads(value) for value in values), redis_key
+        )
+    return state
+
+
+def clear_lists(instance_name: str, redis_con: Optional[redis.Redis] = None) -> int:
+    """Deletes the lists of a component instance (`<Component>__<instance>`),
+    dev and production ones alike. Returns the number of lists deleted."""
+    redis_con = redis_con or redis.Redis(**get_redis_params().model_dump())
+    keys = [
+        key
+        for prefix in ("STATE_LIST:", "STATE_LIST:DEV:")
+        for key in redis_con.scan_iter(match=f"{prefix}{instance_name}:*", count=1000)
+    ]
+    return redis_con.delete(*keys) if keys else 0
+
+
+def clear_instance(instance_name: str) -> bool:
+    """Motion's clear_instance, plus the instance's lists, which would
+    otherwise be orphaned (and read back by a new instance of the same name
+    if its state pointed at them)."""
+    cleared = motion.clear_instance(instance_name)
+    clear_lists(instance_name)
+    return cleared
+
+
+class ListStore:
+    def __init__(self, keys: List[str], redis_con: Optional[redis.Redis] = None):
+        self.keys = keys
+        self._redis = redis_con
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis(**get_redis_params().model_dump())
+        return self._redis
+
+    def save(self, state) -> Dict[str, Any]:
+        """save_state function: writes the lists that changed and returns the
+        rest of the state for Motion to pickle."""
+        instance_name = f"{state.component_name}__{state.instance_id}"
+        saved = {key: value for key, value in state.items() if key not in self.keys}
+        list_keys = {}
+        written = {"delta": 0, "full": 0}
+
+        # One transaction, so the lists of a state version change together
+        pipeline = self.redis.pipeline(transaction=True)
+        for key in self.keys:
+            if key not in state:
+                continue
+            value = state[key]
+            redis_key = list_keys[key] = list_key(instance_name, key)
+            # A list loaded from another key (e.g., a production state read
+            # with MOTION_ENV=dev) is written out in full under this one
+            if isinstance(value, StoredList) and value.redis_key == redis_key:
+                continue
+
+            if isinstance(value, AppendedList) and value.redis_key == redis_key:
+                payloads = [cloudpickle.dumps(item) for item in value.appended]
+                if payloads:
+                    pipeline.rpush(redis_key, *payloads)
+                if value.trimmed:
+                    pipeline.ltrim(redis_key, value.trimmed, -1)
+                written["delta"] += sum(len(payload) for payload in payloads)
+            else:
+                payloads = [cloudpickle.dumps(item) for item in value]
+                pipeline.delete(redis_key)
+                if payloads:
+                    pipeline.rpush(redis_key, *payloads)
+                written["full"] += sum(len(payload) for payload in payloads)
+        pipeline.execute()
+
+        # The in-memory values now match Redis
+        for key, redis_key in list_keys.items():
+            value = state[key]
+            if not isinstance(value, StoredList) or value.redis_key != redis_key:
+                state[key] = StoredList(value, redis_key)
+        for mode, count in written.items():
+            if count:
+                STATE_LIST_BYTES_WRITTEN.inc(
+                    count, component=state.component_name, mode=mode
+                )
+
+        saved[LIST_KEYS_FIELD] = list_keys
+        return saved
+
+    def load(self, loaded: Dict[str, Any]) -> Dict[str, Any]:
+        """load_state function."""
+        return load_lists(loaded, self.redis)
@@ -0,0 +1,641 @@
+"""
+Minimal Prometheus-style metrics for the Fashion and GlobalSummaries ops.
+
+Metrics live in an in-process registry and are exposed in the Prometheus
+text format on a local HTTP endpoint (`METRICS_PORT`, default 9464; set it
+to 0 to disable). Serve and update ops are wrapped with `instrument`, LLM
+calls are measured by hooks on the shared HTTP client (`fashion/clients.py`),
+and caches and queues are reported by collectors that run at scrape time.
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich import print
+
+from fashion import tracing
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# How often the update queue collector rediscovers the queue keys with SCAN
+QUEUE_RESCAN_SECONDS = float(os.getenv("QUEUE_RESCAN_SECONDS", "30"))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+# USD per 1M tokens, as (prompt, completion); override with LLM_PRICES='{"model": [in, out]}'
+LLM_PRICES = {"gpt-4o": (5.0, 15.0)}
+LLM_PRICES.update(
+    {
+        model: tuple(price)
+        for model, price in json.loads(os.getenv("LLM_PRICES", "{}")).items()
+    }
+)
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple((name, str(labels.get(name, ""))) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # Cumulative bucket counts, sum and count
+            series = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            samples = []
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append(
+                        (
+                            f"{self.name}_bucket",
+                            key + (("le", str(bound)),),
+                            bucket_count,
+                        )
+                    )
+                samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+                samples.append((f"{self.name}_sum", key, total))
+                samples.append((f"{self.name}_count", key, count))
+            return samples
+
+
+class Registry:
+    """Holds metrics and collectors, and renders them in the text format.
+
+    Collectors are callables run at scrape time that return
+    (name, type, help, [(labels dict, value), ...]) tuples, for values that
+    are already counted elsewhere (e.g., cache stats)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def _get_or_create(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(
+        self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, collector) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector {collector.__name__} failed: {e}")
+                continue
+            for name, metric_type, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{name}{format_labels(sorted(labels.items()))} {value}"
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+OP_LATENCY = registry.histogram(
+    "motion_op_latency_seconds",
+    "Latency of component serve and update ops",
+    ["component", "kind", "op", "status"],
+)
+OP_FIRST_ITEM = registry.histogram(
+    "motion_op_first_item_seconds",
+    "Time until a streaming serve op yields its first item",
+    ["component", "op"],
+)
+OP_IN_PROGRESS = registry.gauge(
+    "motion_op_in_progress",
+    "Serve and update ops currently running in this process",
+    ["component", "kind", "op"],
+)
+LLM_LATENCY = registry.histogram(
+    "llm_request_latency_seconds",
+    "Time from sending an LLM request to receiving the response headers",
+    ["model", "status_code", "stream"],
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens used by LLM calls", ["model", "type"]
+)
+LLM_COST = registry.counter(
+    "llm_cost_dollars_total", "Estimated cost of LLM calls in USD", ["model"]
+)
+LLM_RETRIES = registry.counter(
+    "llm_retries_total", "LLM requests that were retries of a failed request", ["model"]
+)
+
+
+def instrument(component: str, kind: str):
+    """Records latency and status of an op, and runs it in a trace span
+    (parented to props["trace"] when the flow passed one). Apply below the
+    Motion decorator, e.g. `@Fashion.serve("note")` then
+    `@instrument("Fashion", "serve")`. Keeps the op's signature and its
+    sync / async / generator kind, which Motion relies on."""
+
+    def decorator(func):
+        labels = {"component": component, "kind": kind, "op": func.__name__}
+        span_name = f"{component}.{func.__name__}"
+
+        def begin(args, kwargs):
+            props = kwargs.get("props", args[1] if len(args) > 1 else None)
+            parent = props.get("trace") if isinstance(props, dict) else None
+            OP_IN_PROGRESS.inc(**labels)
+            return time.perf_counter(), tracing.start_span(span_name, parent, kind=kind)
+
+        def finish(start, span, status):
+            OP_IN_PROGRESS.dec(**labels)
+            OP_LATENCY.observe(time.perf_counter() - start, status=status, **labels)
+            tracing.end_span(span, status)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start, span = begin(args, kwargs)
+                status = "error"
+                try:
+                    with tracing.use_span(span):
+                        result = await func(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    finish(start, span, status)
+
+        elif inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start, span = begin(args, kwargs)
+                status = "error"
+                first = True
+                try:
+                    # The span is only current while the op is producing an
+                    # item, not while the caller handles it
+                    for item in tracing.iterate_in_span(span, func(*args, **kwargs)):
+                        if first:
+                            OP_FIRST_ITEM.observe(
+                                time.perf_counter() - start,
+                                component=component,
+                                op=func.__name__,
+                            )
+                            first = False
+                        yield item
+                    status = "ok"
+                finally:
+                    finish(start, span, status)
+
+        else:
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start, span = begin(args, kwargs)
+                status = "error"
+                try:
+                    with tracing.use_span(span):
+                        result = func(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    finish(start, span, status)
+
+        return wrapper
+
+    return decorator
+
+
+# LLM calls, measured by event hooks on the shared HTTP client
+
+
+def is_llm_request(request) -> bool:
+    return request.url.path.endswith("/chat/completions")
+
+
+def request_model(request) -> str:
+    try:
+        return json.loads(request.content).get("model", "unknown")
+    except Exception:
+        return "unknown"
+
+
+def on_llm_request(request) -> None:
+    if not is_llm_request(request):
+        return
+    request.extensions["metrics_start"] = time.perf_counter()
+    request.extensions["trace_start"] = time.time()
+    request.extensions["trace_parent"] = tracing.trace_context()
+    if request.headers.get("x-stainless-retry-count", "0") not in ("", "0"):
+        LLM_RETRIES.inc(model=request_model(request))
+
+
+def is_stream(response) -> bool:
+    return "text/event-stream" in response.headers.get("content-type", "")
+
+
+def record_llm_response(response, body) -> None:
+    request = response.request
+    model = request_model(request)
+    stream = is_stream(response)
+    start = request.extensions.get("metrics_start")
+    if start is not None:
+        LLM_LATENCY.observe(
+            time.perf_counter() - start,
+            model=model,
+            status_code=response.status_code,
+            stream=str(stream).lower(),
+        )
+    tracing.record_span(
+        f"llm {model}",
+        request.extensions.get("trace_parent"),
+        request.extensions.get("trace_start", time.time()),
+        time.time(),
+        status="ok" if response.status_code < 400 else "error",
+        status_code=response.status_code,
+        stream=stream,
+        retry=request.headers.get("x-stainless-retry-count", "0"),
+    )
+
+    if body is None:
+        return
+    try:
+        usage = json.loads(body).get("usage") or {}
+    except ValueError:
+        return
+    record_llm_usage(model, usage)
+
+
+def record_llm_usage(model: str, usage) -> None:
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    LLM_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, type="completion")
+
+    prices = LLM_PRICES.get(model)
+    if prices is None:
+        prices = next(
+            (price for name, price in LLM_PRICES.items() if model.startswith(name)),
+            None,
+        )
+    if prices is not None:
+        LLM_COST.inc(
+            (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6,
+            model=model,
+        )
+
+
+def reads_body(response) -> bool:
+    # Streamed responses are consumed by the caller; reading them here would
+    # block until the stream ends
+    return is_llm_request(response.request) and "json" in response.headers.get(
+        "content-type", ""
+    )
+
+
+class StreamUsage:
+    """Picks the usage out of a streamed response's server-sent events as the
+    caller reads them. The API only sends it, in a last chunk without
+    choices, when the request sets stream_options={"include_usage": True}."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.usage = None
+        self._partial = b""
+
+    def feed(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            if not line.startswith(b"data:") or b'"usage"' not in line:
+                continue
+            try:
+                usage = json.loads(line[5:]).get("usage")
+            except ValueError:
+                continue
+            if usage:
+                self.usage = usage
+
+    def finish(self) -> None:
+        self.feed(b"\n")
+        if self.usage is not None:
+            record_llm_usage(self.model, self.usage)
+            self.usage = None
+
+
+def count_stream_usage(response) -> None:
+    # Wraps the response's decoded byte iterators (which iter_lines,
+    # iter_text and the OpenAI SDK's stream all read through) instead of
+    # reading the stream here
+    usage = StreamUsage(request_model(response.request))
+    iter_bytes = response.iter_bytes
+    aiter_bytes = response.aiter_bytes
+
+    def counted_iter_bytes(*args, **kwargs):
+        try:
+            for data in iter_bytes(*args, **kwargs):
+                usage.feed(data)
+                yield data
+        finally:
+            usage.finish()
+
+    async def counted_aiter_bytes(*args, **kwargs):
+        try:
+            async for data in aiter_bytes(*args, **kwargs):
+                usage.feed(data)
+                yield data
+        finally:
+            usage.finish()
+
+    response.iter_bytes = counted_iter_bytes
+    response.aiter_bytes = counted_aiter_bytes
+
+
+def on_llm_response(response) -> None:
+    if not is_llm_request(response.request):
+        return
+    body = None
+    if reads_body(response):
+        body = response.read()
+    elif is_stream(response):
+        count_stream_usage(response)
+    record_llm_response(response, body)
+
+
+async def aon_llm_request(request) -> None:
+    on_llm_request(request)
+
+
+async def aon_llm_response(response) -> None:
+    if not is_llm_request(response.request):
+        return
+    body = None
+    if reads_body(response):
+        body = await response.aread()
+    elif is_stream(response):
+        count_stream_usage(response)
+    record_llm_response(response, body)
+
+
+# Update queue depth, read from the Motion queues in Redis
+
+_redis = None
+_queue_keys_lock = threading.Lock()
+_queue_keys = []
+_queue_keys_scanned_at = None
+
+
+def queue_keys():
+    # The key set is rescanned every QUEUE_RESCAN_SECONDS, not on every
+    # scrape; a queue drained since the last scan has a depth of 0
+    global _queue_keys, _queue_keys_scanned_at
+    with _queue_keys_lock:
+        if (
+            _queue_keys_scanned_at is None
+            or time.time() - _queue_keys_scanned_at >= QUEUE_RESCAN_SECONDS
+        ):
+            _queue_keys = list(_redis.scan_iter(match="MOTION_QUEUE:*/*", count=1000))
+            _queue_keys_scanned_at = time.time()
+        return list(_queue_keys)
+
+
+def update_queue_collector():
+    global _redis
+    if _redis is None:
+        import redis
+        from motion.utils import get_redis_params
+
+        _redis = redis.Redis(**get_redis_params().model_dump())
+
+    # Queue keys look like MOTION_QUEUE:{component}__{instance}/{flow}/{op}.
+    # Depths are summed per component, flow and op.
+    depths = {}
+    keys = queue_keys()
+    pipeline = _redis.pipeline()
+    for key in keys:
+        pipeline.llen(key)
+    for key, depth in zip(keys, pipeline.execute(raise_on_error=False)):
+        if not isinstance(depth, int):
+            continue
+        instance, flow, op = key.decode("utf-8").split(":", 1)[1].rsplit("/", 2)
+        labels = (instance.split("__", 1)[0], flow, op)
+        depths[labels] = depths.get(labels, 0) + depth
+
+    return [
+        (
+            "motion_update_queue_depth",
+            "gauge",
+            "Pending update op inputs in the Motion queues",
+            [
+                ({"component": component, "flow": flow, "op": op}, depth)
+                for (component, flow, op), depth in depths.items()
+            ],
+        )
+    ]
+
+
+registry.register_collector(update_queue_collector)
+
+
+def stats_collector(name: str, help: str, stats, label: str, **extra_labels):
+    """Returns a collector that exposes a `stats()` dict (e.g., cache hit
+    and miss counts) as one gauge, with a label per key."""
+
+    def collector():
+        return [
+            (
+                name,
+                "gauge",
+                help,
+                [
+                    ({label: key, **extra_labels}, value)
+                    for key, value in stats().items()
+                    if isinstance(value, (int, float))
+                ],
+            )
+        ]
+
+    collector.__name__ = name
+    return collector
+
+
+registry.register_collector(
+    stats_collector(
+        "trace_exporter_stats",
+        "Spans written, queued and dropped by the trace file exporter",
+        tracing.exporter.stats,
+        "stat",
+    )
+)
+
+
+def parse_text(text: str):
+    """Parses the text format into a list of (name, labels dict, value)."""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, label_text = series.partition("{")
+        labels = {}
+        for pair in label_text.rstrip("}").split('",'):
+            if "=" in pair:
+                label, _, label_value = pair.partition("=")
+                labels[label] = label_value.strip('"').replace('\\"', '"')
+        samples.append((name, labels, float(value)))
+    return samples
+
+
+def histogram_quantile(quantile: float, buckets) -> float:
+    """Estimates a quantile from cumulative (upper bound, count) buckets,
+    interpolating linearly within the bucket, like PromQL does."""
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] == 0:
+        return float("nan")
+    rank = quantile * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (
+                count - lower_count
+            )
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        data = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serves /metrics on a daemon thread. Safe to call more than once; does
+    nothing if the port is 0 or already taken (e.g., by another process)."""
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Not serving metrics on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
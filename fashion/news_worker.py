@@ -0,0 +1,357 @@
+"""
+Standalone news ingestion worker.
+
+Searches Serper for recent fashion news on a schedule, scrapes the articles
+with bounded concurrency and per-URL timeouts, cleans them and drops near
+duplicates (see `fashion.textclean`), and feeds them to the GlobalSummaries
+"news" flow. Any number of workers can run; a Redis lease
+(`NEWS_WORKER_LEADER:<instance>`) makes sure only one of them ingests at a
+time, and the time of the last run is kept in Redis so a new leader picks up
+the schedule instead of starting over.
+
+Usage:
+    python -m fashion.news_worker            # run forever
+    python -m fashion.news_worker --once     # one ingestion run, then exit
+
+Point SERPER_NEWS_URL and SERPER_SCRAPE_URL at `benchmarks/mock_server.py`
+(`/news` and `/scrape`) to run it without a Serper key.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+import redis
+import requests
+from motion.utils import get_redis_params
+from requests.adapters import HTTPAdapter
+from rich import print
+
+from fashion import tracing
+from fashion.globalsummaries import GlobalSummaries
+from fashion.images import image_validator
+from fashion.metrics import registry, start_metrics_server, stats_collector
+from fashion.retention import count_tokens
+from fashion.textclean import clean_articles
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERPER_NEWS_URL = os.getenv("SERPER_NEWS_URL", "https://google.serper.dev/news")
+SERPER_SCRAPE_URL = os.getenv("SERPER_SCRAPE_URL", "https://scrape.serper.dev")
+NEWS_QUERY = os.getenv("NEWS_QUERY", "fashion")
+NEWS_NUM_RESULTS = int(os.getenv("NEWS_NUM_RESULTS", "20"))
+# Serper time filter: news from the past hour
+NEWS_TIME_RANGE = os.getenv("NEWS_TIME_RANGE", "qdr:h")
+# Seconds between ingestion runs (the "news" update op also skips updates
+# less than 10 minutes apart)
+NEWS_INTERVAL = float(os.getenv("NEWS_INTERVAL", "600"))
+NEWS_FETCH_CONCURRENCY = int(os.getenv("NEWS_FETCH_CONCURRENCY", "5"))
+NEWS_SEARCH_TIMEOUT = float(os.getenv("NEWS_SEARCH_TIMEOUT", "10"))
+NEWS_FETCH_TIMEOUT = float(os.getenv("NEWS_FETCH_TIMEOUT", "15"))
+NEWS_CONNECT_TIMEOUT = float(os.getenv("NEWS_CONNECT_TIMEOUT", "3"))
+# The leader's lease; renewed every third of it while the leader is alive
+NEWS_LEADER_TTL = float(os.getenv("NEWS_LEADER_TTL", "60"))
+GLOBAL_SUMMARIES_ID = os.getenv("GLOBAL_SUMMARIES_ID", "production")
+
+# Only extend or release the lease if we still hold it
+_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLock:
+    """A Redis lease held by at most one worker. `hold()` acquires or renews
+    it and returns whether this worker is the leader."""
+
+    def __init__(self, redis_con: redis.Redis, key: str, ttl: float):
+        self._redis = redis_con
+        self.key = key
+        self.ttl_ms = int(ttl * 1000)
+        self.token = uuid.uuid4().hex
+        self._renew = redis_con.register_script(_RENEW_SCRIPT)
+        self._release = redis_con.register_script(_RELEASE_SCRIPT)
+
+    def hold(self) -> bool:
+        if self._renew(keys=[self.key], args=[self.token, self.ttl_ms]):
+            return True
+        return bool(self._redis.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    def release(self) -> None:
+        self._release(keys=[self.key], args=[self.token])
+
+
+class NewsWorker:
+    def __init__(
+        self,
+        instance_id: str = GLOBAL_SUMMARIES_ID,
+        interval: float = NEWS_INTERVAL,
+        concurrency: int = NEWS_FETCH_CONCURRENCY,
+        redis_con: Optional[redis.Redis] = None,
+    ):
+        self.instance_id = instance_id
+        self.interval = interval
+        self.concurrency = concurrency
+        self._redis = redis_con or redis.Redis(**get_redis_params().model_dump())
+        self.lock = LeaderLock(
+            self._redis, f"NEWS_WORKER_LEADER:{instance_id}", NEWS_LEADER_TTL
+        )
+        self.last_run_key = f"NEWS_WORKER_LAST_RUN:{instance_id}"
+        self.headlines_key = f"NEWS_WORKER_HEADLINES:{instance_id}"
+        # (url, timestamp, MinHash signature) of the recently ingested articles
+        self.signatures_key = f"NEWS_WORKER_SIGNATURES:{instance_id}"
+
+        # One pooled session for the search and all scrapes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "X-API-KEY": os.getenv("SERPER_API_KEY") or "",
+                "Content-Type": "application/json",
+            }
+        )
+
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.is_leader = False
+        self.stats = {
+            "runs": 0,
+            "failed_runs": 0,
+            "articles_fetched": 0,
+            "articles_failed": 0,
+            "articles_near_duplicate": 0,
+            "tokens_fetched": 0,
+            "tokens_removed": 0,
+        }
+
+    def _count(self, **increments) -> None:
+        with self._stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def snapshot(self):
+        with self._stats_lock:
+            return {"leader": int(self.is_leader), **self.stats}
+
+    def hold_lease(self) -> bool:
+        try:
+            self.is_leader = self.lock.hold()
+        except redis.RedisError as e:
+            print(f"Failed to renew the news worker lease: {e}")
+            self.is_leader = False
+        return self.is_leader
+
+    def search(self):
+        with tracing.span("serper.news", query=NEWS_QUERY):
+            response = self.session.post(
+                SERPER_NEWS_URL,
+                data=json.dumps(
+                    {"q": NEWS_QUERY, "num": NEWS_NUM_RESULTS, "tbs": NEWS_TIME_RANGE}
+                ),
+                timeout=(NEWS_CONNECT_TIMEOUT, NEWS_SEARCH_TIMEOUT),
+            )
+            response.raise_for_status()
+            return response.json().get("news", [])
+
+    def fetch_article(self, url: str) -> Tuple[str, str]:
+        with tracing.span("serper.scrape", url=url):
+            response = self.session.post(
+                SERPER_SCRAPE_URL,
+                data=json.dumps({"url": url}),
+                timeout=(NEWS_CONNECT_TIMEOUT, NEWS_FETCH_TIMEOUT),
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data["text"], data.get("metadata", {}).get("og:image", "")
+
+    def fetch_articles(self, urls: List[str]):
+        # Returns (url, (text, img_url)) for the articles that could be
+        # fetched in time; the others are skipped until the next run
+        articles = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(tracing.propagate(self.fetch_article), url): url
+                for url in urls
+            }
+            for future in as_completed(futures):
+                try:
+                    articles[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Failed to fetch {futures[future]}: {e}")
+                    self._count(articles_failed=1)
+        self._count(articles_fetched=len(articles))
+        # Keep the search order
+        return [(url, articles[url]) for url in urls if url in articles]
+
+    def clean(self, articles, now: float):
+        """Strips boilerplate from the fetched articles and drops copies of
+        articles ingested in the dedup window. Returns the cleaned articles
+        and the signatures to store once they are summarized."""
+        with tracing.span("news.clean", articles=len(articles)) as span:
+            data = self._redis.get(self.signatures_key)
+            recent = json.loads(data) if data is not None else []
+            cleaned, recent, removed = clean_articles(articles, recent, now)
+
+            fetched_tokens = sum(count_tokens(text) for _, (text, _) in articles)
+            removed_tokens = (
+                removed["boilerplate"]
+                + removed["truncated"]
+                + removed["near_duplicate"]
+            )
+            span.attributes.update(removed, tokens_fetched=fetched_tokens)
+            self._count(
+                articles_near_duplicate=removed["near_duplicate_articles"],
+                tokens_fetched=fetched_tokens,
+                tokens_removed=removed_tokens,
+            )
+            print(
+                f"Removed {removed_tokens} of {fetched_tokens} news tokens "
+                f"(boilerplate {removed['boilerplate']}, truncated "
+                f"{removed['truncated']}, near duplicates "
+                f"{removed['near_duplicate']} in "
+                f"{removed['near_duplicate_articles']} articles)"
+            )
+        return cleaned, recent
+
+    def run_once(self) -> int:
+        """Runs one ingestion and returns the number of articles sent."""
+        with tracing.span("news.refresh", instance=self.instance_id) as span:
+            news = self.search()
+            fetched = self.fetch_articles([item["link"] for item in news])
+            now = time.time()
+            articles, signatures = self.clean(fetched, now)
+            # Validate the article images while the articles are summarized
+            image_validator.prefetch(img_url for _, (_, img_url) in articles)
+            span.attributes["articles"] = len(articles)
+
+            with GlobalSummaries(self.instance_id) as gs:
+                gs.run(
+                    "news",
+                    props={
+                        "urls_and_news_texts": articles,
+                        "timestamp": now,
+                        "trace": tracing.trace_context(),
+                    },
+                    ignore_cache=True,
+                )
+                gs.flush_update("news")
+                # Only a summarized article makes its copies duplicates; if
+                # the update was throttled or failed, they're still news
+                summarized = gs.read_state("last_news_update") == now
+            if summarized:
+                self._redis.set(self.signatures_key, json.dumps(signatures))
+
+        # Headlines for the Recent Activity page, near duplicates included
+        images = {url: img_url for url, (_, img_url) in fetched}
+        self._redis.set(
+            self.headlines_key,
+            json.dumps(
+                {
+                    "timestamp": now,
+                    "headlines": [
+                        {
+                            "title": item.get("title", ""),
+                            "link": item["link"],
+                            "date": item.get("date", ""),
+                            "imageUrl": images.get(item["link"], ""),
+                        }
+                        for item in news
+                    ],
+                }
+            ),
+        )
+        self._redis.set(self.last_run_key, now)
+        return len(articles)
+
+    def due(self) -> bool:
+        last_run = self._redis.get(self.last_run_key)
+        return last_run is None or time.time() - float(last_run) >= self.interval
+
+    def _heartbeat(self) -> None:
+        # Keeps the lease while a run takes longer than its TTL
+        while not self._stop.wait(NEWS_LEADER_TTL / 3):
+            self.hold_lease()
+
+    def run_forever(self) -> None:
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        try:
+            while not self._stop.is_set():
+                if self.hold_lease() and self.due():
+                    try:
+                        count = self.run_once()
+                        self._count(runs=1)
+                        print(f"Sent {count} news articles to GlobalSummaries")
+                    except Exception as e:
+                        self._count(failed_runs=1)
+                        print(f"News ingestion failed: {e}")
+                        # Don't retry in a tight loop
+                        self._redis.set(self.last_run_key, time.time())
+                self._stop.wait(min(self.interval, NEWS_LEADER_TTL / 3))
+        finally:
+            self._stop.set()
+            self.lock.release()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def latest_headlines(redis_con: redis.Redis, instance_id: str = GLOBAL_SUMMARIES_ID):
+    """The headlines from the worker's last run, and when it ran."""
+    data = redis_con.get(f"NEWS_WORKER_HEADLINES:{instance_id}")
+    if data is None:
+        return None, []
+    data = json.loads(data)
+    return data["timestamp"], data["headlines"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="News ingestion worker")
+    parser.add_argument("--once", action="store_true", help="Run once and exit")
+    parser.add_argument("--instance", default=GLOBAL_SUMMARIES_ID)
+    parser.add_argument("--interval", type=float, default=NEWS_INTERVAL)
+    parser.add_argument("--concurrency", type=int, default=NEWS_FETCH_CONCURRENCY)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    worker = NewsWorker(args.instance, args.interval, args.concurrency)
+    if args.once:
+        print(f"Sent {worker.run_once()} news articles to GlobalSummaries")
+        return
+
+    registry.register_collector(
+        stats_collector(
+            "news_worker_stats",
+            "Leadership, runs and article fetches of the news worker",
+            worker.snapshot,
+            "stat",
+        )
+    )
+    start_metrics_server()
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
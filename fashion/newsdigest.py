@@ -0,0 +1,303 @@
+"""
+News summarization for the GlobalSummaries "news" update.
+
+In `single` mode, every new article goes into one prompt with the previous
+summary and the images, as before. In `map_reduce` mode, long
+articles are split into chunks of at most NEWS_CHUNK_TOKENS, each chunk is
+digested into a few sentences by NEWS_MAP_CONCURRENCY concurrent LLM calls,
+and the digests are merged NEWS_REDUCE_FAN_IN at a time until one final call
+folds them into the trend summary with the previous summary and the images.
+Prompts stay small however busy the feed is, and the map calls overlap, but
+a few articles are summarized faster (and with fewer tokens) by one call. In
+`auto` mode (the default), map-reduce is only used once the articles add up
+to NEWS_MAP_REDUCE_MIN_TOKENS, three quarters of the largest batch a news
+worker run can send.
+
+Digests are cached in Redis by the hash of the chunk text
+(`NEWS_DIGEST:<hash>`, for NEWS_DIGEST_TTL seconds), so an article that is
+seen again (e.g., re-published, or after a failed update) isn't digested
+twice.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import redis
+from motion.utils import get_redis_params
+from rich import print
+
+from fashion import tracing
+from fashion.clients import oai_client
+from fashion.metrics import registry, stats_collector
+from fashion.retention import count_tokens
+from fashion.textclean import NEWS_ARTICLE_MAX_TOKENS
+
+# "auto", "map_reduce" or "single"
+NEWS_SUMMARY_MODE = os.getenv("NEWS_SUMMARY_MODE", "auto")
+# The most a news worker run sends: NEWS_NUM_RESULTS articles (read as in
+# fashion/news_worker.py, which imports this module), each cut to
+# NEWS_ARTICLE_MAX_TOKENS
+NEWS_BATCH_MAX_TOKENS = (
+    int(os.getenv("NEWS_NUM_RESULTS", "20")) * NEWS_ARTICLE_MAX_TOKENS
+)
+# Article tokens from which "auto" switches to map-reduce: three quarters of a
+# full batch. Truncation keeps whole paragraphs, so a full batch never quite
+# adds up to NEWS_BATCH_MAX_TOKENS
+NEWS_MAP_REDUCE_MIN_TOKENS = int(
+    os.getenv("NEWS_MAP_REDUCE_MIN_TOKENS", str(NEWS_BATCH_MAX_TOKENS * 3 // 4))
+)
+NEWS_MAP_CONCURRENCY = int(os.getenv("NEWS_MAP_CONCURRENCY", "8"))
+NEWS_CHUNK_TOKENS = int(os.getenv("NEWS_CHUNK_TOKENS", "1500"))
+# Digests merged per reduce call
+NEWS_REDUCE_FAN_IN = int(os.getenv("NEWS_REDUCE_FAN_IN", "10"))
+NEWS_DIGEST_MODEL = os.getenv("NEWS_DIGEST_MODEL", "gpt-4o")
+# 0 disables the digest cache
+NEWS_DIGEST_TTL = int(os.getenv("NEWS_DIGEST_TTL", str(7 * 24 * 3600)))
+
+SUMMARY_INSTRUCTIONS = "Please generate a new summary (up to 5 sentences) that keeps the existing trends and includes trends from the latest news articles. Keep the trends focused on what to wear, not necessarily the news articles themselves."
+
+
+def split_long(piece: str, max_chars: int):
+    # Splits a paragraph longer than a chunk between words
+    while len(piece) > max_chars:
+        cut = piece.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        yield piece[:cut]
+        piece = piece[cut:].lstrip()
+    yield piece
+
+
+def chunk_text(text: str, max_tokens: int = NEWS_CHUNK_TOKENS) -> List[str]:
+    """Splits text into chunks of about `max_tokens`, at paragraph (or, for
+    long paragraphs, word) boundaries."""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    # count_tokens assumes ~4 characters per token
+    max_chars = max_tokens * 4
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in text.split("\n"):
+        for piece in split_long(paragraph, max_chars):
+            if current and size + len(piece) > max_chars:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def chunk_key(chunk: str) -> str:
+    normalized = " ".join(chunk.lower().split())
+    digest = hashlib.sha1(f"{NEWS_DIGEST_MODEL}\n{normalized}".encode("utf-8"))
+    return f"NEWS_DIGEST:{digest.hexdigest()}"
+
+
+class DigestCache:
+    """Chunk digests in Redis, shared by every process that summarizes news."""
+
+    def __init__(self, ttl: int = NEWS_DIGEST_TTL, redis_con=None):
+        self.ttl = ttl
+        self._redis = redis_con
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis(**get_redis_params().model_dump())
+        return self._redis
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        if self.ttl <= 0 or not keys:
+            return {}
+        try:
+            values = self.redis.mget(keys)
+        except redis.RedisError as e:
+            print(f"Failed to read news digests: {e}")
+            with self._lock:
+                self.errors += 1
+            return {}
+        found = {
+            key: value.decode("utf-8")
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, digests: Dict[str, str]) -> None:
+        if self.ttl <= 0 or not digests:
+            return
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for key, digest in digests.items():
+                pipeline.set(key, digest, ex=self.ttl)
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Failed to store news digests: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+digest_cache = DigestCache()
+registry.register_collector(
+    stats_collector(
+        "news_digest_cache_stats",
+        "Hits and misses of the news chunk digest cache",
+        digest_cache.stats,
+        "stat",
+    )
+)
+
+
+def complete(system: str, user: str, model: str = NEWS_DIGEST_MODEL) -> str:
+    response = oai_client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+    )
+    return response.choices[0].message.content
+
+
+def digest_chunk(chunk: str) -> str:
+    return complete(
+        "You are a fashion news analyst.",
+        f"Here is an excerpt of a news article:\n\n{chunk}\n\nIn at most 3 sentences, list the fashion trends and what to wear that it mentions. If it mentions none, say so in one sentence.",
+    )
+
+
+def merge_digests(digests: List[str]) -> str:
+    notes = "\n".join(f"- {digest}" for digest in digests)
+    return complete(
+        "You are a fashion news analyst.",
+        f"Here are notes on fashion trends from several news articles:\n\n{notes}\n\nCombine them into at most 5 sentences, keeping every distinct trend and what to wear.",
+    )
+
+
+def map_digests(
+    texts: List[str],
+    concurrency: int = NEWS_MAP_CONCURRENCY,
+    chunk_tokens: int = NEWS_CHUNK_TOKENS,
+    cache: Optional[DigestCache] = None,
+) -> List[str]:
+    """Digests every chunk of the texts, at most `concurrency` at a time,
+    in order. Chunks whose digest fails are left out."""
+    cache = cache or digest_cache
+    chunks = [chunk for text in texts for chunk in chunk_text(text, chunk_tokens)]
+    keys = [chunk_key(chunk) for chunk in chunks]
+    digests = cache.get_many(list(dict.fromkeys(keys)))
+
+    missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in digests}
+    if missing:
+        with tracing.span("news.map", chunks=len(missing)):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {
+                    key: executor.submit(tracing.propagate(digest_chunk), chunk)
+                    for key, chunk in missing.items()
+                }
+                new_digests = {}
+                for key, future in futures.items():
+                    try:
+                        new_digests[key] = future.result()
+                    except Exception as e:
+                        print(f"Failed to digest a news chunk: {e}")
+        cache.put_many(new_digests)
+        digests.update(new_digests)
+
+    return [digests[key] for key in keys if key in digests]
+
+
+def reduce_digests(
+    digests: List[str],
+    fan_in: int = NEWS_REDUCE_FAN_IN,
+    concurrency: int = NEWS_MAP_CONCURRENCY,
+) -> List[str]:
+    """Merges the digests `fan_in` at a time (the merges of a level run
+    concurrently) until at most `fan_in` are left."""
+    fan_in = max(fan_in, 2)
+    level = 0
+    while len(digests) > fan_in:
+        level += 1
+        groups = [digests[i : i + fan_in] for i in range(0, len(digests), fan_in)]
+        with tracing.span("news.reduce", level=level, groups=len(groups)):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # One context per call: a context can't be entered twice
+                futures = [
+                    executor.submit(tracing.propagate(merge_digests), group)
+                    for group in groups
+                ]
+                digests = [future.result() for future in futures]
+    return digests
+
+
+def summarize_news(
+    old_summary: str,
+    texts: List[str],
+    img_urls: List[str],
+    mode: str = NEWS_SUMMARY_MODE,
+    concurrency: int = NEWS_MAP_CONCURRENCY,
+    fan_in: int = NEWS_REDUCE_FAN_IN,
+    chunk_tokens: int = NEWS_CHUNK_TOKENS,
+    cache: Optional[DigestCache] = None,
+) -> str:
+    """The new trend summary, from the previous one, the new article texts
+    and their images."""
+    if mode == "auto":
+        tokens = sum(count_tokens(text) for text in texts)
+        mode = "map_reduce" if tokens >= NEWS_MAP_REDUCE_MIN_TOKENS else "single"
+    if mode == "map_reduce":
+        digests = reduce_digests(
+            map_digests(texts, concurrency, chunk_tokens, cache), fan_in, concurrency
+        )
+        if not digests:
+            raise RuntimeError("None of the news articles could be digested")
+        notes = "\n".join(f"- {digest}" for digest in digests)
+        news = f"Here are notes on the latest news articles related to fashion trends and what to wear (the images are from the articles):\n\n{notes}"
+    else:
+        news_htmls = "\n\n".join([f"<p>{text}</p>" for text in texts])
+        news = f"Here are the latest news articles and their images related to fashion trends and what to wear:\n\n{news_htmls}"
+
+    response = oai_client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a news summarizer. Please summarize the news related to fashion trends and what to wear.",
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Here is a summary of fashion trends:\n\n{old_summary}\n\n{news}\n\n{SUMMARY_INSTRUCTIONS}",
+                    },
+                    *[
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": img_url, "detail": "low"},
+                        }
+                        for img_url in img_urls
+                    ],
+                ],
+            },
+        ],
+    )
+    return response.choices[0].message.content
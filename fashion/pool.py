@@ -0,0 +1,271 @@
+"""
+Bounded pool of live component instances, keyed by instance id.
+
+Each `Fashion` instance keeps its update worker, thread pool and Redis
+connection alive, so caching one per user (or per profile) for the life of
+the server leaks. `InstancePool` keeps at most INSTANCE_POOL_MAX_SIZE of them
+and drops those idle for INSTANCE_IDLE_SECONDS, least recently used first.
+Instances are only evicted when no caller is using them (see `lease`), and
+are shut down on a background thread, since Motion drains the pending
+updates before it returns.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import psutil
+from rich import print
+
+from fashion.metrics import registry, stats_collector
+from fashion.recommender import Fashion
+
+INSTANCE_POOL_MAX_SIZE = int(os.getenv("INSTANCE_POOL_MAX_SIZE", "64"))
+INSTANCE_IDLE_SECONDS = float(os.getenv("INSTANCE_IDLE_SECONDS", "900"))
+# How often idle instances are looked for
+INSTANCE_SWEEP_SECONDS = float(os.getenv("INSTANCE_SWEEP_SECONDS", "60"))
+
+INSTANCE_POOL_EVICTIONS = registry.counter(
+    "instance_pool_evictions_total",
+    "Component instances evicted from the pool, by pool and reason",
+    ("pool", "reason"),
+)
+
+
+@dataclass
+class PooledInstance:
+    instance: Any
+    last_used: float
+    leases: int = 0
+
+
+class InstancePool:
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[str, Dict[str, Any]], Any],
+        max_size: int = INSTANCE_POOL_MAX_SIZE,
+        idle_timeout: float = INSTANCE_IDLE_SECONDS,
+        sweep_interval: float = INSTANCE_SWEEP_SECONDS,
+    ):
+        self.name = name
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._instances = OrderedDict()  # key -> PooledInstance, LRU first
+        self._closing = {}  # key -> Future of the evicted instance's shutdown
+        self._creating = {}  # key -> Future set once the new instance is live
+        self._shutdowns = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix=f"InstancePool-{name}"
+        )
+        self._sweeper = None
+        self._stop = threading.Event()
+
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self.shutdown_errors = 0
+
+    def acquire(self, key: str, params: Optional[Dict[str, Any]] = None):
+        """Returns the live instance for `key`, creating it with
+        `factory(key, params)` if needed. `params` only apply to a new
+        instance. Pair with `release`, or use `lease`."""
+        while True:
+            with self._lock:
+                self._start_sweeper()
+                # The previous instance for this key is still flushing its
+                # updates, or another caller is creating it; don't run a
+                # second one next to it
+                pending = self._closing.get(key) or self._creating.get(key)
+                if pending is not None and pending.done():
+                    self._closing.pop(key, None)
+                    pending = None
+                if pending is None:
+                    entry = self._instances.get(key)
+                    if entry is not None:
+                        closing = self._lease(key, entry)
+                        break
+                    creating = self._creating[key] = Future()
+            if pending is not None:
+                try:
+                    pending.result()
+                except Exception:
+                    # The other caller's factory failed; try again here
+                    pass
+                continue
+
+            # Created outside the lock: a cold start (Redis connection, state
+            # init) doesn't hold up every other caller
+            try:
+                instance = self.factory(key, params or {})
+            except Exception as e:
+                with self._lock:
+                    del self._creating[key]
+                creating.set_exception(e)
+                raise
+            with self._lock:
+                del self._creating[key]
+                entry = self._instances[key] = PooledInstance(instance, 0.0)
+                self.created += 1
+                closing = self._lease(key, entry)
+            creating.set_result(None)
+            break
+
+        self._watch(closing)
+        return entry.instance
+
+    def _lease(self, key: str, entry: PooledInstance):
+        # Must be called with the lock held
+        self._instances.move_to_end(key)
+        entry.leases += 1
+        entry.last_used = time.time()
+        return self._evict(entry.last_used)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            entry = self._instances.get(key)
+            if entry is not None:
+                entry.leases -= 1
+                entry.last_used = time.time()
+
+    @contextmanager
+    def lease(self, key: str, params: Optional[Dict[str, Any]] = None):
+        """The instance for `key`, which won't be evicted until the block
+        exits."""
+        instance = self.acquire(key, params)
+        try:
+            yield instance
+        finally:
+            self.release(key)
+
+    def _evict(self, now: float):
+        # Must be called with the lock held. Starts shutting down the
+        # instances idle for too long, then the least recently used ones
+        # beyond max_size; leased instances are never evicted
+        evicted = []
+        for key, entry in list(self._instances.items()):
+            if entry.leases == 0 and now - entry.last_used >= self.idle_timeout:
+                evicted.append((key, entry.instance, "idle"))
+                del self._instances[key]
+        for key, entry in list(self._instances.items()):
+            if len(self._instances) <= self.max_size:
+                break
+            if entry.leases == 0:
+                evicted.append((key, entry.instance, "lru"))
+                del self._instances[key]
+        for key, _, reason in evicted:
+            if reason == "idle":
+                self.evicted_idle += 1
+            else:
+                self.evicted_lru += 1
+            INSTANCE_POOL_EVICTIONS.inc(pool=self.name, reason=reason)
+        return self._shut_down(evicted)
+
+    def _shut_down(self, evicted):
+        # Must be called with the lock held, so that a key is always either
+        # live or closing. Returns (key, future) for `_watch`
+        closing = []
+        for key, instance, _ in evicted:
+            future = self._shutdowns.submit(self._shut_down_instance, key, instance)
+            self._closing[key] = future
+            closing.append((key, future))
+        return closing
+
+    def _watch(self, closing) -> None:
+        # Outside the lock: a callback runs inline if the future is done
+        for key, future in closing:
+            future.add_done_callback(lambda future, key=key: self._closed(key, future))
+
+    def _shut_down_instance(self, key: str, instance) -> None:
+        try:
+            instance.shutdown()
+        except Exception as e:
+            with self._lock:
+                self.shutdown_errors += 1
+            print(f"Failed to shut down {self.name} instance {key}: {e}")
+
+    def _closed(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._closing.get(key) is future:
+                del self._closing[key]
+
+    def _start_sweeper(self) -> None:
+        # Must be called with the lock held
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(
+                target=self._sweep, name=f"InstancePoolSweeper-{self.name}", daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            with self._lock:
+                closing = self._evict(time.time())
+            self._watch(closing)
+
+    def close(self) -> None:
+        """Shuts down every instance, waiting for their pending updates."""
+        self._stop.set()
+        with self._lock:
+            evicted = [
+                (key, entry.instance, "close") for key, entry in self._instances.items()
+            ]
+            self._instances.clear()
+            closing = self._shut_down(evicted)
+        self._watch(closing)
+        self._shutdowns.shutdown(wait=True)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._instances)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "live": len(self._instances),
+                "leased": sum(entry.leases > 0 for entry in self._instances.values()),
+                "closing": len(self._closing),
+                "creating": len(self._creating),
+                "created": self.created,
+                "evicted_idle": self.evicted_idle,
+                "evicted_lru": self.evicted_lru,
+                "shutdown_errors": self.shutdown_errors,
+            }
+
+
+def process_memory_collector():
+    memory = psutil.Process().memory_info()
+    return [
+        (
+            "process_memory_bytes",
+            "gauge",
+            "Memory of this process (resident and virtual)",
+            [({"type": "resident"}, memory.rss), ({"type": "virtual"}, memory.vms)],
+        )
+    ]
+
+
+def create_fashion(user_id: str, params: Dict[str, Any]):
+    return Fashion(user_id, init_state_params=params)
+
+
+# One Fashion instance per user id; the profile only seeds a new user's state
+fashion_instances = InstancePool("fashion", create_fashion)
+registry.register_collector(
+    stats_collector(
+        "instance_pool_stats",
+        "Live, leased and evicted component instances in the pool",
+        fashion_instances.stats,
+        "stat",
+        pool="fashion",
+    )
+)
+registry.register_collector(process_memory_collector)
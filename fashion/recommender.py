@@ -4,20 +4,30 @@ TODOs:
 * Streamlit sidebar that displays versions of the prompt in real-time
 """
 
+import hashlib
+import json
+import queue
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from motion import Component
 import os
-from openai import OpenAI
-import instructor
-
-# from fashion.utils import (
-#     RecommendationPrompt,
-#     ItemListPrompt,
-#     SummaryPrompt,
-#     NotePrompt,
-#     EventSuggestionPrompt,
-# )
-from fashion.globalsummaries import GlobalSummaries
+import pydantic_core
+
+from fashion.utils import (
+    RecommendationPrompt,
+    ItemListPrompt,
+    SummaryPrompt,
+    NotePrompt,
+    NotesPrompt,
+    EventSuggestionPrompt,
+)
+from fashion.activity import ActivityLogger
+from fashion import liststate, tracing
+from fashion.cache import GlobalSummariesCache, ResultCache
+from fashion.clients import async_clients, client, oai_client
+from fashion.metrics import instrument, registry, start_metrics_server, stats_collector
+from fashion.retention import RetentionPolicy, fit_to_budget
 
 from rich import print
 
@@ -26,12 +36,76 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-oai_client = OpenAI()
-client = instructor.from_openai(OpenAI())
+
+# Instance of GlobalSummaries to read trends from and log activity to
+GLOBAL_SUMMARIES_ID = os.getenv("GLOBAL_SUMMARIES_ID", "production")
+
+# Shared across serve ops; only refreshed when a new news summary is written
+global_summaries_cache = GlobalSummariesCache(
+    GLOBAL_SUMMARIES_ID,
+    refresh_interval=float(os.getenv("GLOBAL_SUMMARIES_REFRESH_SECONDS", "5")),
+)
+
+# Activity events are forwarded to GlobalSummaries in the background, so
+# update ops don't wait on the global summarizer
+activity_logger = ActivityLogger(
+    GLOBAL_SUMMARIES_ID,
+    max_queue_size=int(os.getenv("ACTIVITY_QUEUE_SIZE", "1000")),
+)
+
+# Results of the recommend op, keyed on the event and its prompt context
+recommend_cache = ResultCache(
+    max_entries=int(os.getenv("RECOMMEND_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RECOMMEND_CACHE_TTL", "600")),
+    max_bytes=int(os.getenv("RECOMMEND_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+)
+
+# Bounds on the raw history lists kept in state, and the token budget for the
+# raw history put into prompts when summaries are off
+HISTORY_RETENTION = RetentionPolicy(
+    max_items=int(os.getenv("HISTORY_MAX_ITEMS", "100")),
+    max_bytes=int(os.getenv("HISTORY_MAX_BYTES", str(64 * 1024))),
+)
+RAW_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAW_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Cache and activity queue stats, exposed with the op and LLM metrics
+registry.register_collector(
+    stats_collector(
+        "global_summaries_cache_stats",
+        "Hits, misses and invalidations of the GlobalSummaries read cache",
+        global_summaries_cache.stats,
+        "stat",
+    )
+)
+registry.register_collector(
+    stats_collector(
+        "recommend_cache_stats",
+        "Hits, misses and size of the recommend result cache",
+        recommend_cache.stats,
+        "stat",
+    )
+)
+registry.register_collector(
+    stats_collector(
+        "activity_logger_stats",
+        "Queue depth and counts of the background activity logger",
+        activity_logger.stats,
+        "stat",
+    )
+)
+start_metrics_server()
 
 
 Fashion = Component("Fashion")
 
+# History lists are stored next to the pickled state and appended to, not
+# rewritten, on every update (see fashion/liststate.py)
+FASHION_LISTS = liststate.ListStore(
+    ["search_history", "raw_user_feedback", "raw_previous_recommendations"]
+)
+Fashion.save_state(FASHION_LISTS.save)
+Fashion.load_state(FASHION_LISTS.load)
+
 
 @Fashion.init_state
 def setup(
@@ -51,12 +125,24 @@ def setup(
     }
 
 
-@Fashion.serve("note")
-def note(state, props):
-    recommendation = props["recommendation"]
-    query = props["event"]
+def raw_context(state, query, raw_news):
+    # Selects the most recent and relevant raw history that fits in the
+    # token budget, for prompts that don't use summaries
+    budget = RAW_CONTEXT_TOKEN_BUDGET
+    return (
+        fit_to_budget(state["raw_previous_recommendations"], budget // 4, query),
+        fit_to_budget(state["raw_user_feedback"], budget // 4, query),
+        fit_to_budget(raw_news, budget // 2, query),
+    )
+
+
+def note_context(state, query, use_summaries):
+    # Returns the system prompt, the client description, and what the notes
+    # should reference, shared by the note and notes serve ops
     gender = state["gender"]
-    use_summaries = props.get("use_summaries", True)
+    client_intro = (
+        f"I am your client, a {state['occupation']} and {state['age']} years old."
+    )
 
     if use_summaries:
         query_summary = state["query_summary"]
@@ -64,56 +150,250 @@ def note(state, props):
             query_summary = f" Here's a summary of my previous searches, which you can use to figure out my lifestyle and potential wardrobe preferences: {query_summary}."
 
         # Get the trends
-        with GlobalSummaries("production", disable_update_task=True) as gs:
-            news_summary = gs.read_state("news_summary")
+        news_summary = global_summaries_cache.read("news_summary")
 
-        return client.chat.completions.create(
-            model="gpt-4o",
-            response_model=NotePrompt,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are a professional stylist for {gender}. Here are the latest fashion trends: {news_summary}",
-                },
-                {
-                    "role": "user",
-                    "content": f"I am your client, a {state['occupation']} and {state['age']} years old.{query_summary} For `{query}`, you recommended the following item for me to buy: {recommendation}. Please write a short 1 sentence note for why I should buy this item, referencing my occupation, style summary, fashion trends, and preferences if they are relevant to the event. If you don't have enough information, describe why this item is in style or why it's a good fit for the event.",
-                },
-            ],
-        ).note  # type: ignore
+        system = f"You are a professional stylist for {gender}. Here are the latest fashion trends: {news_summary}"
+        references = (
+            "referencing my occupation, style summary, fashion trends, and preferences"
+        )
+        return system, client_intro + query_summary, references
 
     else:
         # Just dump all context into the prompt
-        raw_previous_recs = state["raw_previous_recommendations"]
-        raw_user_feedback = state["raw_user_feedback"]
+        raw_previous_recs, raw_user_feedback, raw_news = raw_context(
+            state, query, global_summaries_cache.read("raw_news")
+        )
 
-        # Get the trends
-        with GlobalSummaries("production", disable_update_task=True) as gs:
-            raw_news = gs.read_state("raw_news")
+        system = f"You are a professional stylist for {gender}. In the past, you have recommended the following items for me to buy: {raw_previous_recs}. I've also provided feedback on the following items: {raw_user_feedback}. Here are the latest fashion trends: {raw_news}"
+        references = "referencing my occupation, style summary, and preferences"
+        return system, client_intro, references
 
-        return client.chat.completions.create(
-            model="gpt-4o",
-            response_model=NotePrompt,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are a professional stylist for {gender}. In the past, you have recommended the following items for me to buy: {raw_previous_recs}. I've also provided feedback on the following items: {raw_user_feedback}. Here are the latest fashion trends: {raw_news}",
-                },
-                {
-                    "role": "user",
-                    "content": f"I am your client, a {state['occupation']} and {state['age']} years old. For `{query}`, you recommended the following item for me to buy: {recommendation}. Please write a short 1 sentence note for why I should buy this item, referencing my occupation, style summary, and preferences if they are relevant to the event. If you don't have enough information, describe why this item is in style or why it's a good fit for the event.",
-                },
-            ],
-        ).note
+
+def note_messages(state, props):
+    recommendation = props["recommendation"]
+    query = props["event"]
+    use_summaries = props.get("use_summaries", True)
+
+    system, client_intro, references = note_context(state, query, use_summaries)
+
+    return [
+        {
+            "role": "system",
+            "content": system,
+        },
+        {
+            "role": "user",
+            "content": f"{client_intro} For `{query}`, you recommended the following item for me to buy: {recommendation}. Please write a short 1 sentence note for why I should buy this item, {references} if they are relevant to the event. If you don't have enough information, describe why this item is in style or why it's a good fit for the event.",
+        },
+    ]
+
+
+@Fashion.serve("note")
+@instrument("Fashion", "serve")
+def note(state, props):
+    return client.chat.completions.create(
+        model="gpt-4o",
+        response_model=NotePrompt,
+        messages=note_messages(state, props),
+    ).note  # type: ignore
+
+
+@Fashion.serve("notes")
+@instrument("Fashion", "serve")
+def notes(state, props):
+    # Generates a note for every recommended item in a single LLM call.
+    # recommendations is a dict of RecommendationPrompt field -> item, and
+    # the result is a dict of field -> note.
+    recommendations = props["recommendations"]
+    query = props["event"]
+    use_summaries = props.get("use_summaries", True)
+
+    if set(recommendations.keys()) == set(NotesPrompt.model_fields.keys()):
+        system, client_intro, references = note_context(state, query, use_summaries)
+        items = "\n".join(
+            f"- {field}: {recommendation}"
+            for field, recommendation in recommendations.items()
+        )
+
+        try:
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                response_model=NotesPrompt,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system,
+                    },
+                    {
+                        "role": "user",
+                        "content": f"{client_intro} For `{query}`, you recommended the following items for me to buy:\n{items}\n\nFor each item, please write a short 1 sentence note for why I should buy it, {references} if they are relevant to the event. If you don't have enough information, describe why the item is in style or why it's a good fit for the event.",
+                    },
+                ],
+            )  # type: ignore
+            return {field: getattr(response, field) for field in recommendations.keys()}
+
+        except Exception as e:
+            print(f"Batched notes failed, falling back to one note per item: {e}")
+
+    # Fall back to generating each note separately
+    if not recommendations:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(recommendations)) as executor:
+        futures = {
+            field: executor.submit(
+                note, state, {**props, "recommendation": recommendation}
+            )
+            for field, recommendation in recommendations.items()
+        }
+        return {field: future.result() for field, future in futures.items()}
+
+
+def normalize_event(event: str) -> str:
+    return " ".join(event.lower().split()).strip(" .!?")
+
+
+def recommend_cache_key(state, props):
+    # Fingerprint of exactly the inputs that go into the recommend prompt
+    query = props["event"]
+    use_summaries = props.get("use_summaries", True)
+    profile = [state["gender"], state["occupation"], state["age"]]
+
+    if use_summaries:
+        context = [
+            state["query_summary"],
+            state["previous_recommendations"].get(query.lower(), []),
+        ]
+    else:
+        context = [
+            state["raw_previous_recommendations"],
+            state["raw_user_feedback"],
+        ]
+
+    fingerprint = json.dumps(
+        [profile, context, global_summaries_cache.version(), use_summaries],
+        sort_keys=True,
+        default=str,
+    )
+    return f"{normalize_event(query)}/{hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()}"
 
 
 @Fashion.serve("recommend")
+@instrument("Fashion", "serve")
 def recommend(state, props):
+    # Identical events for an unchanged user (and unchanged trends) are
+    # served from memory
+    return recommend_cache.get_or_compute(
+        recommend_cache_key(state, props),
+        lambda: generate_recommendations(state, props),
+    )
+
+
+def generate_recommendations(state, props):
+    use_summaries = props.get("use_summaries", True)
+    print(f"Use summaries: {use_summaries}")
+
+    # Get the trends
+    trends = global_summaries_cache.read(
+        "news_summary" if use_summaries else "raw_news"
+    )
+
+    return client.chat.completions.create(
+        model="gpt-4o",
+        response_model=RecommendationPrompt,
+        messages=recommend_messages(state, props, trends),
+    )  # type: ignore
+
+
+@Fashion.serve("recommend_stream")
+@instrument("Fashion", "serve")
+def recommend_stream(state, props):
+    # Same as recommend, but yields (field, item) pairs as soon as each
+    # RecommendationPrompt field is complete, so callers can start on the
+    # first item while the rest are still being generated. Fields are
+    # yielded in the order the model writes them. Goes through
+    # recommend_cache like recommend: a cached result is yielded at once, and
+    # a caller whose prompt is already being streamed waits for that stream's
+    # result instead of starting another LLM call.
+    key = recommend_cache_key(state, props)
+    fields = queue.Queue()
+    result = Future()
+
+    def compute():
+        try:
+            result.set_result(
+                recommend_cache.get_or_compute(
+                    key, lambda: stream_recommendations(state, props, fields.put)
+                )
+            )
+        except Exception as e:
+            result.set_exception(e)
+        fields.put(None)
+
+    threading.Thread(target=tracing.propagate(compute), daemon=True).start()
+
+    yielded = set()
+    while True:
+        item = fields.get()
+        if item is None:
+            break
+        yielded.add(item[0])
+        yield item
+
+    for field, value in result.result().model_dump().items():
+        if field not in yielded:
+            yield field, value
+
+
+def stream_recommendations(state, props, on_field):
+    # Calls on_field((field, item)) as each field completes and returns the
+    # full RecommendationPrompt
+    use_summaries = props.get("use_summaries", True)
+    trends = global_summaries_cache.read(
+        "news_summary" if use_summaries else "raw_news"
+    )
+
+    # Stream the tool call arguments and parse the partial JSON as it arrives
+    schema = RecommendationPrompt.openai_schema
+    stream = oai_client.chat.completions.create(
+        model="gpt-4o",
+        messages=recommend_messages(state, props, trends),
+        tools=[{"type": "function", "function": schema}],
+        tool_choice={"type": "function", "function": {"name": schema["name"]}},
+        stream=True,
+        # The last chunk carries the token usage, for the LLM metrics
+        stream_options={"include_usage": True},
+    )
+
+    # Partial parsing leaves out a string until its closing quote, so a
+    # field is complete as soon as it shows up
+    arguments = ""
+    yielded = set()
+    for chunk in stream:
+        if not chunk.choices or not chunk.choices[0].delta.tool_calls:
+            continue
+        arguments += chunk.choices[0].delta.tool_calls[0].function.arguments or ""
+        partial = pydantic_core.from_json(arguments or "{}", allow_partial=True)
+        for field in partial:
+            if field not in yielded:
+                yielded.add(field)
+                on_field((field, partial[field]))
+
+    return RecommendationPrompt.model_validate_json(arguments)
+
+
+def recommendation_fields(serve_result):
+    # The recommend op returns a RecommendationPrompt and recommend_stream a
+    # list of (field, item) pairs
+    if isinstance(serve_result, RecommendationPrompt):
+        return serve_result.model_dump()
+    return dict(serve_result)
+
+
+def recommend_messages(state, props, trends):
     # Construct prompt
     query = props["event"]
     gender = state["gender"]
     use_summaries = props.get("use_summaries", True)
-    print(f"Use summaries: {use_summaries}")
 
     if use_summaries:
         already_rec = state["previous_recommendations"].get(query.lower(), [])
@@ -128,33 +408,24 @@ def recommend(state, props):
         if len(query_summary) > 0:
             query_summary = f" Here's a summary of my previous searches, which you can use to figure out my lifestyle and potential wardrobe preferences: {query_summary}."
 
-        # Get the trends
-        with GlobalSummaries("production", disable_update_task=True) as gs:
-            news_summary = gs.read_state("news_summary")
+        news_summary = trends
 
-        return client.chat.completions.create(
-            model="gpt-4o",
-            response_model=RecommendationPrompt,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are a professional stylist for {gender}. Here are the latest fashion trends: {news_summary}",
-                },
-                {
-                    "role": "user",
-                    "content": f"I am your client, a {state['occupation']} and {state['age']} years old.{query_summary} What {gender} apparel items should I buy to wear to {query}?{already_rec} Make sure your suggestions are appropriate for the event. Be highly specific for each item, including colors, cuts, and styles. Each item should be ~5 words long.",
-                },
-            ],
-        )  # type: ignore
+        return [
+            {
+                "role": "system",
+                "content": f"You are a professional stylist for {gender}. Here are the latest fashion trends: {news_summary}",
+            },
+            {
+                "role": "user",
+                "content": f"I am your client, a {state['occupation']} and {state['age']} years old.{query_summary} What {gender} apparel items should I buy to wear to {query}?{already_rec} Make sure your suggestions are appropriate for the event. Be highly specific for each item, including colors, cuts, and styles. Each item should be ~5 words long.",
+            },
+        ]
 
     else:
         # Just dump all context into the prompt
-        raw_previous_recs = state["raw_previous_recommendations"]
-        raw_user_feedback = state["raw_user_feedback"]
-
-        # Get the trends
-        with GlobalSummaries("production", disable_update_task=True) as gs:
-            raw_news = gs.read_state("raw_news")
+        raw_previous_recs, raw_user_feedback, raw_news = raw_context(
+            state, query, trends
+        )
 
         already_rec = raw_previous_recs
         if len(already_rec) > 0:
@@ -165,56 +436,117 @@ def recommend(state, props):
         else:
             already_rec = ""
 
-        return client.chat.completions.create(
-            model="gpt-4o",
-            response_model=RecommendationPrompt,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are a professional stylist for {gender}. Here are the latest fashion trends: {raw_news}",
-                },
-                {
-                    "role": "user",
-                    "content": f"I am your client, a {state['occupation']} and {state['age']} years old. I've provided feedback on the following items: {raw_user_feedback}. What {gender} apparel items should I buy to wear to {query}?{already_rec} Make sure your suggestions are appropriate for the event. Be highly specific for each item, including colors, cuts, and styles. Each item should be ~5 words long.",
-                },
-            ],
-        )  # type: ignore
+        return [
+            {
+                "role": "system",
+                "content": f"You are a professional stylist for {gender}. Here are the latest fashion trends: {raw_news}",
+            },
+            {
+                "role": "user",
+                "content": f"I am your client, a {state['occupation']} and {state['age']} years old. I've provided feedback on the following items: {raw_user_feedback}. What {gender} apparel items should I buy to wear to {query}?{already_rec} Make sure your suggestions are appropriate for the event. Be highly specific for each item, including colors, cuts, and styles. Each item should be ~5 words long.",
+            },
+        ]
 
 
-@Fashion.serve("random_event")
-def random_event(state, props):
+def random_event_messages(state):
     query_summary = state["query_summary"]
     if len(query_summary) > 0:
         query_summary = f"Based on my style profile: {query_summary}"
     else:
         query_summary = "Based on my profile"
 
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful assistant.",
+        },
+        {
+            "role": "user",
+            "content": f"{query_summary}, suggest a specific type of event that might interest me, totally different from previous events that I've attended (e.g., hiking in Japan, a Beatles concert, dinner in Paris, brunch in Central Park in Manhattan, skiing in the Alps, a workout class in all lululemon). Don't suggest wine tasting in Napa Valley. Your answer should be a short phrase (~8 words).",
+        },
+    ]
+
+
+@Fashion.serve("random_event")
+@instrument("Fashion", "serve")
+def random_event(state, props):
     response = oai_client.chat.completions.create(
         model="gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant.",
-            },
-            {
-                "role": "user",
-                "content": f"{query_summary}, suggest a specific type of event that might interest me, totally different from previous events that I've attended (e.g., hiking in Japan, a Beatles concert, dinner in Paris, brunch in Central Park in Manhattan, skiing in the Alps, a workout class in all lululemon). Don't suggest wine tasting in Napa Valley. Your answer should be a short phrase (~8 words).",
-            },
-        ],
+        messages=random_event_messages(state),
     )
 
     return response.choices[0].message.content
 
 
-@Fashion.update("recommend")
+# Async variants of the serve ops, for callers that run many flows
+# concurrently on one event loop (`await f.arun("recommend_async", ...)`)
+# instead of one thread per in-flight LLM call. They share prompts, caches
+# and update ops with their sync counterparts.
+
+
+@Fashion.serve("recommend_async")
+@instrument("Fashion", "serve")
+async def recommend_async(state, props):
+    # Reading the trends first also refreshes the news version, so building
+    # the cache key and the prompt doesn't block the loop on Redis
+    use_summaries = props.get("use_summaries", True)
+    trends = await global_summaries_cache.aread(
+        "news_summary" if use_summaries else "raw_news"
+    )
+    key = recommend_cache_key(state, props)
+    cached = recommend_cache.get(key)
+    if cached is not None:
+        return cached
+
+    _, async_client = async_clients()
+    recommendation = await async_client.chat.completions.create(
+        model="gpt-4o",
+        response_model=RecommendationPrompt,
+        messages=recommend_messages(state, props, trends),
+    )  # type: ignore
+    recommend_cache.put(key, recommendation)
+    return recommendation
+
+
+@Fashion.serve("note_async")
+@instrument("Fashion", "serve")
+async def note_async(state, props):
+    # Loads the trends note_messages reads, off the loop if they're stale
+    await global_summaries_cache.aread(
+        "news_summary" if props.get("use_summaries", True) else "raw_news"
+    )
+    messages = note_messages(state, props)
+    _, async_client = async_clients()
+    response = await async_client.chat.completions.create(
+        model="gpt-4o",
+        response_model=NotePrompt,
+        messages=messages,
+    )  # type: ignore
+    return response.note
+
+
+@Fashion.serve("random_event_async")
+@instrument("Fashion", "serve")
+async def random_event_async(state, props):
+    async_oai_client, _ = async_clients()
+    response = await async_oai_client.chat.completions.create(
+        model="gpt-4o",
+        messages=random_event_messages(state),
+    )
+
+    return response.choices[0].message.content
+
+
+@Fashion.update(["recommend", "recommend_stream", "recommend_async"])
+@instrument("Fashion", "update")
 def update_previous_recommendations(state, props):
     # Ask LLM to extract items from the serve_result
-    llm_response = props.serve_result.model_dump()
+    llm_response = recommendation_fields(props.serve_result)
     gender = state["gender"]
     query = props["event"]
-    raw_previous_recommendations = state["raw_previous_recommendations"] + [
-        str(llm_response)
-    ]
+    raw_previous_recommendations = liststate.append(
+        state["raw_previous_recommendations"], [str(llm_response)], HISTORY_RETENTION
+    )
 
     already_rec = state["previous_recommendations"].get(query.lower(), [])
     if len(already_rec) > 0:
@@ -246,12 +578,13 @@ def update_previous_recommendations(state, props):
     }
 
 
-@Fashion.update("recommend")
+@Fashion.update(["recommend", "recommend_stream", "recommend_async"])
+@instrument("Fashion", "update")
 def update_search_queries(state, props):
     # Maintain a summary of search queries
     query = props["event"]
     gender = state["gender"]
-    queries = state["search_history"] + [query]
+    queries = liststate.append(state["search_history"], [query], HISTORY_RETENTION)
     summary = state["query_summary"]
 
     print(f"Creating a summary for user {state.instance_id}")
@@ -274,21 +607,15 @@ def update_search_queries(state, props):
         .message.content
     )
 
-    with GlobalSummaries("production") as gs:
-        gs.run(
-            "user_activity",
-            props={
-                "user_activity": f"User {state.instance_id} searched for {query}",
-                "timestamp": time.time(),
-            },
-            flush_update=True,
-            ignore_cache=True,
-        )
+    activity_logger.log(
+        f"User {state.instance_id} searched for {query}", timestamp=time.time()
+    )
 
     return {"search_history": queries, "query_summary": summary}
 
 
 @Fashion.update("user_feedback")
+@instrument("Fashion", "update")
 def update_feedback(state, props):
     feedback = props.get("feedback", "")
     feedback_str = f"(Feedback: {feedback})" if len(feedback) > 0 else ""
@@ -296,7 +623,12 @@ def update_feedback(state, props):
     outfit = props["outfit"]
     event = props["event"]
     gender = state["gender"]
-    raw_user_feedback = state["raw_user_feedback"] + [str(props)]
+    raw_user_feedback = liststate.append(
+        state["raw_user_feedback"],
+        # The trace context is bookkeeping, not feedback
+        [str({key: value for key, value in props.items() if key != "trace"})],
+        HISTORY_RETENTION,
+    )
 
     # Merge this into the style summary
     summary = (
@@ -317,16 +649,10 @@ def update_feedback(state, props):
         .message.content
     )
 
-    with GlobalSummaries("production") as gs:
-        gs.run(
-            "user_activity",
-            props={
-                "user_activity": f"User {state.instance_id} gave feedback {feedback} of type {action} for outfit {outfit}",
-                "timestamp": time.time(),
-            },
-            flush_update=True,
-            ignore_cache=True,
-        )
+    activity_logger.log(
+        f"User {state.instance_id} gave feedback {feedback} of type {action} for outfit {outfit}",
+        timestamp=time.time(),
+    )
 
     return {"query_summary": summary, "raw_user_feedback": raw_user_feedback}
 
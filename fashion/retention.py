@@ -0,0 +1,101 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+
+def count_tokens(text: str) -> int:
+    # Rough approximation (~4 characters per token for English text)
+    return max(1, len(text) // 4)
+
+
+def entry_text(entry: Any) -> str:
+    # Timestamped entries are stored as (timestamp, value) tuples
+    if is_timestamped(entry):
+        return str(entry[1])
+    return str(entry)
+
+
+def is_timestamped(entry: Any) -> bool:
+    return (
+        isinstance(entry, (tuple, list))
+        and len(entry) == 2
+        and isinstance(entry[0], (int, float))
+    )
+
+
+@dataclass
+class RetentionPolicy:
+    """Bounds a list-valued piece of state. Keeps the most recent entries
+    (the end of the list) within `max_items` entries and `max_bytes` of text,
+    and drops (timestamp, value) entries older than `max_age` seconds.
+    A limit of 0 or None disables it."""
+
+    max_items: int = 0
+    max_bytes: int = 0
+    max_age: Optional[float] = None
+
+    def apply(self, entries: List[Any], now: Optional[float] = None) -> List[Any]:
+        entries = list(entries)
+
+        if self.max_age:
+            cutoff = (now if now is not None else time.time()) - self.max_age
+            entries = [
+                entry
+                for entry in entries
+                if not is_timestamped(entry) or entry[0] >= cutoff
+            ]
+
+        if self.max_items and len(entries) > self.max_items:
+            entries = entries[-self.max_items :]
+
+        if self.max_bytes:
+            total = 0
+            kept = 0
+            for entry in reversed(entries):
+                total += len(entry_text(entry).encode("utf-8"))
+                if total > self.max_bytes:
+                    break
+                kept += 1
+            entries = entries[len(entries) - kept :]
+
+        return entries
+
+
+def words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def fit_to_budget(
+    entries: List[Any], max_tokens: int, query: Optional[str] = None
+) -> List[Any]:
+    """Selects the entries to put in a prompt within `max_tokens`.
+
+    Entries are ranked by recency and, if a query is given, by how many
+    words they share with it; the best-ranked entries that fit are returned
+    in their original (chronological) order. A budget of 0 returns all
+    entries.
+    """
+    if not max_tokens or not entries:
+        return list(entries)
+
+    query_words = words(query) if query else set()
+    num_entries = len(entries)
+
+    def score(index: int) -> float:
+        recency = (index + 1) / num_entries
+        if not query_words:
+            return recency
+        overlap = len(query_words & words(entry_text(entries[index])))
+        return overlap + recency
+
+    selected = []
+    used = 0
+    for index in sorted(range(num_entries), key=score, reverse=True):
+        tokens = count_tokens(entry_text(entries[index]))
+        if used + tokens > max_tokens:
+            continue
+        selected.append(index)
+        used += tokens
+
+    return [entries[index] for index in sorted(selected)]
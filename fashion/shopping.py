@@ -0,0 +1,245 @@
+"""
+Shopping search (Serper) with a shared session and a persistent result cache.
+
+All searches in the process go through one long-lived aiohttp session, which
+runs on its own event loop thread, so Streamlit reruns don't pay for new
+connections. Results are cached in SQLite (`SHOPPING_CACHE_PATH`) by
+normalized query, with a TTL and an LRU bound on the number of entries, so
+reruns and repeated items across users and restarts don't call Serper again.
+Concurrent searches for the same query share one request.
+
+`submit` returns a concurrent.futures.Future and can be called from any
+thread; `search` and `search_many` block until the results are ready.
+"""
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import aiohttp
+
+from fashion import tracing
+from fashion.metrics import registry, stats_collector
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERPER_SHOPPING_URL = os.getenv(
+    "SERPER_SHOPPING_URL", "https://google.serper.dev/shopping"
+)
+SHOPPING_CACHE_PATH = os.getenv("SHOPPING_CACHE_PATH", "shopping_cache.sqlite3")
+SHOPPING_CACHE_TTL = float(os.getenv("SHOPPING_CACHE_TTL", str(24 * 3600)))
+SHOPPING_CACHE_MAX_ENTRIES = int(os.getenv("SHOPPING_CACHE_MAX_ENTRIES", "50000"))
+SHOPPING_TIMEOUT = float(os.getenv("SHOPPING_TIMEOUT", "10"))
+SHOPPING_MAX_CONNECTIONS = int(os.getenv("SHOPPING_MAX_CONNECTIONS", "20"))
+
+
+def normalize_query(query: str) -> str:
+    # "Navy Blazer  for Male." and "navy blazer for male" are the same search
+    return re.sub(r"\s+", " ", query).strip().strip(".,;:!?").lower()
+
+
+class ShoppingCache:
+    """SQLite-backed LRU cache with a TTL, shared by all threads."""
+
+    def __init__(
+        self,
+        path: str = SHOPPING_CACHE_PATH,
+        ttl: float = SHOPPING_CACHE_TTL,
+        max_entries: int = SHOPPING_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Must be called with the lock held. Opened on first use, so importing
+        # the module doesn't create the file
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS shopping_results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS shopping_results_accessed "
+                "ON shopping_results (accessed_at)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM shopping_results WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                self._db.execute("DELETE FROM shopping_results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE shopping_results SET accessed_at = ? WHERE key = ?",
+                (now, key),
+            )
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO shopping_results VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            # Evict the least recently used entries beyond the limit
+            self._db.execute(
+                "DELETE FROM shopping_results WHERE key IN ("
+                "SELECT key FROM shopping_results ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM shopping_results").fetchone()[
+                0
+            ]
+
+
+class ShoppingSearch:
+    def __init__(
+        self, url: str = SERPER_SHOPPING_URL, cache: Optional[ShoppingCache] = None
+    ):
+        self.url = url
+        self.cache = cache or ShoppingCache()
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._inflight = {}  # normalized query -> Future
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Must be called with the lock held
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=self._loop.run_forever, name="ShoppingSearch", daemon=True
+            ).start()
+        return self._loop
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=SHOPPING_MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=SHOPPING_TIMEOUT),
+                headers={
+                    "X-API-KEY": os.getenv("SERPER_API_KEY") or "",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._session
+
+    async def _fetch(self, query: str, trace):
+        start = time.time()
+        status = "error"
+        try:
+            session = await self._get_session()
+            async with session.post(
+                self.url, data=json.dumps({"q": query})
+            ) as response:
+                response.raise_for_status()
+                result = await response.json()
+            status = "ok"
+            return result
+        finally:
+            tracing.record_span(
+                "serper.shopping", trace, start, time.time(), status, query=query
+            )
+
+    def submit(self, query: str, trace=None) -> Future:
+        """Starts a search (or joins the one in flight) and returns a Future
+        of the Serper shopping results. The request is traced under `trace`
+        (default: the current span)."""
+        if trace is None:
+            trace = tracing.trace_context()
+        key = normalize_query(query)
+        # In-flight searches are checked before the cache: _done caches the
+        # result before it drops the search, so a query is always in one of them
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+
+            result = self.cache.get(key)
+            if result is not None:
+                self.hits += 1
+                future = Future()
+                future.set_result(result)
+                return future
+
+            self.misses += 1
+            future = asyncio.run_coroutine_threadsafe(
+                self._fetch(query, trace), self._ensure_loop()
+            )
+            self._inflight[key] = future
+        future.add_done_callback(lambda future: self._done(key, future))
+        return future
+
+    def _done(self, key: str, future: Future) -> None:
+        if future.exception() is None:
+            self.cache.put(key, future.result())
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.exception() is not None:
+                self.errors += 1
+
+    def search(self, query: str):
+        return self.submit(query).result()
+
+    def search_many(self, queries: List[str]):
+        futures = [self.submit(query) for query in queries]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "inflight": len(self._inflight),
+            }
+
+
+shopping_search = ShoppingSearch()
+registry.register_collector(
+    stats_collector(
+        "shopping_search_stats",
+        "Cache hits, Serper requests and coalesced searches for shopping results",
+        shopping_search.stats,
+        "stat",
+    )
+)
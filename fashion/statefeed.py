@@ -0,0 +1,106 @@
+"""
+Change feed over the states of a component's instances.
+
+Motion bumps `MOTION_VERSION:<Component>__<instance>` every time it saves an
+instance's state. `StateFeed.poll()` reads all version stamps with one MGET
+per chunk of instances and reports only the instances whose version moved, so
+a dashboard loads (and unpickles) just the states that changed instead of
+every state on every refresh. The instance list itself is rediscovered with
+SCAN every `INSTANCE_RESCAN_SECONDS`, not on every poll.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from motion.utils import get_redis_params, loadState
+
+from fashion.liststate import load_lists
+
+INSTANCE_RESCAN_SECONDS = float(os.getenv("INSTANCE_RESCAN_SECONDS", "30"))
+# Version stamps read per MGET round trip
+MGET_CHUNK_SIZE = int(os.getenv("MGET_CHUNK_SIZE", "1000"))
+
+
+class StateFeed:
+    def __init__(
+        self,
+        component_name: str,
+        redis_con: Optional[redis.Redis] = None,
+        rescan_interval: float = INSTANCE_RESCAN_SECONDS,
+    ):
+        self.component_name = component_name
+        self.rescan_interval = rescan_interval
+        self._redis = redis_con or redis.Redis(**get_redis_params().model_dump())
+        self._lock = threading.Lock()
+        self._instances: List[str] = []
+        self._last_scan = None
+
+        # Last seen version and when it last moved, per instance id
+        self.versions: Dict[str, int] = {}
+        self.changed_at: Dict[str, float] = {}
+
+    def _version_key(self, instance_id: str) -> str:
+        return f"MOTION_VERSION:{self.component_name}__{instance_id}"
+
+    def instances(self, rescan: bool = False) -> List[str]:
+        with self._lock:
+            if (
+                rescan
+                or self._last_scan is None
+                or time.time() - self._last_scan >= self.rescan_interval
+            ):
+                prefix = f"MOTION_VERSION:{self.component_name}__"
+                self._instances = [
+                    key.decode("utf-8")[len(prefix) :]
+                    for key in self._redis.scan_iter(match=f"{prefix}*", count=1000)
+                ]
+                self._last_scan = time.time()
+            return list(self._instances)
+
+    def read_versions(self, instance_ids: List[str]) -> Dict[str, int]:
+        versions = {}
+        for i in range(0, len(instance_ids), MGET_CHUNK_SIZE):
+            chunk = instance_ids[i : i + MGET_CHUNK_SIZE]
+            values = self._redis.mget([self._version_key(id) for id in chunk])
+            for instance_id, value in zip(chunk, values):
+                # Instances deleted since the last scan have no version
+                if value is not None:
+                    versions[instance_id] = int(value)
+        return versions
+
+    def poll(self) -> List[str]:
+        """Returns the ids of instances that are new or whose version moved
+        since the last poll."""
+        versions = self.read_versions(self.instances())
+        now = time.time()
+        changed = []
+        with self._lock:
+            for instance_id, version in versions.items():
+                if self.versions.get(instance_id) != version:
+                    self.versions[instance_id] = version
+                    self.changed_at[instance_id] = now
+                    changed.append(instance_id)
+            for instance_id in set(self.versions) - set(versions):
+                del self.versions[instance_id]
+                del self.changed_at[instance_id]
+        return changed
+
+    def load(self, instance_id: str) -> Tuple[Optional[dict], int]:
+        """Loads one instance's state and version, with its stored lists."""
+        state, version = loadState(
+            self._redis,
+            f"{self.component_name}__{instance_id}",
+            lambda loaded: load_lists(loaded, self._redis),
+        )
+        return (dict(state) if state is not None else None), version
+
+    def recently_changed(self, limit: Optional[int] = None) -> List[str]:
+        """Instance ids, most recently changed first."""
+        with self._lock:
+            ordered = sorted(
+                self.changed_at, key=lambda id: self.changed_at[id], reverse=True
+            )
+        return ordered[:limit] if limit is not None else ordered
@@ -0,0 +1,238 @@
+"""
+Cleaning of scraped news articles before they are summarized.
+
+Scraped page text comes with navigation, cookie banners, share buttons,
+newsletter prompts and footers, and wire-service stories show up under many
+URLs with small edits. `clean_text` drops boilerplate lines and everything
+after a "Related articles"-style footer (a marker line on its own, or one in
+the last part of the page), then truncates the article to
+NEWS_ARTICLE_MAX_TOKENS at a paragraph boundary. `clean_articles` cleans a
+batch and drops the articles whose MinHash signature (word 5-gram shingles)
+is within NEWS_NEAR_DUPLICATE_THRESHOLD of an article kept earlier in the
+batch or seen in the last NEWS_DEDUP_WINDOW seconds.
+"""
+
+import hashlib
+import os
+import random
+import re
+from typing import Any, Dict, List, Tuple
+
+from fashion.metrics import registry
+from fashion.retention import count_tokens
+
+NEWS_ARTICLE_MAX_TOKENS = int(os.getenv("NEWS_ARTICLE_MAX_TOKENS", "2000"))
+# Estimated Jaccard similarity of shingles above which articles are copies
+NEWS_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEWS_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# How long signatures of ingested articles are compared against
+NEWS_DEDUP_WINDOW = float(os.getenv("NEWS_DEDUP_WINDOW", str(2 * 24 * 3600)))
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+# Banners and footers are short; a paragraph that starts like one isn't
+BOILERPLATE_MAX_WORDS = 40
+# Keywords alone only mark fragments (buttons, links, labels) as boilerplate:
+# body sentences mention Instagram or a sponsor too
+FRAGMENT_MAX_WORDS = 8
+# A footer marker only ends the article once some body text has been kept,
+# and only if it is a heading of its own or in the last part of the page;
+# elsewhere (an inline "Read more: ..." teaser) only its line is dropped
+MIN_BODY_WORDS = 50
+FOOTER_HEADING_MAX_WORDS = 5
+FOOTER_TAIL_FRACTION = 0.2
+
+NEWS_TOKENS_REMOVED = registry.counter(
+    "news_tokens_removed_total",
+    "Tokens of scraped news removed before summarization, by reason",
+    ("reason",),
+)
+
+BOILERPLATE_LINES = re.compile(
+    r"^(we use cookies|this (site|website) uses cookies|"
+    r"by (continuing to use|using) (this|our) (site|website)|"
+    r"(sign up|subscribe) (for|to)|follow us on|share (this|on)|©|copyright\b|"
+    r"all rights reserved|skip to (main )?content|enable javascript|"
+    r"click here to|create an account)",
+    re.IGNORECASE,
+)
+BOILERPLATE_KEYWORDS = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|©|"
+    r"copyright|subscribe|newsletter|sign (up|in)|log ?in|advertisement|"
+    r"sponsored|share|facebook|twitter|pinterest|instagram|whatsapp|"
+    r"accept all|manage preferences",
+    re.IGNORECASE,
+)
+# Navigation, breadcrumbs and buttons that show up as lines of their own;
+# other short lines (headings, list items) are kept
+NAVIGATION_LINES = re.compile(
+    r"^(home|menu|search|shop|shop now|videos?|more|next|previous|prev|back|"
+    r"back to top|close|print|e-?mail|comments?|\d+ comments?|share|follow|"
+    r"log ?in|log ?out|sign (in|up|out)|register|subscribe|newsletters?|"
+    r"advertisement|ad|skip|toggle navigation|open menu|main menu|"
+    r"view all|see all|load more|show more|listen|play|watch)[.:!]?$",
+    re.IGNORECASE,
+)
+BREADCRUMB_SEPARATORS = re.compile(r"\s(>|»|›|/|\|)\s")
+FOOTER_MARKERS = re.compile(
+    r"^(related (articles|stories|content|coverage)|more (from|stories)|"
+    r"you (may|might) also like|recommended( for you)?|read (more|next)|"
+    r"most popular|trending now)\b",
+    re.IGNORECASE,
+)
+
+# Hash functions of the MinHash signatures, (a * h + b) mod a Mersenne
+# prime; seeded, so every worker computes the same signatures
+_PRIME = (1 << 61) - 1
+_random = random.Random(2024)
+PERMUTATIONS = [
+    (_random.randrange(1, _PRIME), _random.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def is_sentence(line: str) -> bool:
+    return line.endswith((".", "!", "?", '"', "”"))
+
+
+def is_navigation(line: str) -> bool:
+    if NAVIGATION_LINES.match(line):
+        return True
+    # Breadcrumbs, e.g. "Home > Fashion > Trends": short parts between
+    # separators
+    parts = BREADCRUMB_SEPARATORS.split(line)[::2]
+    return len(parts) > 1 and all(len(part.split()) <= 3 for part in parts)
+
+
+def is_boilerplate(line: str) -> bool:
+    words = len(line.split())
+    if words <= BOILERPLATE_MAX_WORDS and BOILERPLATE_LINES.match(line):
+        return True
+    if is_sentence(line):
+        return False
+    if words <= FRAGMENT_MAX_WORDS and BOILERPLATE_KEYWORDS.search(line):
+        return True
+    return words <= FRAGMENT_MAX_WORDS and is_navigation(line)
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    # Keeps whole paragraphs while they fit, cutting a first paragraph that
+    # doesn't fit between words
+    if max_tokens <= 0 or count_tokens(text) <= max_tokens:
+        return text
+    max_chars = max_tokens * 4
+    kept = []
+    size = 0
+    for paragraph in text.split("\n"):
+        if size + len(paragraph) > max_chars:
+            if not kept:
+                kept.append(paragraph[:max_chars].rsplit(" ", 1)[0])
+            break
+        kept.append(paragraph)
+        size += len(paragraph) + 1
+    return "\n".join(kept)
+
+
+def clean_text(
+    text: str, max_tokens: int = NEWS_ARTICLE_MAX_TOKENS
+) -> Tuple[str, Dict[str, int]]:
+    """The informative part of a scraped article, and the tokens removed as
+    boilerplate and by truncation."""
+    kept = []
+    seen = set()
+    body_words = 0
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    words_left = sum(len(line.split()) for line in lines)
+    total_words = words_left
+    for line in lines:
+        words_left -= len(line.split())
+        if FOOTER_MARKERS.match(line):
+            if body_words >= MIN_BODY_WORDS and (
+                len(line.split()) <= FOOTER_HEADING_MAX_WORDS
+                or words_left <= total_words * FOOTER_TAIL_FRACTION
+            ):
+                break
+            # A teaser linking to another article, not part of this one
+            continue
+        # Repeated lines (e.g., a caption and its alt text) are kept once
+        if line.lower() in seen or is_boilerplate(line):
+            continue
+        seen.add(line.lower())
+        kept.append(line)
+        body_words += len(line.split())
+
+    cleaned = "\n".join(kept)
+    truncated = truncate(cleaned, max_tokens)
+    removed = {
+        "boilerplate": count_tokens(text) - count_tokens(cleaned) if text else 0,
+        "truncated": count_tokens(cleaned) - count_tokens(truncated),
+    }
+    return truncated, removed
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> List[int]:
+    hashes = [
+        int.from_bytes(
+            hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for s in shingles(text)
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingles of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def clean_articles(
+    articles: List[Tuple[str, Tuple[str, str]]],
+    recent: List[Tuple[str, float, List[int]]],
+    now: float,
+    max_tokens: int = NEWS_ARTICLE_MAX_TOKENS,
+    threshold: float = NEWS_NEAR_DUPLICATE_THRESHOLD,
+    window: float = NEWS_DEDUP_WINDOW,
+) -> Tuple[List[Tuple[str, Tuple[str, str]]], List[Any], Dict[str, int]]:
+    """Cleans a batch of (url, (text, img_url)) articles and drops near
+    duplicates. `recent` holds (url, timestamp, signature) of the articles
+    ingested in the last `window` seconds; returns the kept articles, the
+    updated `recent`, and the tokens removed (and articles dropped) by
+    reason."""
+    recent = [entry for entry in recent if now - entry[1] < window]
+    kept = []
+    removed = {"boilerplate": 0, "truncated": 0, "near_duplicate": 0}
+    near_duplicates = 0
+
+    for url, (text, img_url) in articles:
+        cleaned, counts = clean_text(text, max_tokens)
+        for reason, count in counts.items():
+            removed[reason] += count
+        if not cleaned:
+            continue
+
+        # A few hundred signatures per window, so a linear scan is enough.
+        # An article seen before under the same url isn't a copy; the news
+        # update skips the urls it has already summarized
+        signature = minhash(cleaned)
+        if any(
+            other_url != url and similarity(signature, other) >= threshold
+            for other_url, _, other in recent
+        ):
+            removed["near_duplicate"] += count_tokens(cleaned)
+            near_duplicates += 1
+            continue
+        if all(other_url != url for other_url, _, _ in recent):
+            recent.append((url, now, signature))
+        kept.append((url, (cleaned, img_url)))
+
+    for reason, count in removed.items():
+        if count:
+            NEWS_TOKENS_REMOVED.inc(count, reason=reason)
+    return kept, recent, {**removed, "near_duplicate_articles": near_duplicates}
@@ -0,0 +1,271 @@
+"""
+Lightweight span tracing for following one user query across serve ops,
+update ops, GlobalSummaries and external calls.
+
+The current span lives in a context variable. To follow a flow into Motion's
+background update ops, pass `trace_context()` in the flow's props under
+"trace": instrumented ops (see `fashion.metrics.instrument`) parent their
+span to it. Finished spans are queued and appended as JSON lines to
+`TRACE_FILE` (default `traces.jsonl`) by a background thread, which the
+Traces page renders as a waterfall. Off by default; set TRACING=1 to enable.
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+TRACING = os.getenv("TRACING", "0") == "1"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# The file is rotated to TRACE_FILE.1 once it reaches this size
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+# Finished spans waiting to be written; spans past this are dropped
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    thread: str = ""
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def context(self) -> Dict[str, str]:
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class JsonlExporter:
+    """Appends spans to a JSON lines file. `export` only queues the span; a
+    background thread serializes the queued spans and writes them in
+    batches, so traced ops never wait on the file. Spans are dropped (and
+    counted) when the queue is full."""
+
+    def __init__(self, path: str, max_bytes: int = 0, max_queue_size: int = 10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+        self.exported = 0
+        self.dropped = 0
+
+        atexit.register(self.flush, 2)
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="JsonlExporter", daemon=True
+                )
+                self._worker.start()
+
+    def export(self, span: Span) -> None:
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the spans exported so far are written."""
+        if self._worker is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write(self, lines) -> None:
+        try:
+            if (
+                self.max_bytes
+                and os.path.exists(self.path)
+                and os.path.getsize(self.path) > self.max_bytes
+            ):
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a") as f:
+                f.write("".join(lines))
+        except OSError:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            # Everything queued while the last batch was written goes into
+            # the next one
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = [
+                json.dumps(asdict(item), default=str) + "\n"
+                for item in items
+                if isinstance(item, Span)
+            ]
+            if lines:
+                self._write(lines)
+                with self._lock:
+                    self.exported += len(lines)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "exported": self.exported,
+                "dropped": self.dropped,
+            }
+
+
+exporter = JsonlExporter(TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_QUEUE_SIZE)
+
+
+def new_id(num_bytes: int = 8) -> str:
+    return secrets.token_hex(num_bytes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def trace_context() -> Optional[Dict[str, str]]:
+    """Returns the current span's ids, to pass to another thread or process
+    (e.g., in Motion props under "trace")."""
+    span = _current_span.get()
+    return span.context() if span is not None else None
+
+
+def start_span(name: str, parent: Optional[Dict[str, str]] = None, **attributes):
+    """Starts a span under `parent` (a trace_context() dict), or under the
+    current span, or as the root of a new trace."""
+    if parent is None:
+        parent = trace_context()
+    return Span(
+        trace_id=parent["trace_id"] if parent else new_id(16),
+        span_id=new_id(),
+        parent_id=parent["span_id"] if parent else None,
+        name=name,
+        start=time.time(),
+        thread=threading.current_thread().name,
+        attributes=attributes,
+    )
+
+
+def end_span(span: Span, status: str = "ok") -> None:
+    span.end = time.time()
+    span.status = status
+    if TRACING:
+        exporter.export(span)
+
+
+@contextmanager
+def use_span(current: Span):
+    """Makes a started span the current span for the block."""
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, parent: Optional[Dict[str, str]] = None, **attributes):
+    """Runs the block in a new span, which becomes the current span."""
+    current = start_span(name, parent, **attributes)
+    status = "error"
+    try:
+        with use_span(current):
+            yield current
+        status = "ok"
+    finally:
+        end_span(current, status)
+
+
+def iterate_in_span(current: Span, iterator):
+    """Yields from iterator, with `current` as the current span only while
+    the iterator is producing the next item."""
+    while True:
+        with use_span(current):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def record_span(
+    name: str,
+    parent: Optional[Dict[str, str]],
+    start: float,
+    end: float,
+    status: str = "ok",
+    **attributes,
+) -> None:
+    """Exports an already-finished span, e.g. one measured across callbacks
+    or on behalf of a queued item."""
+    if not TRACING or parent is None:
+        return
+    exporter.export(
+        Span(
+            trace_id=parent["trace_id"],
+            span_id=new_id(),
+            parent_id=parent["span_id"],
+            name=name,
+            start=start,
+            end=end,
+            status=status,
+            thread=threading.current_thread().name,
+            attributes=attributes,
+        )
+    )
+
+
+def propagate(func):
+    """Binds func to a copy of the current context, so it keeps the current
+    span when it runs on another thread (e.g., submitted to an executor)."""
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def read_spans(path: str = TRACE_FILE, max_bytes: int = 5 * 1024 * 1024):
+    """Reads the most recent spans from a trace file (the last `max_bytes`)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - max_bytes, 0))
+        data = f.read().decode("utf-8", errors="ignore")
+    lines = data.splitlines()
+    if size > max_bytes:
+        lines = lines[1:]  # Probably cut mid-line
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue
+    return spans
@@ -1,9 +1,24 @@
-from pydantic import BaseModel, Field
+from pydantic import Field
 from typing import Optional, List
 
+from instructor import OpenAISchema
+from instructor.utils import classproperty
+
+_schemas = {}
+
+
+class Prompt(OpenAISchema):
+    # instructor wraps a plain model in a new class and regenerates its tool
+    # schema on every call; the prompts don't change, so build it once
+    @classproperty
+    def openai_schema(cls):
+        if cls not in _schemas:
+            _schemas[cls] = OpenAISchema.__dict__["openai_schema"].cproperty(cls)
+        return _schemas[cls]
+
 
 # Define pydantic model
-class RecommendationPrompt(BaseModel):
+class RecommendationPrompt(Prompt):
     shoes: str = Field(
         ..., description="Detailed description of shoes to buy for the event."
     )
@@ -23,29 +38,50 @@ class RecommendationPrompt(BaseModel):
     )
 
 
-class ItemListPrompt(BaseModel):
+class ItemListPrompt(Prompt):
     recommendations: List[str] = Field(
         ...,
         description="List of items extracted from the dictionary of recommendations.",
     )
 
 
-class SummaryPrompt(BaseModel):
+class SummaryPrompt(Prompt):
     summary: str = Field(
         ...,
         description="Summary of the my preferences, lifestyle, and events I attend.",
     )
 
 
-class EventSuggestionPrompt(BaseModel):
+class EventSuggestionPrompt(Prompt):
     event: str = Field(
         ...,
         description="An event I might like to attend based on my preferences and lifestyle.",
     )
 
 
-class NotePrompt(BaseModel):
+class NotePrompt(Prompt):
     note: str = Field(
         ...,
         description="Short note for why I should buy this item.",
     )
+
+
+class NotesPrompt(Prompt):
+    shoes: str = Field(
+        ..., description="Short note for why I should buy the recommended shoes."
+    )
+    upper_body_garments: str = Field(
+        ...,
+        description="Short note for why I should buy the recommended shirt or top.",
+    )
+    lower_body_garments: str = Field(
+        ...,
+        description="Short note for why I should buy the recommended pants or lower-body garment.",
+    )
+    outerwear: str = Field(
+        ...,
+        description="Short note for why I should buy the recommended jacket or coat or sweater.",
+    )
+    bags: str = Field(
+        ..., description="Short note for why I should buy the recommended bag."
+    )
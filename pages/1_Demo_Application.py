@@ -2,7 +2,9 @@ import sys
 
 from collections import defaultdict
 import streamlit as st
-from fashion.recommender import Fashion
+from fashion import tracing
+from fashion.pool import fashion_instances
+from fashion.shopping import shopping_search
 
 import asyncio
 import aiohttp
@@ -18,89 +20,168 @@ load_dotenv()
 import requests
 import json
 
-# SERPER_URL = "https://google.serper.dev/images"
-SERPER_URL = "https://google.serper.dev/shopping"
 NUM_RESULTS = 4
+# Generate all item notes in one LLM call instead of one call per item
+BATCH_NOTES = os.getenv("BATCH_NOTES", "1") == "1"
+# Stream recommended items, starting each item's product search (and, without
+# BATCH_NOTES, its note) as soon as the item is complete
+STREAM_RECOMMENDATIONS = os.getenv("STREAM_RECOMMENDATIONS", "1") == "1"
 
 st.set_page_config(layout="wide")
 
 
-@st.cache_resource
-def load_instance(user_id, gender, occupation, age):
-    f = Fashion(
-        user_id,
-        init_state_params={"gender": gender, "occupation": occupation, "age": age},
+def lease_instance(user_id, gender, occupation, age):
+    # One pooled instance per user id, evicted (and shut down) once idle; the
+    # profile only seeds a new user's state
+    return fashion_instances.lease(
+        user_id, {"gender": gender, "occupation": occupation, "age": age}
     )
-    return f
 
 
 def get_random_event(user_id, gender, occupation, age):
-    f = load_instance(user_id, gender, occupation, age)
-    return f.run("random_event", ignore_cache=True)
+    with lease_instance(user_id, gender, occupation, age) as f:
+        return f.run("random_event", ignore_cache=True)
 
 
 def send_feedback(
-    query, user_id, gender, occupation, age, all_rec_text, action, feedback
+    query, user_id, gender, occupation, age, all_rec_text, action, feedback, trace=None
 ):
-    f = load_instance(user_id, gender, occupation, age)
+    with lease_instance(user_id, gender, occupation, age) as f:
+        # Send feedback
+        f.run(
+            "user_feedback",
+            props={
+                "outfit": all_rec_text,
+                "action": action,
+                "feedback": feedback,
+                "event": query,
+                "trace": trace,
+            },
+        )
 
-    # Send feedback
-    f.run(
-        "user_feedback",
-        props={
-            "outfit": all_rec_text,
-            "action": action,
-            "feedback": feedback,
-            "event": query,
-        },
-    )
 
+def search_products(value, gender, trace=None):
+    # Cached and coalesced across reruns and users (see fashion/shopping.py);
+    # returns a future, so the search runs while the item's note is generated
+    return shopping_search.submit(f"{value} for {gender}", trace)
+
+
+# Every op below gets the query's trace context in its props, so the serve
+# ops, the update ops they trigger and their LLM calls all land in one trace
+# (see the Traces page). Yields (item, note, future of the product search);
+# each item's product search starts as soon as the item is known.
+def fetch_results(query, user_id, gender, occupation, age, use_motion, trace=None):
+    # The instance isn't evicted while its results are coming in
+    with lease_instance(user_id, gender, occupation, age) as f:
+        yield from stream_results(f, query, gender, use_motion, trace)
+
+
+def stream_results(f, query, gender, use_motion, trace=None):
+    props = {"event": query, "use_summaries": use_motion, "trace": trace}
+
+    if STREAM_RECOMMENDATIONS and not BATCH_NOTES:
+        with ThreadPoolExecutor() as executor:
+            futures = []
+            for _, value in f.gen("recommend_stream", props=props, ignore_cache=True):
+                products = search_products(value, gender, trace)
+                futures.append(
+                    executor.submit(
+                        process_recommendation,
+                        f,
+                        value,
+                        query,
+                        use_motion,
+                        products,
+                        trace,
+                    )
+                )
 
-def fetch_results(query, user_id, gender, occupation, age, use_motion):
-    f = load_instance(user_id, gender, occupation, age)
+                # Show notes that finished while later items were streaming
+                for future in [future for future in futures if future.done()]:
+                    futures.remove(future)
+                    yield future.result()
+
+            for future in as_completed(futures):
+                yield future.result()
+        return
+
+    if STREAM_RECOMMENDATIONS:
+        # The batched notes need every item, but product searches start as
+        # the items stream in
+        recommendations = {}
+        products = {}
+        for field, value in f.gen("recommend_stream", props=props, ignore_cache=True):
+            recommendations[field] = value
+            products[field] = search_products(value, gender, trace)
+    else:
+        recs = f.run(
+            "recommend",
+            props=props,
+            ignore_cache=True,
+            # force_refresh=True,
+        )
 
-    recs = f.run(
-        "recommend",
-        props={"event": query, "use_summaries": use_motion},
-        ignore_cache=True,
-        # force_refresh=True,
-    )
+        recommendations = recs.model_dump()
+        products = {
+            field: search_products(value, gender, trace)
+            for field, value in recommendations.items()
+        }
+
+    if BATCH_NOTES:
+        notes = f.run(
+            "notes",
+            props={
+                "recommendations": recommendations,
+                "event": query,
+                "use_summaries": use_motion,
+                "trace": trace,
+            },
+            ignore_cache=True,
+        )
+        for field, value in recommendations.items():
+            yield value, notes[field], products[field]
+        return
 
     with ThreadPoolExecutor() as executor:
         futures = []
-        for _, value in recs.model_dump().items():
-            futures.append(executor.submit(process_recommendation, f, value, query))
+        for field, value in recommendations.items():
+            futures.append(
+                executor.submit(
+                    process_recommendation,
+                    f,
+                    value,
+                    query,
+                    use_motion,
+                    products[field],
+                    trace,
+                )
+            )
 
         for future in as_completed(futures):
             yield future.result()
 
 
-def process_recommendation(f, value, query):
+def process_recommendation(f, value, query, use_motion, products, trace=None):
     note = f.run(
         "note",
-        props={"recommendation": value, "event": query, "use_summaries": use_motion},
+        props={
+            "recommendation": value,
+            "event": query,
+            "use_summaries": use_motion,
+            "trace": trace,
+        },
         ignore_cache=True,
         # force_refresh=True,
     )
-    return value, note
-
-
-async def fetch_all_images(recommendations, gender):
-    async with aiohttp.ClientSession() as session:
-        tasks = [fetch_images(session, value, gender) for value in recommendations]
-        return await asyncio.gather(*tasks)
+    return value, note, products
 
 
-async def fetch_images(session, value, gender):
-    payload = json.dumps({"q": f"{value} for {gender}"})
+def render_products(column, products):
+    for img_results in products["shopping"][:NUM_RESULTS]:
+        item_and_title = column.columns([0.4, 0.5])
 
-    headers = {
-        "X-API-KEY": os.getenv("SERPER_API_KEY"),
-        "Content-Type": "application/json",
-    }
-
-    async with session.post(SERPER_URL, headers=headers, data=payload) as response:
-        return await response.json()
+        item_and_title[0].image(img_results["imageUrl"])  # , use_column_width="always"
+        item_and_title[1].write(f"[{img_results['source']}]({img_results['link']})")
 
 
 # Display user info form if not already submitted
@@ -121,7 +202,8 @@ if st.session_state.get("user_info") is None:
                 "occupation": occupation,
                 "age": age,
             }
-            load_instance(user_id, gender, occupation, age)
+            with lease_instance(user_id, gender, occupation, age):
+                pass
             st.rerun()  # Reload the page to proceed with the main app
 
 else:
@@ -189,10 +271,20 @@ else:
 
             all_rec_text = []
             start_time = time.time()
+            query_span = tracing.start_span("demo.query", event=query, user_id=user_id)
+
+            # (product search, column) pairs still to render
+            pending_products = []
 
             # Fetch images for the selected page
-            for rec_text, note in fetch_results(
-                query, user_id, gender, occupation, age, use_motion
+            for rec_text, note, products in fetch_results(
+                query,
+                user_id,
+                gender,
+                occupation,
+                age,
+                use_motion,
+                query_span.context(),
             ):
                 if i == 0:
                     generation_time = time.time() - start_time
@@ -214,28 +306,27 @@ else:
                             ),
                         )
 
-                # Fetch images
                 columns_of_products[i].write(f"**{rec_text}**")
                 columns_of_products[i].write(f"_{note}_")
+                pending_products.append((products, columns_of_products[i]))
+
+                # Show the product searches that already finished
+                for future, column in list(pending_products):
+                    if future.done():
+                        pending_products.remove((future, column))
+                        render_products(column, future.result())
 
                 all_rec_text.append(rec_text)
                 i += 1
 
-        # Render images
-        i = 0
-        all_images = asyncio.run(fetch_all_images(all_rec_text, gender))
-        for image_results in all_images:
-            for j in range(NUM_RESULTS):
-                img_results = image_results["shopping"][j]
-                item_and_title = columns_of_products[i].columns([0.4, 0.5])
-
-                item_and_title[0].image(
-                    img_results["imageUrl"]  # , use_column_width="always"
-                )
-                item_and_title[1].write(
-                    f"[{img_results['source']}]({img_results['link']})"
-                )
-            i += 1
+        # Render the remaining images as their searches finish
+        columns = defaultdict(list)
+        for future, column in pending_products:
+            columns[future].append(column)
+        for future in as_completed(columns):
+            for column in columns[future]:
+                render_products(column, future.result())
+        tracing.end_span(query_span)
 
         # If user clicks on love button, trigger a new flow
         if love_button:
@@ -248,6 +339,7 @@ else:
                 all_rec_text,
                 action="love",
                 feedback="",
+                trace=query_span.context(),
             )
 
         if st.session_state["dislike_feedback"]:
@@ -260,5 +352,6 @@ else:
                 all_rec_text,
                 action="dislike",
                 feedback=st.session_state["dislike_feedback"],
+                trace=query_span.context(),
             )
             st.session_state["dislike_feedback"] = ""
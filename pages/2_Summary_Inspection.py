@@ -1,22 +1,12 @@
-from collections import defaultdict
 import streamlit as st
 
-import asyncio
-import aiohttp
 from dotenv import load_dotenv
-import os
 import time
-import motion
-import difflib
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from fashion.dashboard import DASHBOARD_POLL_SECONDS, shared_poller
 
 load_dotenv()
 
-import requests
-import json
-
-
 st.set_page_config(layout="wide")
 
 st.subheader("Inspect Incrementally-Maintained Summaries Used in Prompts")
@@ -24,131 +14,54 @@ st.write(
     "Each sub-part of the prompt gets updated separately. Some are the results of LLM calls (e.g., `previous_recommendations` is an extracted list of short items from the notes on the left, and `search_query_summary` is an LLM-generated summary of previous search queries)."
 )
 
-# Initialize session state for last update time
-if "global_last_update" not in st.session_state:
-    st.session_state.global_last_update = time.time()
-if "last_update" not in st.session_state:
-    st.session_state.last_update = defaultdict(time.time)
-if "last_diff" not in st.session_state:
-    st.session_state.last_diff = defaultdict(time.time)
-if "old_state" not in st.session_state:
-    st.session_state.old_state = defaultdict(None)
-if "query_summary_diff" not in st.session_state:
-    st.session_state.query_summary_diff = defaultdict(str)
-if "selected_index" not in st.session_state:
-    st.session_state.selected_index = 0
-if "first_time" not in st.session_state:
-    st.session_state.first_time = True
-
-# Display the summary trends
-global_state = motion.inspect_state("GlobalSummaries__production")
-st.write("**Latest News Summary** (In Every User's Prompt)")
-st.success(global_state["news_summary"])
-
-# Show a dropdown list of all the states in st.session_state.old_state
-sorted_keys = sorted(
-    st.session_state.old_state.keys(),
-    key=lambda x: st.session_state.last_diff[x],
-    reverse=True,
-)
-options = [
-    f"{key} (updated {(time.time() - st.session_state.last_diff[key]):.2f} seconds ago)"
-    for key in sorted_keys
-]
-instance_prettified = st.selectbox(
-    "Select a user_id to inspect user-specific sub-parts",
-    options,
-    index=st.session_state.selected_index,
-    key="instance_prettified",
-    on_change=lambda: setattr(
-        st.session_state,
-        "selected_index",
-        options.index(st.session_state["instance_prettified"]),
-    ),
-)
-if instance_prettified:
-    # Parse the selected instance
-    selected_instance = options[st.session_state.selected_index]
-    instance_to_show = selected_instance.split("(")[0].strip()
+# All sessions share one background poller; this page only reads its latest
+# snapshot, and user states are loaded once per version for every viewer
+poller = shared_poller()
+
+
+@st.fragment(run_every=DASHBOARD_POLL_SECONDS)
+def summaries():
+    snapshot = poller.snapshot()
+
+    # Display the summary trends
+    st.write("**Latest News Summary** (In Every User's Prompt)")
+    st.success(snapshot.news_summary)
+
+    # Most recently updated users first, re-sorted only when a user's
+    # version moved since this session's last run
+    changed_at = snapshot.user_changed_at
+    if st.session_state.get("users_seq") != snapshot.users_seq:
+        st.session_state.users_seq = snapshot.users_seq
+        st.session_state.user_options = sorted(
+            changed_at, key=changed_at.get, reverse=True
+        )
+    options = st.session_state.user_options
+    instance_to_show = st.selectbox(
+        "Select a user_id to inspect user-specific sub-parts",
+        options,
+        key="selected_instance",
+        format_func=lambda key: f"{key} (updated {(time.time() - changed_at.get(key, time.time())):.2f} seconds ago)",
+    )
+    if not instance_to_show:
+        return
+
+    inspected = poller.inspect(instance_to_show)
 
     st.caption(
-        f"User_id {instance_to_show} last updated {time.time() - st.session_state.last_diff[instance_to_show]} seconds ago"
+        f"User_id {instance_to_show} last updated {time.time() - changed_at.get(instance_to_show, time.time())} seconds ago"
     )
 
     # Display the user's style summary in a styled box
-    if st.session_state.old_state[instance_to_show] is not None:
+    if inspected.state is not None:
         st.markdown(f"**{instance_to_show}'s Style Summary:**")
-        st.warning(st.session_state.old_state[instance_to_show]["query_summary"])
+        st.warning(inspected.state["query_summary"])
 
-    if st.session_state.query_summary_diff[instance_to_show]:
+    if inspected.query_summary_diff:
         st.markdown(f"**Diff:**")
-        st.error(st.session_state.query_summary_diff[instance_to_show])
+        st.error(inspected.query_summary_diff)
 
     with st.expander("Show all prompt sub-parts"):
-        st.write(st.session_state.old_state[instance_to_show])
-
-# Main loop to refresh content
-while True:
-    # List all instances of the Fashion component
-    instances = motion.get_instances("Fashion")
-
-    # Check if 2 seconds have passed
-    if (
-        st.session_state.first_time
-        or time.time() - st.session_state.global_last_update > 2
-    ):
-        is_changed = False
-        st.session_state.first_time = False
-
-        for instance in instances:
-
-            state = motion.inspect_state(f"Fashion__{instance}")
-
-            # Load instance and fetch state
-            gender = state["gender"]
-            occupation = state["occupation"]
-            age = state["age"]
-
-            if instance not in st.session_state.old_state:
-                st.session_state.old_state[instance] = None
-                st.session_state.last_diff[instance] = time.time()
-                st.session_state.last_update[instance] = time.time()
-
-            if (
-                st.session_state.old_state[instance] is not None
-                and st.session_state.old_state[instance] != state
-            ):
-                st.session_state.last_diff[instance] = time.time()
-
-            if (
-                st.session_state.old_state[instance] is None
-                or st.session_state.old_state[instance] != state
-            ):
-                if st.session_state.old_state[instance] is not None:
-                    # Compute diff for query_summary
-                    diff = difflib.ndiff(
-                        st.session_state.old_state[instance][
-                            "query_summary"
-                        ].splitlines(),
-                        state["query_summary"].splitlines(),
-                    )
-                    st.session_state.query_summary_diff[instance] = "\n".join(diff)
-                else:
-                    st.session_state.query_summary_diff[instance] = (
-                        "No previous summary stored."
-                    )
-
-                st.session_state.old_state[instance] = state
-                is_changed = True
-
-            # Update last refresh time
-            st.session_state.last_update[instance] = time.time()
-
-        # Write global last update time
-        st.session_state.global_last_update = time.time()
-
-        # If something was refreshed, rerun the page
-        if is_changed:
-            st.rerun()
-
-    time.sleep(1)  # Short sleep to prevent maxing out the CPU
+        st.write(inspected.state)
+
+
+summaries()
@@ -1,156 +1,90 @@
-import sys
-
-from collections import defaultdict
 import streamlit as st
-from fashion.globalsummaries import GlobalSummaries
+from fashion.activityfeed import parse_id
+from fashion.dashboard import ACTIVITY_WINDOW, DASHBOARD_POLL_SECONDS, shared_poller
 
-import asyncio
-import aiohttp
 from dotenv import load_dotenv
-import os
 import time
-import motion
-import difflib
-
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 load_dotenv()
 
-import requests
-import json
-
-url = "https://google.serper.dev/news"
-scrape_url = "https://scrape.serper.dev"
-
-
-def fetch_news(url):
-    payload = json.dumps({"url": url})
-    headers = {
-        "X-API-KEY": os.getenv("SERPER_API_KEY"),
-        "Content-Type": "application/json",
-    }
-    response = requests.post(scrape_url, headers=headers, data=payload)
-    return response.json()["text"], response.json()["metadata"].get("og:image", "")
-
-
 st.set_page_config(layout="wide")
 
 st.subheader("Recent Activity")
 st.write(
-    "This page shows a stream of all users' activity. It also subscribes to Google News for the latest fashion news and updates a summary of recent news every 10 minutes."
+    "This page shows a stream of all users' activity. It also shows the latest fashion news from Google News, which the news worker (`python -m fashion.news_worker`) ingests and summarizes every 10 minutes."
 )
 
-# Initialize session state for last update time
-if "global_last_update" not in st.session_state:
-    st.session_state.global_last_update = time.time()
-if "last_news_update" not in st.session_state:
-    st.session_state.last_news_update = time.time()
-if "first_time" not in st.session_state:
-    st.session_state.first_time = True
-
-news_placeholder = st.empty()
-placeholder = st.empty()
-
-# Poll for global summary
-while True:
-    if (
-        st.session_state.first_time
-        or time.time() - st.session_state.global_last_update > 5
-    ):
-        st.session_state.global_last_update = time.time()
-
-        with GlobalSummaries("production", disable_update_task=True) as gs:
-            all_user_activity = gs.read_state("user_activity")
-            news_summary = gs.read_state("news_summary")
-
-        placeholder.empty()
-        with placeholder.container():
-            # Show a summary
-            st.write("**Recent News Summary**")
-            st.success(news_summary)
-
-            st.write("#### Latest User Activity")
-            # Display the user activity list of (timestamp, user_activity) pairs
-            # Sort by timestamp descending
-            sorted_user_activity = sorted(
-                all_user_activity, key=lambda x: x[0], reverse=True
-            )
-            for timestamp, user_activity in sorted_user_activity:
-                # Format the timestamp
-                timestamp = time.strftime(
-                    "%Y-%m-%d %H:%M:%S", time.localtime(timestamp)
+# All sessions share one background poller; these fragments only read its
+# latest snapshot
+poller = shared_poller()
+
+
+@st.fragment(run_every=DASHBOARD_POLL_SECONDS)
+def activity():
+    snapshot = poller.snapshot()
+
+    # Show a summary
+    st.write("**Recent News Summary**")
+    st.success(snapshot.news_summary)
+    if snapshot.headlines_time is not None:
+        st.caption(
+            f"News last ingested {time.time() - snapshot.headlines_time:.0f} seconds ago"
+        )
+    else:
+        st.caption("The news worker hasn't run yet.")
+
+    st.write("#### Latest User Activity")
+    # Only the events after this session's cursor are formatted; rows from
+    # earlier runs are kept in the session state, newest first. Nothing to
+    # format unless the poller saw new events since this session's last run
+    cursor = st.session_state.get("activity_cursor")
+    new_activity = []
+    if st.session_state.get("activity_seq") != snapshot.activity_seq:
+        st.session_state.activity_seq = snapshot.activity_seq
+        new_activity = [
+            entry
+            for entry in snapshot.activity
+            if cursor is None or parse_id(entry[0]) > parse_id(cursor)
+        ]
+    if new_activity:
+        rows = [
+            f"**{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}**: {user_activity}"
+            for _, timestamp, user_activity in reversed(new_activity)
+        ]
+        st.session_state.activity_rows = (
+            rows + st.session_state.get("activity_rows", [])
+        )[:ACTIVITY_WINDOW]
+        st.session_state.activity_cursor = new_activity[-1][0]
+
+    # One element for the whole feed rather than one per event
+    if st.session_state.get("activity_rows"):
+        st.success("\n\n".join(st.session_state.activity_rows))
+    else:
+        st.caption("No user activity yet.")
+
+
+@st.fragment(run_every=DASHBOARD_POLL_SECONDS)
+def news():
+    snapshot = poller.snapshot()
+    with st.expander("#### Recent News ('fashion')"):
+        st.write(
+            "Images and articles are summarized and included in application prompts."
+        )
+        # Show the images that are not empty in a grid format
+        cols = st.columns(3)  # Define a grid of 3 columns
+        col_index = 0
+        for headline in snapshot.headlines:
+            if headline["imageUrl"]:
+                cols[col_index].image(
+                    headline["imageUrl"], width=150
+                )  # Display smaller images
+                cols[col_index].write(
+                    f"({headline['date']}) [{headline['title']}]({headline['link']})"
                 )
-                st.success(f"**{timestamp}**: {user_activity}")
-
-    if (
-        st.session_state.first_time
-        or time.time() - st.session_state.last_news_update > 600
-    ):
-        # Submit to global summaries
-        with GlobalSummaries("production") as gs:
-
-            st.session_state.last_news_update = time.time()
-
-            # Use serper.dev to get the latest news
-
-            payload = json.dumps(
-                {
-                    "q": "fashion",
-                    "num": 20,
-                    "tbs": "qdr:h",
-                }
-            )
-            headers = {
-                "X-API-KEY": os.getenv("SERPER_API_KEY"),
-                "Content-Type": "application/json",
-            }
-            response = requests.request("POST", url, headers=headers, data=payload)
-            data = response.json()
-
-            urls = [item["link"] for item in data["news"]]
-            titles = [item["title"] for item in data["news"]]
-            dates = [item["date"] for item in data["news"]]
-
-            # Now asynchronously fetch the news content
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [executor.submit(fetch_news, url) for url in urls]
-                news = []
-                for future in as_completed(futures):
-                    try:
-                        result = future.result()
-                        news.append(result)
-                    except Exception:
-                        pass
-
-            gs.run(
-                "news",
-                props={
-                    "urls_and_news_texts": list(zip(urls, news)),
-                    "timestamp": time.time(),
-                },
-                ignore_cache=True,
-            )
+                col_index = (
+                    col_index + 1
+                ) % 3  # Move to the next column, wrap around after 3
 
-            news_placeholder.empty()
-            with news_placeholder.container():
-                with st.expander("#### Recent News ('fashion')"):
-                    st.write(
-                        "Images and articles are summarized and included in application prompts."
-                    )
-                    # Show the images that are not empty in a grid format
-                    cols = st.columns(3)  # Define a grid of 3 columns
-                    col_index = 0
-                    for title, url, date, (text, img_url) in zip(
-                        titles, urls, dates, news
-                    ):
-                        if img_url:
-                            cols[col_index].image(
-                                img_url, width=150
-                            )  # Display smaller images
-                            cols[col_index].write(f"({date}) [{title}]({url})")
-                            col_index = (
-                                col_index + 1
-                            ) % 3  # Move to the next column, wrap around after 3
 
-    st.session_state.first_time = False
-    time.sleep(3)
+news()
+activity()
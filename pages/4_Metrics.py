@@ -0,0 +1,177 @@
+from collections import defaultdict
+import streamlit as st
+
+from dotenv import load_dotenv
+import os
+import time
+
+import pandas as pd
+import requests
+
+from fashion.metrics import METRICS_PORT, histogram_quantile, parse_text
+
+load_dotenv()
+
+METRICS_URL = os.getenv("METRICS_URL", f"http://127.0.0.1:{METRICS_PORT}/metrics")
+REFRESH_SECONDS = 5
+HISTORY_POINTS = 120
+
+st.set_page_config(layout="wide")
+
+st.subheader("Op and LLM Metrics")
+st.write(
+    f"Latency, token usage and cost of the `Fashion` and `GlobalSummaries` ops, scraped from `{METRICS_URL}` every {REFRESH_SECONDS} seconds. Quantiles are estimated from histogram buckets."
+)
+
+if "metrics_history" not in st.session_state:
+    st.session_state.metrics_history = []
+
+
+def op_table(samples):
+    # One row per op, from the motion_op_latency_seconds histogram
+    ops = defaultdict(lambda: {"buckets": [], "count": 0, "sum": 0.0, "errors": 0})
+    for name, labels, value in samples:
+        if not name.startswith("motion_op_latency_seconds"):
+            continue
+        key = (labels["component"], labels["kind"], labels["op"])
+        if name.endswith("_count"):
+            ops[key]["count"] += value
+            if labels["status"] == "error":
+                ops[key]["errors"] += value
+        elif name.endswith("_sum"):
+            ops[key]["sum"] += value
+        elif name.endswith("_bucket"):
+            ops[key]["buckets"].append((float(labels["le"]), value))
+
+    rows = []
+    for (component, kind, op), stats in ops.items():
+        # Merge the ok and error series
+        merged = defaultdict(float)
+        for bound, count in stats["buckets"]:
+            merged[bound] += count
+        buckets = list(merged.items())
+        rows.append(
+            {
+                "op": f"{component}.{op} ({kind})",
+                "calls": int(stats["count"]),
+                "errors": int(stats["errors"]),
+                "mean (s)": stats["sum"] / stats["count"] if stats["count"] else 0.0,
+                "p50 (s)": histogram_quantile(0.5, buckets),
+                "p95 (s)": histogram_quantile(0.95, buckets),
+                "total time (s)": stats["sum"],
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def gauge_table(samples, name, label):
+    return {labels[label]: value for metric, labels, value in samples if metric == name}
+
+
+@st.cache_data(ttl=REFRESH_SECONDS, show_spinner=False)
+def scrape():
+    # Shared by all sessions: one scrape per refresh, however many tabs are open
+    scraped_at = pd.Timestamp.now()
+    try:
+        return scraped_at, parse_text(requests.get(METRICS_URL, timeout=5).text), None
+    except Exception as e:
+        return scraped_at, [], str(e)
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def dashboard():
+    scraped_at, samples, error = scrape()
+
+    tokens = defaultdict(float)
+    cost = 0.0
+    retries = 0.0
+    llm_count = 0.0
+    llm_sum = 0.0
+    queue_depths = {}
+    for name, labels, value in samples:
+        if name == "llm_tokens_total":
+            tokens[labels["type"]] += value
+        elif name == "llm_cost_dollars_total":
+            cost += value
+        elif name == "llm_retries_total":
+            retries += value
+        elif name == "llm_request_latency_seconds_count":
+            llm_count += value
+        elif name == "llm_request_latency_seconds_sum":
+            llm_sum += value
+        elif name == "motion_update_queue_depth":
+            queue_depths[f"{labels['component']}.{labels['op']} ({labels['flow']})"] = (
+                value
+            )
+
+    history = st.session_state.metrics_history
+    # A scrape can be served to this session more than once
+    if samples and (not history or history[-1]["time"] < scraped_at):
+        st.session_state.metrics_history.append(
+            {
+                "time": scraped_at,
+                "prompt tokens": tokens["prompt"],
+                "completion tokens": tokens["completion"],
+                "cost ($)": cost,
+            }
+        )
+        st.session_state.metrics_history = st.session_state.metrics_history[
+            -HISTORY_POINTS:
+        ]
+
+    if error is not None:
+        st.error(f"Could not scrape {METRICS_URL}: {error}")
+
+    columns = st.columns(5)
+    columns[0].metric("LLM calls", int(llm_count))
+    columns[1].metric(
+        "Mean LLM latency (s)", f"{llm_sum / llm_count:.2f}" if llm_count else "-"
+    )
+    columns[2].metric("Prompt tokens", int(tokens["prompt"]))
+    columns[3].metric("Completion tokens", int(tokens["completion"]))
+    columns[4].metric("Estimated cost", f"${cost:.4f}", f"{int(retries)} retries")
+
+    ops = op_table(samples)
+    if not ops.empty:
+        ops = ops.sort_values("total time (s)", ascending=False)
+        st.write("#### Ops by total time")
+        st.bar_chart(ops.set_index("op")["total time (s)"])
+        st.dataframe(ops, hide_index=True, use_container_width=True)
+
+    if len(st.session_state.metrics_history) > 1:
+        history = pd.DataFrame(st.session_state.metrics_history).set_index("time")
+        # Tokens per second between scrapes
+        rates = history[["prompt tokens", "completion tokens"]].diff()
+        rates = rates.div(history.index.to_series().diff().dt.total_seconds(), axis=0)
+        st.write("#### Token usage (tokens/s)")
+        st.line_chart(rates.dropna())
+
+    caches, queues = st.columns(2)
+    with caches:
+        st.write("#### Caches")
+        for name in [
+            "recommend_cache_stats",
+            "global_summaries_cache_stats",
+            "news_digest_cache_stats",
+            "http_connection_stats",
+        ]:
+            stats = gauge_table(samples, name, "stat")
+            if stats:
+                st.caption(name)
+                st.json(stats, expanded=False)
+    with queues:
+        st.write("#### Update queues")
+        if queue_depths:
+            st.bar_chart(pd.Series(queue_depths, name="pending"))
+        for name in [
+            "activity_logger_stats",
+            "dashboard_poller_stats",
+            "instance_pool_stats",
+        ]:
+            stats = gauge_table(samples, name, "stat")
+            if stats:
+                st.caption(name)
+                st.json(stats, expanded=False)
+
+
+dashboard()
@@ -0,0 +1,121 @@
+from collections import defaultdict
+import streamlit as st
+
+from dotenv import load_dotenv
+import time
+
+import altair as alt
+import pandas as pd
+
+from fashion.tracing import TRACE_FILE, TRACING, read_spans
+
+load_dotenv()
+
+MAX_TRACES = 50
+
+st.set_page_config(layout="wide")
+
+st.subheader("Request Traces")
+st.write(
+    f"Waterfall of recent traces from `{TRACE_FILE}`: each user query's serve ops, the update ops and GlobalSummaries work it triggered, and the LLM and search calls underneath them. Update ops run in the background, so they can end after the query itself."
+)
+
+
+def build_traces(spans):
+    traces = defaultdict(list)
+    for span in spans:
+        if span.get("end") is not None:
+            traces[span["trace_id"]].append(span)
+    return traces
+
+
+def root_of(spans):
+    ids = {span["span_id"] for span in spans}
+    roots = [span for span in spans if span["parent_id"] not in ids]
+    return min(roots or spans, key=lambda span: span["start"])
+
+
+def waterfall(spans):
+    # Depth-first order, so children sit right below their parent
+    children = defaultdict(list)
+    ids = {span["span_id"] for span in spans}
+    for span in spans:
+        parent = span["parent_id"] if span["parent_id"] in ids else None
+        children[parent].append(span)
+
+    origin = min(span["start"] for span in spans)
+    rows = []
+
+    def visit(parent, depth):
+        for span in sorted(children[parent], key=lambda span: span["start"]):
+            rows.append(
+                {
+                    "name": span["name"],
+                    # Indented by depth and numbered, so repeated names (e.g.
+                    # one LLM call per note) get their own row
+                    "span": f"{len(rows) + 1:>2}. {'· ' * depth}{span['name']}",
+                    "start (ms)": (span["start"] - origin) * 1000,
+                    "end (ms)": (span["end"] - origin) * 1000,
+                    "duration (ms)": (span["end"] - span["start"]) * 1000,
+                    "status": span["status"],
+                    "thread": span["thread"],
+                    "attributes": str(span.get("attributes") or {}),
+                }
+            )
+            visit(span["span_id"], depth + 1)
+
+    visit(None, 0)
+    return pd.DataFrame(rows)
+
+
+spans = read_spans()
+traces = build_traces(spans)
+if not traces:
+    if TRACING:
+        st.info("No traces yet. Run a query on the Demo Application page.")
+    else:
+        st.info("No traces yet. Tracing is off; set TRACING=1 and restart the app.")
+    st.stop()
+
+# Newest first
+recent = sorted(
+    traces.items(), key=lambda item: root_of(item[1])["start"], reverse=True
+)[:MAX_TRACES]
+
+
+def describe(trace_id):
+    root = root_of(traces[trace_id])
+    started = time.strftime("%H:%M:%S", time.localtime(root["start"]))
+    duration = root["end"] - root["start"]
+    return f"{started} {root['name']} ({duration:.2f}s, {len(traces[trace_id])} spans)"
+
+
+trace_id = st.selectbox(
+    "Trace", [trace_id for trace_id, _ in recent], format_func=describe
+)
+rows = waterfall(traces[trace_id])
+
+st.altair_chart(
+    alt.Chart(rows)
+    .mark_bar()
+    .encode(
+        x=alt.X("start (ms):Q", title="ms since start of trace"),
+        x2="end (ms):Q",
+        y=alt.Y("span:N", sort=None, title=None, axis=alt.Axis(labelLimit=400)),
+        color=alt.Color("status:N", scale=alt.Scale(domain=["ok", "error"])),
+        tooltip=["span", "duration (ms)", "status", "thread", "attributes"],
+    )
+    .properties(height=max(len(rows) * 22, 100)),
+    use_container_width=True,
+)
+
+st.write("#### Time by span name")
+totals = (
+    rows.groupby("name")["duration (ms)"]
+    .agg(["count", "sum", "max"])
+    .sort_values("sum", ascending=False)
+)
+st.dataframe(totals, use_container_width=True)
+
+st.write("#### Spans")
+st.dataframe(rows.drop(columns=["name"]), hide_index=True, use_container_width=True)
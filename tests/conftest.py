@@ -0,0 +1,8 @@
+import os
+
+# The fashion modules create their OpenAI clients at import time; the tests
+# never call them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# Keep the metrics server and span files out of the tests
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("TRACING", "0")
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from fashion import activity
+from fashion.activity import ActivityLogger
+
+
+class FakeGlobalSummaries:
+    """Records the flows run on it instead of running Motion ops."""
+
+    instances = []
+    # Set to hold every run until the event is set
+    block = None
+    running = None
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.runs = []
+        self.flushed = []
+        self.shut_down = False
+        FakeGlobalSummaries.instances.append(self)
+
+    def run(self, flow, props):
+        if self.block is not None:
+            self.running.set()
+            self.block.wait(5)
+        self.runs.append((flow, props))
+
+    def flush_update(self, flow):
+        self.flushed.append(flow)
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+class FakeFeed:
+    def __init__(self, instance_id):
+        self.events = []
+
+    def append(self, events):
+        self.events.extend(events)
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    FakeGlobalSummaries.instances = []
+    FakeGlobalSummaries.block = None
+    FakeGlobalSummaries.running = None
+    monkeypatch.setattr(activity, "GlobalSummaries", FakeGlobalSummaries)
+    monkeypatch.setattr(activity, "ActivityFeed", FakeFeed)
+    return FakeGlobalSummaries.instances
+
+
+def events_forwarded(gs):
+    return [
+        event
+        for flow, props in gs.runs
+        if flow == "user_activity"
+        for event in props["events"]
+    ]
+
+
+def test_drain_without_a_worker_returns_immediately(fakes):
+    logger = ActivityLogger("test")
+    assert logger.drain(timeout=1)
+    assert fakes == []
+
+
+def test_drain_forwards_logged_events_and_flushes_updates(fakes):
+    logger = ActivityLogger("test")
+    assert logger.log("searched for a wedding", timestamp=1.0)
+    assert logger.log("loved a linen suit", timestamp=2.0)
+    assert logger.drain(timeout=5)
+
+    gs = fakes[0]
+    assert events_forwarded(gs) == [
+        (1.0, "searched for a wedding"),
+        (2.0, "loved a linen suit"),
+    ]
+    assert gs.flushed == ["user_activity"]
+    assert logger.stats()["forwarded"] == 2
+    logger.close()
+
+
+def test_close_stops_the_worker_and_shuts_down_the_instance(fakes):
+    logger = ActivityLogger("test")
+    logger.log("event", timestamp=1.0)
+    logger.close(timeout=5)
+    assert not logger._worker.is_alive()
+    assert events_forwarded(fakes[0]) == [(1.0, "event")]
+    assert fakes[0].shut_down
+
+
+def test_full_queue_drops_events(fakes):
+    block = threading.Event()
+    FakeGlobalSummaries.block = block
+    FakeGlobalSummaries.running = threading.Event()
+    logger = ActivityLogger("test", max_queue_size=1)
+    logger.log("first")
+    # The worker takes "first" and waits inside gs.run, so one more event
+    # fills the queue
+    assert FakeGlobalSummaries.running.wait(5)
+    results = [logger.log(f"event {i}") for i in range(3)]
+    block.set()
+
+    assert results == [True, False, False]
+    assert logger.stats()["dropped"] == 2
+    assert logger.drain(timeout=5)
+    assert logger.stats()["forwarded"] == 2
+    logger.close()
+
+
+def test_flush_activity_runs_once_events_are_stale(fakes):
+    logger = ActivityLogger("test", flush_interval=0.05)
+    logger.log("event", timestamp=time.time())
+    deadline = time.time() + 5
+    while time.time() < deadline and not any(
+        flow == "flush_activity" for flow, _ in (fakes[0].runs if fakes else [])
+    ):
+        time.sleep(0.01)
+    assert any(flow == "flush_activity" for flow, _ in fakes[0].runs)
+    logger.close()
+
+
+def test_close_is_registered_at_exit_once(fakes, monkeypatch):
+    registered = []
+    monkeypatch.setattr(activity.atexit, "register", registered.append)
+    logger = ActivityLogger("test")
+    logger.log("first")
+    logger.close(timeout=5)
+    # Logging after close starts a new worker
+    logger.log("second")
+    logger.drain(timeout=5)
+    logger.close(timeout=5)
+    assert registered == [logger.close]
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from fashion.clients import BoundedAsyncTransport, BoundedTransport
+
+
+class Body(httpx.AsyncByteStream):
+    """A streamed body, like the network transport returns (an in-memory
+    body is read before the transport returns it)."""
+
+    async def __aiter__(self):
+        yield b'{"ok": true}'
+
+
+class SlowTransport(httpx.AsyncBaseTransport):
+    """Answers after `release` is set, recording how many requests it holds."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.release = asyncio.Event()
+
+    async def handle_async_request(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await self.release.wait()
+        finally:
+            self.active -= 1
+        return httpx.Response(200, stream=Body())
+
+
+def test_requests_past_the_limit_wait_outside_the_transport():
+    async def main():
+        inner = SlowTransport()
+        async with httpx.AsyncClient(
+            transport=BoundedAsyncTransport(inner, 2), base_url="http://llm"
+        ) as client:
+            requests = [asyncio.create_task(client.get("/")) for _ in range(5)]
+            await asyncio.sleep(0.05)
+            assert inner.active == 2
+
+            inner.release.set()
+            responses = await asyncio.gather(*requests)
+
+        assert [response.json() for response in responses] == [{"ok": True}] * 5
+        assert inner.peak == 2
+
+    asyncio.run(main())
+
+
+def test_a_slot_is_held_until_the_response_is_closed():
+    async def main():
+        inner = SlowTransport()
+        inner.release.set()
+        transport = BoundedAsyncTransport(inner, 1)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://llm"
+        ) as client:
+            async with client.stream("GET", "/") as response:
+                assert transport._semaphore.locked()
+                await response.aread()
+            assert not transport._semaphore.locked()
+
+            # A failed request gives its slot back
+            inner.handle_async_request = fail
+            for _ in range(2):
+                try:
+                    await client.get("/")
+                except httpx.ConnectError:
+                    pass
+            assert not transport._semaphore.locked()
+
+    async def fail(request):
+        raise httpx.ConnectError("refused")
+
+    asyncio.run(main())
+
+
+class SyncBody(httpx.SyncByteStream):
+    def __iter__(self):
+        yield b'{"ok": true}'
+
+
+class BlockingTransport(httpx.BaseTransport):
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+
+    def handle_request(self, request):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            self.release.wait(5)
+        finally:
+            with self.lock:
+                self.active -= 1
+        return httpx.Response(200, stream=SyncBody())
+
+
+def test_threads_past_the_limit_wait_outside_the_transport():
+    inner = BlockingTransport()
+    responses = []
+    with httpx.Client(
+        transport=BoundedTransport(inner, 2), base_url="http://llm"
+    ) as client:
+        threads = [
+            threading.Thread(target=lambda: responses.append(client.get("/").json()))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        assert inner.active == 2
+
+        inner.release.set()
+        for thread in threads:
+            thread.join()
+
+    assert responses == [{"ok": True}] * 5
+    assert inner.peak == 2
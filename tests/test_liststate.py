@@ -0,0 +1,135 @@
+import cloudpickle
+import fakeredis
+import pytest
+from motion.dicts import State
+from motion.utils import loadState, saveState
+
+from fashion import liststate
+from fashion.liststate import AppendedList, ListStore, StoredList
+from fashion.retention import RetentionPolicy
+
+INSTANCE = "Fashion__alice"
+
+
+@pytest.fixture
+def redis_con():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def store(redis_con):
+    return ListStore(["search_history"], redis_con)
+
+
+def new_state(**values):
+    return State("Fashion", "alice", {"query_summary": "", **values})
+
+
+def stored(redis_con, key):
+    return [cloudpickle.loads(value) for value in redis_con.lrange(key, 0, -1)]
+
+
+def save_and_load(state, redis_con, store, version=0):
+    version = saveState(state, version, redis_con, INSTANCE, store.save)
+    loaded, _ = loadState(redis_con, INSTANCE, store.load)
+    return loaded, version
+
+
+def test_append_to_a_stored_list_is_a_delta():
+    entries = StoredList(["a", "b"], "key")
+    appended = liststate.append(entries, ["c"])
+    assert isinstance(appended, AppendedList)
+    assert appended == ["a", "b", "c"]
+    assert (appended.appended, appended.trimmed, appended.redis_key) == (
+        ["c"],
+        0,
+        "key",
+    )
+
+    trimmed = liststate.append(entries, ["c"], RetentionPolicy(max_items=2))
+    assert trimmed == ["b", "c"]
+    assert trimmed.trimmed == 1
+
+
+def test_append_to_a_plain_list_is_a_full_value():
+    appended = liststate.append(["a"], ["b"])
+    assert appended == ["a", "b"]
+    assert not isinstance(appended, AppendedList)
+
+
+def test_lists_round_trip_outside_the_pickle(redis_con, store):
+    state = new_state(search_history=["beach wedding"])
+    loaded, _ = save_and_load(state, redis_con, store)
+
+    assert loaded["search_history"] == ["beach wedding"]
+    assert isinstance(loaded["search_history"], StoredList)
+    assert stored(redis_con, f"STATE_LIST:{INSTANCE}:search_history") == [
+        "beach wedding"
+    ]
+
+
+def test_appends_only_write_the_new_items(redis_con, store, monkeypatch):
+    state = new_state(search_history=["a", "b"])
+    loaded, version = save_and_load(state, redis_con, store)
+
+    writes = []
+    pipeline = redis_con.pipeline
+
+    def recording_pipeline(*args, **kwargs):
+        recorded = pipeline(*args, **kwargs)
+        for command in ("delete", "rpush", "ltrim"):
+            original = getattr(recorded, command)
+
+            def record(*args, command=command, original=original):
+                writes.append(command)
+                return original(*args)
+
+            setattr(recorded, command, record)
+        return recorded
+
+    monkeypatch.setattr(redis_con, "pipeline", recording_pipeline)
+    loaded.update(
+        {
+            "search_history": liststate.append(
+                loaded["search_history"], ["c"], RetentionPolicy(max_items=2)
+            )
+        }
+    )
+    loaded, _ = save_and_load(loaded, redis_con, store, version)
+
+    assert writes == ["rpush", "ltrim"]
+    assert loaded["search_history"] == ["b", "c"]
+
+
+def test_dev_lists_are_namespaced_like_motion_keys(redis_con, store, monkeypatch):
+    # A production state read in dev mode, as Motion falls back to it
+    save_and_load(new_state(search_history=["prod"]), redis_con, store)
+    monkeypatch.setenv("MOTION_ENV", "dev")
+    loaded, _ = loadState(redis_con, INSTANCE, store.load)
+
+    loaded.update(
+        {"search_history": liststate.append(loaded["search_history"], ["dev"])}
+    )
+    dev_loaded, _ = save_and_load(loaded, redis_con, store, version=1)
+
+    # Written in full under the dev key; the production list is untouched
+    assert stored(redis_con, f"STATE_LIST:DEV:{INSTANCE}:search_history") == [
+        "prod",
+        "dev",
+    ]
+    assert stored(redis_con, f"STATE_LIST:{INSTANCE}:search_history") == ["prod"]
+    assert dev_loaded["search_history"] == ["prod", "dev"]
+
+
+def test_clear_lists_deletes_only_that_instance(redis_con):
+    for key in [
+        f"STATE_LIST:{INSTANCE}:search_history",
+        f"STATE_LIST:DEV:{INSTANCE}:search_history",
+        f"STATE_LIST:{INSTANCE}x:search_history",
+    ]:
+        redis_con.rpush(key, "item")
+
+    assert liststate.clear_lists(INSTANCE, redis_con) == 2
+    assert redis_con.keys("STATE_LIST:*") == [
+        f"STATE_LIST:{INSTANCE}x:search_history".encode()
+    ]
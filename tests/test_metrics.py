@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import fakeredis
+import httpx
+
+from fashion import metrics
+
+USAGE = {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150}
+
+
+def stream_body(include_usage):
+    chunks = [
+        {"choices": [{"index": 0, "delta": {"content": "Linen "}}]},
+        {"choices": [{"index": 0, "delta": {"content": "suit"}}]},
+    ]
+    if include_usage:
+        chunks.append({"choices": [], "usage": USAGE})
+    events = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+    return "".join(events + ["data: [DONE]\n\n"]).encode("utf-8")
+
+
+def handler(include_usage=True):
+    def handle(request):
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            stream=ChunkedStream(stream_body(include_usage)),
+        )
+
+    return handle
+
+
+class ChunkedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Yields the body in small pieces that split events, as network reads do."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def __iter__(self):
+        for start in range(0, len(self.body), 7):
+            yield self.body[start : start + 7]
+
+    async def __aiter__(self):
+        for data in self:
+            yield data
+
+
+def tokens(model, type):
+    samples = {key: value for _, key, value in metrics.LLM_TOKENS.samples()}
+    return samples.get((("model", model), ("type", type)), 0)
+
+
+def request_json(model):
+    return {"model": model, "messages": [], "stream": True}
+
+
+def test_streamed_usage_is_counted_once_the_stream_is_read():
+    client = httpx.Client(
+        transport=httpx.MockTransport(handler()),
+        event_hooks={
+            "request": [metrics.on_llm_request],
+            "response": [metrics.on_llm_response],
+        },
+    )
+    with client.stream(
+        "POST",
+        "http://llm/v1/chat/completions",
+        json=request_json("stream-sync"),
+    ) as response:
+        assert tokens("stream-sync", "prompt") == 0
+        lines = list(response.iter_lines())
+
+    assert "data: [DONE]" in lines
+    assert tokens("stream-sync", "prompt") == 120
+    assert tokens("stream-sync", "completion") == 30
+
+
+def test_streamed_usage_is_counted_for_async_clients():
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler()),
+            event_hooks={
+                "request": [metrics.aon_llm_request],
+                "response": [metrics.aon_llm_response],
+            },
+        ) as client:
+            async with client.stream(
+                "POST",
+                "http://llm/v1/chat/completions",
+                json=request_json("stream-async"),
+            ) as response:
+                async for _ in response.aiter_lines():
+                    pass
+
+    asyncio.run(run())
+    assert tokens("stream-async", "prompt") == 120
+    assert tokens("stream-async", "completion") == 30
+
+
+def test_streams_without_usage_count_nothing():
+    client = httpx.Client(
+        transport=httpx.MockTransport(handler(include_usage=False)),
+        event_hooks={"response": [metrics.on_llm_response]},
+    )
+    with client.stream(
+        "POST",
+        "http://llm/v1/chat/completions",
+        json=request_json("stream-no-usage"),
+    ) as response:
+        response.read()
+    assert tokens("stream-no-usage", "prompt") == 0
+
+
+def test_queue_keys_are_rescanned_on_an_interval(monkeypatch):
+    redis = fakeredis.FakeRedis()
+    monkeypatch.setattr(metrics, "_redis", redis)
+    monkeypatch.setattr(metrics, "_queue_keys_scanned_at", None)
+    monkeypatch.setattr(metrics, "QUEUE_RESCAN_SECONDS", 3600)
+    redis.rpush("MOTION_QUEUE:Fashion__alice/recommend/update_summary", "a", "b")
+
+    def depths():
+        [(_, _, _, samples)] = metrics.update_queue_collector()
+        return {labels["op"]: depth for labels, depth in samples}
+
+    assert depths() == {"update_summary": 2}
+
+    # A new queue isn't seen until the next scan, but known queues are
+    # read on every scrape
+    redis.rpush("MOTION_QUEUE:Fashion__bob/user_feedback/update_feedback", "c")
+    redis.delete("MOTION_QUEUE:Fashion__alice/recommend/update_summary")
+    assert depths() == {"update_summary": 0}
+
+    monkeypatch.setattr(metrics, "QUEUE_RESCAN_SECONDS", 0)
+    assert depths() == {"update_feedback": 1}
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from fashion.news_worker import LeaderLock, NewsWorker
+
+KEY = "NEWS_WORKER_LEADER:test"
+
+
+@pytest.fixture
+def redis_con():
+    return fakeredis.FakeRedis()
+
+
+def test_only_one_worker_holds_the_lease(redis_con):
+    first = LeaderLock(redis_con, KEY, ttl=60)
+    second = LeaderLock(redis_con, KEY, ttl=60)
+
+    assert first.hold()
+    assert not second.hold()
+    # Holding again renews the lease instead of failing on it
+    assert first.hold()
+    assert redis_con.get(KEY).decode() == first.token
+
+
+def test_hold_renews_the_lease(redis_con):
+    lock = LeaderLock(redis_con, KEY, ttl=60)
+    assert lock.hold()
+    redis_con.pexpire(KEY, 1000)
+    assert lock.hold()
+    assert redis_con.pttl(KEY) > 50_000
+
+
+def test_release_hands_the_lease_over(redis_con):
+    first = LeaderLock(redis_con, KEY, ttl=60)
+    second = LeaderLock(redis_con, KEY, ttl=60)
+    first.hold()
+
+    # Only the holder can release it
+    second.release()
+    assert redis_con.get(KEY).decode() == first.token
+
+    first.release()
+    assert redis_con.get(KEY) is None
+    assert second.hold()
+    assert not first.hold()
+
+
+def test_an_expired_lease_goes_to_another_worker(redis_con):
+    first = LeaderLock(redis_con, KEY, ttl=0.05)
+    second = LeaderLock(redis_con, KEY, ttl=60)
+    assert first.hold()
+    time.sleep(0.1)
+    assert second.hold()
+    # The old leader can't renew a lease it lost
+    assert not first.hold()
+
+
+def test_due_follows_the_last_run(redis_con):
+    worker = NewsWorker("test", interval=600, redis_con=redis_con)
+    assert worker.due()
+
+    redis_con.set(worker.last_run_key, time.time())
+    assert not worker.due()
+
+    redis_con.set(worker.last_run_key, time.time() - 601)
+    assert worker.due()
+
+
+def start(worker):
+    thread = threading.Thread(target=worker.run_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def fake_runs(worker, runs, fail=False):
+    # Stands in for the search, scrape and GlobalSummaries update
+    def run_once():
+        runs.append(worker)
+        if fail:
+            raise RuntimeError("Serper is down")
+        worker._redis.set(worker.last_run_key, time.time())
+        return 0
+
+    worker.run_once = run_once
+
+
+def test_only_the_leader_runs_and_a_new_leader_keeps_the_schedule(redis_con):
+    runs = []
+    first = NewsWorker("test", interval=60, redis_con=redis_con)
+    second = NewsWorker("test", interval=60, redis_con=redis_con)
+    fake_runs(first, runs)
+    fake_runs(second, runs)
+
+    first_thread = start(first)
+    assert wait_for(lambda: runs)
+    second_thread = start(second)
+    time.sleep(0.2)
+    assert runs == [first]
+    assert first.snapshot()["leader"] == 1
+
+    # The first worker releases the lease on the way out; the second takes
+    # over but the last run is recent, so it waits out the interval
+    first.stop()
+    first_thread.join(5)
+    assert wait_for(lambda: second.hold_lease())
+    time.sleep(0.2)
+    assert runs == [first]
+
+    second.stop()
+    second_thread.join(5)
+
+
+def test_a_failed_run_waits_for_the_next_interval(redis_con):
+    runs = []
+    worker = NewsWorker("test", interval=60, redis_con=redis_con)
+    fake_runs(worker, runs, fail=True)
+
+    thread = start(worker)
+    assert wait_for(lambda: runs)
+    time.sleep(0.2)
+    worker.stop()
+    thread.join(5)
+
+    assert len(runs) == 1
+    assert worker.snapshot()["failed_runs"] == 1
+    assert redis_con.get(worker.last_run_key) is not None
+    assert redis_con.get(KEY) is None
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from fashion.pool import InstancePool
+
+
+class FakeInstance:
+    def __init__(self, key, params, shutdown_delay=0.0):
+        self.key = key
+        self.params = params
+        self.shutdown_delay = shutdown_delay
+        self.shut_down = threading.Event()
+
+    def shutdown(self):
+        time.sleep(self.shutdown_delay)
+        self.shut_down.set()
+
+
+class Factory:
+    def __init__(self, delay=0.0, shutdown_delay=0.0):
+        self.delay = delay
+        self.shutdown_delay = shutdown_delay
+        self.created = []
+        self.fail = False
+
+    def __call__(self, key, params):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("Redis is down")
+        instance = FakeInstance(key, params, self.shutdown_delay)
+        self.created.append(instance)
+        return instance
+
+
+@pytest.fixture
+def pools():
+    created = []
+
+    def make(factory, **kwargs):
+        pool = InstancePool("test", factory, sweep_interval=3600, **kwargs)
+        created.append(pool)
+        return pool
+
+    yield make
+    for pool in created:
+        pool.close()
+
+
+def use(pool, key, params=None):
+    with pool.lease(key, params) as instance:
+        return instance
+
+
+def test_instances_are_created_once_per_key(pools):
+    factory = Factory()
+    pool = pools(factory)
+    first = use(pool, "alice", {"age": "26"})
+    assert use(pool, "alice", {"age": "99"}) is first
+    # Params only seed a new instance
+    assert first.params == {"age": "26"}
+    assert pool.stats()["created"] == 1
+
+
+def test_least_recently_used_instance_is_evicted(pools):
+    pool = pools(Factory(), max_size=2)
+    alice = use(pool, "alice")
+    bob = use(pool, "bob")
+    use(pool, "alice")
+    use(pool, "carol")
+
+    assert bob.shut_down.wait(5)
+    assert len(pool) == 2
+    assert pool.stats()["evicted_lru"] == 1
+    assert not alice.shut_down.is_set()
+    assert use(pool, "alice") is alice
+
+
+def test_leased_instances_are_not_evicted(pools):
+    pool = pools(Factory(), max_size=1)
+    with pool.lease("alice") as alice:
+        use(pool, "bob")
+        # Over max_size while alice is in use
+        assert not alice.shut_down.wait(0.1)
+        assert pool.stats()["leased"] == 1
+    use(pool, "carol")
+    assert alice.shut_down.wait(5)
+
+
+def test_idle_instances_are_evicted(pools):
+    pool = pools(Factory(), idle_timeout=0.05)
+    alice = use(pool, "alice")
+    time.sleep(0.1)
+    use(pool, "bob")
+    assert alice.shut_down.wait(5)
+    assert pool.stats()["evicted_idle"] == 1
+
+
+def test_a_new_instance_waits_for_the_old_one_to_close(pools):
+    factory = Factory(shutdown_delay=0.2)
+    pool = pools(factory, max_size=1)
+    alice = use(pool, "alice")
+    use(pool, "bob")
+
+    # alice is still flushing its updates; the new alice starts after
+    new_alice = use(pool, "alice")
+    assert new_alice is not alice
+    assert alice.shut_down.is_set()
+
+
+def test_concurrent_callers_share_one_cold_start(pools):
+    factory = Factory(delay=0.2)
+    pool = pools(factory)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(use(pool, "alice")))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Another key isn't held up by alice's cold start
+    time.sleep(0.05)
+    assert pool.stats()["creating"] == 1
+    factory.delay = 0.0
+    start = time.perf_counter()
+    use(pool, "bob")
+    assert time.perf_counter() - start < 0.1
+
+    for thread in threads:
+        thread.join(5)
+    assert len({id(instance) for instance in results}) == 1
+    assert sorted(instance.key for instance in factory.created) == ["alice", "bob"]
+
+
+def test_a_failed_cold_start_is_retried(pools):
+    factory = Factory()
+    pool = pools(factory)
+    factory.fail = True
+    with pytest.raises(RuntimeError):
+        use(pool, "alice")
+    assert pool.stats()["creating"] == 0
+
+    factory.fail = False
+    assert use(pool, "alice").key == "alice"
+
+
+def test_close_shuts_down_every_instance(pools):
+    pool = InstancePool("test", Factory(shutdown_delay=0.05), sweep_interval=3600)
+    instances = [use(pool, key) for key in ["alice", "bob"]]
+    pool.close()
+    assert all(instance.shut_down.is_set() for instance in instances)
+    assert len(pool) == 0
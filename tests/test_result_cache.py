@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from fashion.cache import ResultCache
+
+
+def test_get_or_compute_caches_the_result():
+    cache = ResultCache()
+    calls = []
+    assert cache.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert cache.get_or_compute("k", lambda: calls.append(1) or "other") == "v"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_get_returns_default_on_miss():
+    cache = ResultCache()
+    assert cache.get("missing", "default") == "default"
+    cache.put("k", 1)
+    assert cache.get("k") == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResultCache(ttl=10)
+    cache.put("k", "v")
+    now[0] += 11
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_ttl_zero_disables_storage():
+    cache = ResultCache(ttl=0)
+    cache.put("k", "v")
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_bytes_bounds_total_size():
+    cache = ResultCache(max_bytes=300)
+    cache.put("big", "x" * 1000)  # larger than the whole cache: not stored
+    assert cache.get("big") is None
+    cache.put("a", "a" * 100)
+    cache.put("b", "b" * 100)
+    cache.put("c", "c" * 100)
+    assert cache.stats()["bytes"] <= 300
+    assert cache.get("a") is None
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = ResultCache()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "v"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("k", compute))
+        )
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Let the waiters reach the in-flight future before the owner finishes
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["v"] * 5
+    assert len(calls) == 1
+
+
+def test_failed_compute_is_not_cached_and_raises_for_waiters():
+    cache = ResultCache()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: "v") == "v"
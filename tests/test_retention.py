@@ -0,0 +1,66 @@
+from fashion.retention import RetentionPolicy, count_tokens, fit_to_budget
+
+
+def test_no_limits_keeps_everything():
+    entries = ["a", "b", "c"]
+    assert RetentionPolicy().apply(entries) == entries
+
+
+def test_max_items_keeps_the_most_recent():
+    assert RetentionPolicy(max_items=2).apply(["a", "b", "c"]) == ["b", "c"]
+
+
+def test_max_bytes_keeps_a_suffix_within_budget():
+    entries = ["aaaa", "bbbb", "cccc"]
+    assert RetentionPolicy(max_bytes=8).apply(entries) == ["bbbb", "cccc"]
+    # A newest entry over the budget on its own leaves nothing
+    assert RetentionPolicy(max_bytes=3).apply(entries) == []
+
+
+def test_max_bytes_counts_the_value_of_timestamped_entries():
+    entries = [(1.0, "aaaa"), (2.0, "bbbb")]
+    assert RetentionPolicy(max_bytes=4).apply(entries) == [(2.0, "bbbb")]
+
+
+def test_max_age_drops_old_timestamped_entries_only():
+    entries = [(100.0, "old"), "untimed", (190.0, "new")]
+    kept = RetentionPolicy(max_age=50).apply(entries, now=200.0)
+    assert kept == ["untimed", (190.0, "new")]
+
+
+def test_apply_does_not_mutate_its_input():
+    entries = ["a", "b", "c"]
+    RetentionPolicy(max_items=1).apply(entries)
+    assert entries == ["a", "b", "c"]
+
+
+def test_fit_to_budget_without_budget_returns_everything():
+    entries = ["a", "b"]
+    assert fit_to_budget(entries, 0) == entries
+    assert fit_to_budget([], 10) == []
+
+
+def test_fit_to_budget_prefers_recent_entries():
+    entries = ["x" * 40, "y" * 40, "z" * 40]  # 10 tokens each
+    assert fit_to_budget(entries, 20) == ["y" * 40, "z" * 40]
+
+
+def test_fit_to_budget_prefers_entries_matching_the_query():
+    entries = [
+        "linen suit for a beach wedding",
+        "wool coat for skiing",
+        "sneakers for a concert",
+    ]
+    budget = count_tokens(entries[0])
+    assert fit_to_budget(entries, budget, query="beach wedding") == [entries[0]]
+
+
+def test_fit_to_budget_keeps_chronological_order():
+    entries = ["wedding one", "other", "wedding two"]
+    selected = fit_to_budget(entries, 100, query="wedding")
+    assert selected == entries
+
+
+def test_fit_to_budget_skips_entries_too_large_to_fit():
+    entries = ["a" * 400, "b" * 8]
+    assert fit_to_budget(entries, 10) == ["b" * 8]
@@ -0,0 +1,155 @@
+from fashion.textclean import (
+    clean_articles,
+    clean_text,
+    is_boilerplate,
+    minhash,
+    similarity,
+    truncate,
+)
+
+BODY = (
+    "Butter yellow has moved from the runway to the high street this spring, "
+    "with retailers reporting that pale yellow knitwear, slip dresses and "
+    "tailored trousers are selling out within days of landing in stores. "
+    "Stylists say the shade works best against denim and crisp white shirts."
+)
+SECOND = (
+    "Ballet flats are the other breakout of the season, worn with everything "
+    "from wide-leg jeans to sheer socks and midi skirts, and several brands "
+    "have brought back archive designs to meet demand from younger shoppers."
+)
+
+
+def lines(text):
+    return text.split("\n")
+
+
+def test_headings_and_list_items_are_kept():
+    text = "\n".join(
+        [BODY, "Ballet flats", SECOND, "Butter yellow", "Wide-leg jeans", BODY[:80]]
+    )
+    cleaned, _ = clean_text(text)
+    assert "Ballet flats" in lines(cleaned)
+    assert "Butter yellow" in lines(cleaned)
+    assert "Wide-leg jeans" in lines(cleaned)
+
+
+def test_navigation_and_banners_are_dropped():
+    text = "\n".join(
+        [
+            "Home > Fashion > Trends",
+            "Menu",
+            "Search",
+            "We use cookies to improve your experience. Accept all",
+            BODY,
+            "Share on Facebook",
+            "Advertisement",
+            SECOND,
+            "Back to top",
+        ]
+    )
+    cleaned, removed = clean_text(text)
+    assert lines(cleaned) == [BODY, SECOND]
+    assert removed["boilerplate"] > 0
+
+
+def test_body_sentences_mentioning_social_sites_are_kept():
+    sentence = "The designer shared the first look on Instagram last week."
+    assert not is_boilerplate(sentence)
+    assert is_boilerplate("Follow us on Instagram")
+
+
+def test_a_footer_heading_ends_the_article():
+    text = "\n".join(
+        [BODY, SECOND, "Related articles", "Ten ways to wear loafers", "Denim 101"]
+    )
+    cleaned, _ = clean_text(text)
+    assert lines(cleaned) == [BODY, SECOND]
+
+
+def test_an_inline_teaser_only_drops_its_own_line():
+    text = "\n".join(
+        [
+            BODY,
+            "Read more: Why quiet luxury is giving way to bold colour this season",
+            SECOND,
+            BODY.replace("Butter yellow", "Cobalt blue"),
+            SECOND.replace("Ballet flats", "Loafers"),
+        ]
+    )
+    cleaned, _ = clean_text(text)
+    assert lines(cleaned) == [
+        BODY,
+        SECOND,
+        BODY.replace("Butter yellow", "Cobalt blue"),
+        SECOND.replace("Ballet flats", "Loafers"),
+    ]
+
+
+def test_a_teaser_near_the_end_ends_the_article():
+    text = "\n".join(
+        [
+            BODY,
+            SECOND,
+            BODY.replace("Butter yellow", "Cobalt blue"),
+            "Read more: Why quiet luxury is giving way to bold colour this season",
+            "The best trench coats",
+        ]
+    )
+    cleaned, _ = clean_text(text)
+    assert lines(cleaned) == [
+        BODY,
+        SECOND,
+        BODY.replace("Butter yellow", "Cobalt blue"),
+    ]
+
+
+def test_a_footer_marker_before_any_body_is_not_the_end():
+    cleaned, _ = clean_text("\n".join(["Read more", BODY, SECOND]))
+    assert lines(cleaned) == [BODY, SECOND]
+
+
+def test_truncate_keeps_whole_paragraphs():
+    text = "\n".join([BODY, SECOND])
+    assert truncate(text, 80) == BODY
+    assert truncate(text, 10_000) == text
+    # A first paragraph that doesn't fit is cut between words
+    cut = truncate(BODY, 10)
+    assert BODY.startswith(cut) and len(cut) <= 40
+
+
+def test_near_duplicates_are_dropped():
+    copy = "Reuters - " + "\n".join([BODY, SECOND]).replace("days", "a few days")
+    other = "\n".join([SECOND.replace("Ballet flats", "Loafers"), BODY[::-1]])
+    assert similarity(minhash(BODY + SECOND), minhash(copy)) >= 0.8
+
+    kept, recent, removed = clean_articles(
+        [
+            ("https://a.example/yellow", ("\n".join([BODY, SECOND]), "a.jpg")),
+            ("https://b.example/yellow", (copy, "b.jpg")),
+            ("https://c.example/other", (other, "c.jpg")),
+        ],
+        recent=[],
+        now=1000.0,
+    )
+    assert [url for url, _ in kept] == [
+        "https://a.example/yellow",
+        "https://c.example/other",
+    ]
+    assert removed["near_duplicate_articles"] == 1
+    assert len(recent) == 2
+
+
+def test_signatures_expire_and_same_url_is_not_a_copy():
+    article = ("https://a.example/yellow", ("\n".join([BODY, SECOND]), ""))
+    _, recent, _ = clean_articles([article], recent=[], now=1000.0, window=100)
+
+    # The same url again is an update, not a copy
+    kept, _, _ = clean_articles([article], recent=recent, now=1050.0, window=100)
+    assert len(kept) == 1
+
+    copy = ("https://b.example/yellow", article[1])
+    kept, _, _ = clean_articles([copy], recent=recent, now=1050.0, window=100)
+    assert kept == []
+    kept, _, _ = clean_articles([copy], recent=recent, now=1200.0, window=100)
+    assert len(kept) == 1
@@ -0,0 +1,69 @@
+import json
+import threading
+
+from fashion import tracing
+from fashion.tracing import JsonlExporter
+
+
+def finished_span(name):
+    span = tracing.start_span(name)
+    span.end = span.start + 0.1
+    return span
+
+
+def read_names(path):
+    with open(path) as f:
+        return [json.loads(line)["name"] for line in f]
+
+
+def test_spans_are_written_in_the_background(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = JsonlExporter(path)
+    for i in range(5):
+        exporter.export(finished_span(f"span {i}"))
+
+    assert exporter.flush(timeout=5)
+    assert read_names(path) == [f"span {i}" for i in range(5)]
+    assert exporter.stats() == {"queued": 0, "exported": 5, "dropped": 0}
+
+
+def test_flush_without_spans_returns_immediately(tmp_path):
+    exporter = JsonlExporter(str(tmp_path / "traces.jsonl"))
+    assert exporter.flush(timeout=1)
+
+
+def test_file_is_rotated_past_max_bytes(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = JsonlExporter(path, max_bytes=1)
+    exporter.export(finished_span("first"))
+    exporter.flush(timeout=5)
+    exporter.export(finished_span("second"))
+    exporter.flush(timeout=5)
+
+    assert read_names(path + ".1") == ["first"]
+    assert read_names(path) == ["second"]
+
+
+def test_spans_are_dropped_when_the_queue_is_full(tmp_path, monkeypatch):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = JsonlExporter(path, max_queue_size=1)
+    writing = threading.Event()
+    release = threading.Event()
+    write = exporter._write
+
+    def slow_write(lines):
+        writing.set()
+        release.wait(5)
+        write(lines)
+
+    monkeypatch.setattr(exporter, "_write", slow_write)
+    exporter.export(finished_span("first"))
+    # The worker holds "first" in a write, so one more span fills the queue
+    assert writing.wait(5)
+    exporter.export(finished_span("second"))
+    exporter.export(finished_span("third"))
+    release.set()
+
+    assert exporter.flush(timeout=5)
+    assert read_names(path) == ["first", "second"]
+    assert exporter.stats()["dropped"] == 1